@@ -0,0 +1,1225 @@
+/*
+ *      bf.c
+ *
+ *      Copyright 2014 Daniel Mende <dmende@ernw.de>
+ */
+
+/*
+ *      Redistribution and use in source and binary forms, with or without
+ *      modification, are permitted provided that the following conditions are
+ *      met:
+ *      
+ *      * Redistributions of source code must retain the above copyright
+ *        notice, this list of conditions and the following disclaimer.
+ *      * Redistributions in binary form must reproduce the above
+ *        copyright notice, this list of conditions and the following disclaimer
+ *        in the documentation and/or other materials provided with the
+ *        distribution.
+ *      * Neither the name of the  nor the names of its
+ *        contributors may be used to endorse or promote products derived from
+ *        this software without specific prior written permission.
+ *      
+ *      THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ *      "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ *      LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ *      A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ *      OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ *      SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ *      LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ *      DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ *      THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ *      (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ *      OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#include <sys/stat.h>
+#include <sys/time.h>
+#include <stdlib.h>
+#include <string.h>
+#include <ctype.h>
+#include <errno.h>
+#include <fcntl.h>
+#ifdef _WIN32
+#include <windows.h>
+#include <io.h>
+#else
+#include <sys/mman.h>
+#include <unistd.h>
+#endif
+
+#ifndef O_BINARY
+#define O_BINARY 0
+#endif
+
+#include "lib/bf.h"
+
+static const char charset_alnum[] = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz";
+static const char charset_full[] = "!\"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\\]^_`abcdefghijklmnopqrstuvwxyz{|}~";
+
+typedef struct bf_thread_arg {
+    bf_job *job;
+    int num;
+    //candidates tested since the last report
+    unsigned long long tried;
+    //candidates tested and when to look at the lockfile next
+    unsigned long long count;
+    unsigned long long next_check;
+    //where the work the thread is on starts, as long as busy. the
+    //checkpoint is the oldest of these
+    volatile int busy;
+    volatile double claimed;
+    volatile long long offset;
+    char from[BF_MAX_PW_LEN+1];
+} bf_thread_arg;
+
+static int inc_brute_pw_r(char *cur, int pos) {
+    if(cur[pos] == 0) {
+        cur[pos] = 33;
+        return 1;
+    }
+    else if(cur[pos] >= 33 && cur[pos] < 126) {
+        cur[pos]++;
+        return 1;
+    }
+    else {
+        cur[pos] = 33;
+        if(pos < BF_MAX_PW_LEN - 1)
+            return inc_brute_pw_r(cur, pos+1);
+        else
+            return 0;
+    }
+}
+
+int inc_brute_pw(char *cur, int pos, int full) {
+    if(full)
+        return inc_brute_pw_r(cur, pos);
+
+    if(cur[pos] == 0) {
+        cur[pos] = 48;
+        return 1;
+    }
+    else if(cur[pos] >= 48 && cur[pos] < 57) {
+        cur[pos]++;
+        return 1;
+    }
+    else if(cur[pos] == 57) {
+        cur[pos] = 65;
+        return 1;
+    }
+    else if(cur[pos] >= 57 && cur[pos] < 90) {
+        cur[pos]++;
+        return 1;
+    }
+    else if(cur[pos] == 90) {
+        cur[pos] = 97;
+        return 1;
+    }
+    else if(cur[pos] >= 97 && cur[pos] < 122) {
+        cur[pos]++;
+        return 1;
+    }
+    else {
+        cur[pos] = 48;
+        if(pos < BF_MAX_PW_LEN - 1)
+            return inc_brute_pw(cur, pos+1, full);
+        else
+            return 0;
+    }
+}
+
+//skips count candidates, the keyspace counts like inc_brute_pw does
+//("", "0", ..., "z", "00", "10", ...), which is bijective numeration with
+//the least significant position first.
+static int skip_brute_pw(char *cur, unsigned long count, int full) {
+    const char *charset = full ? charset_full : charset_alnum;
+    unsigned long n = strlen(charset);
+    unsigned long val;
+    int pos;
+
+    for(pos = 0; count && pos < BF_MAX_PW_LEN; pos++) {
+        val = count;
+        if(cur[pos])
+            val += strchr(charset, cur[pos]) - charset + 1;
+        cur[pos] = charset[(val - 1) % n];
+        count = (val - 1) / n;
+    }
+    return count == 0;
+}
+
+//returns 0 if cur isnt a candidate of the charset
+static int valid_brute_pw(const char *cur, int full) {
+    const char *charset = full ? charset_full : charset_alnum;
+    int len = strlen(cur);
+
+    return len <= BF_MAX_PW_LEN && strspn(cur, charset) == (size_t) len;
+}
+
+void bf_init(bf_job *job, int bf, int full, const char *wl, const char *lockfile, bf_status *status, bf_hash_func hash, void *arg) {
+    memset(job, 0, sizeof(bf_job));
+    job->bf = bf;
+    job->full = full;
+    job->wl = wl;
+    job->lockfile = lockfile;
+    job->status = status;
+    job->hash = hash;
+    job->arg = arg;
+    job->lanes = 1;
+    pthread_mutex_init(&job->mutex, NULL);
+}
+
+//lets the threads hand up to lanes candidates at once to the hash function
+void bf_batch(bf_job *job, int lanes) {
+    if(lanes > BF_MAX_LANES)
+        lanes = BF_MAX_LANES;
+    if(lanes < 1)
+        lanes = 1;
+    job->lanes = lanes;
+}
+
+//lets the wordlist threads hand lines to the hash function right out of
+//the mapped wordlist, for hash functions that only ever read lens bytes
+//of a candidate
+void bf_zero_copy(bf_job *job) {
+    job->zero_copy = 1;
+}
+
+//the n targets every candidate gets tested against, the run stops once
+//all of them are found
+void bf_targets(bf_job *job, bf_target *targets, int n) {
+    job->targets = targets;
+    job->num_targets = n;
+}
+
+//?l, ?u, ?d, ?s (punctuation and space) and ?a (all printable) stand for
+//a charset, [...] for the listed characters and ranges (like [a-f0-9]),
+//?? for a ? and anything else for itself. every position of the mask is
+//one character of the candidates, so the mask fixes their length.
+//returns 0 if the mask is invalid, an empty mask keeps the charsets.
+int bf_mask(bf_job *job, const char *mask) {
+    unsigned char seen[BF_MASK_SET_LEN];
+    const unsigned char *p = (const unsigned char *) mask;
+    int pos = 0, n, c, lo, hi;
+
+    job->mask_len = 0;
+    if(!mask)
+        return 1;
+    while(*p) {
+        if(pos == BF_MAX_PW_LEN)
+            return 0;
+        memset(seen, 0, sizeof(seen));
+        if(*p == '?') {
+            p++;
+            switch(*p) {
+                case 'l':
+                    memset(seen + 'a', 1, 26);
+                    break;
+                case 'u':
+                    memset(seen + 'A', 1, 26);
+                    break;
+                case 'd':
+                    memset(seen + '0', 1, 10);
+                    break;
+                case 's':
+                    for(c = 32; c < 127; c++)
+                        if(!isalnum(c))
+                            seen[c] = 1;
+                    break;
+                case 'a':
+                    memset(seen + 32, 1, 127 - 32);
+                    break;
+                case '?':
+                    seen['?'] = 1;
+                    break;
+                default:
+                    return 0;
+            }
+            p++;
+        }
+        else if(*p == '[') {
+            //a ] right after the [ is taken literally
+            p++;
+            do {
+                if(!*p)
+                    return 0;
+                lo = *p++;
+                if(*p == '-' && p[1] && p[1] != ']') {
+                    hi = p[1];
+                    p += 2;
+                    if(hi < lo)
+                        return 0;
+                    memset(seen + lo, 1, hi - lo + 1);
+                }
+                else
+                    seen[lo] = 1;
+            } while(*p != ']');
+            p++;
+        }
+        else
+            seen[*p++] = 1;
+        for(c = 0, n = 0; c < BF_MASK_SET_LEN; c++)
+            if(seen[c])
+                job->mask_sets[pos][n++] = c;
+        job->mask_sizes[pos++] = n;
+    }
+    job->mask_len = pos;
+    return 1;
+}
+
+//writes the candidate for the charset indexes idx to cur
+static void render_mask(bf_job *job, const int *idx, char *cur) {
+    int i;
+
+    for(i = 0; i < job->mask_len; i++)
+        cur[i] = job->mask_sets[i][idx[i]];
+    cur[i] = '\0';
+}
+
+//the charset indexes of the candidate cur, returns 0 if the mask cant
+//give it
+static int parse_mask(bf_job *job, const char *cur, int *idx) {
+    const char *c;
+    int i;
+
+    if((int) strlen(cur) != job->mask_len)
+        return 0;
+    for(i = 0; i < job->mask_len; i++) {
+        if(!(c = memchr(job->mask_sets[i], cur[i], job->mask_sizes[i])))
+            return 0;
+        idx[i] = c - job->mask_sets[i];
+    }
+    return 1;
+}
+
+//same as skip_brute_pw, the first position counts fastest
+static int skip_mask(bf_job *job, int *idx, unsigned long count) {
+    unsigned long val;
+    int pos;
+
+    for(pos = 0; count && pos < job->mask_len; pos++) {
+        val = idx[pos] + count;
+        idx[pos] = val % job->mask_sizes[pos];
+        count = val / job->mask_sizes[pos];
+    }
+    return count == 0;
+}
+
+//rules, one per line, apply a subset of the hashcat rule functions to
+//every word of the wordlist and each of them gives one candidate:
+//  :       nothing         l       lowercase       u       uppercase
+//  c       capitalize      C       lower first, upper the rest
+//  t       toggle case     TN      toggle case at N
+//  r       reverse         d       duplicate       [ ]     delete first / last
+//  DN      delete at N     $X      append X        ^X      prepend X
+//  sXY     replace X by Y  @X      purge X
+//N is 0-9 or A-Z (10-35), spaces between functions, empty lines and
+//lines starting with # are ignored.
+
+#define RULE_END(c) (!(c) || (c) == '\n' || (c) == '\r')
+
+static const char *skip_rules(const char *rule) {
+    while(*rule == '\n' || *rule == '\r' || *rule == '#') {
+        if(*rule == '#')
+            while(*rule && *rule != '\n')
+                rule++;
+        else
+            rule++;
+    }
+    return *rule ? rule : NULL;
+}
+
+static const char *next_rule(const char *rule) {
+    const char *end = strchr(rule, '\n');
+
+    return end ? skip_rules(end + 1) : NULL;
+}
+
+static int rule_pos(char c) {
+    if(c >= '0' && c <= '9')
+        return c - '0';
+    if(c >= 'A' && c <= 'Z')
+        return c - 'A' + 10;
+    return -1;
+}
+
+static char toggle_case(char c) {
+    if(islower((unsigned char) c))
+        return toupper((unsigned char) c);
+    if(isupper((unsigned char) c))
+        return tolower((unsigned char) c);
+    return c;
+}
+
+//applies rule to the len bytes of word, out gets the candidate with
+//BF_MAX_PW_LEN bytes of zero padding. returns the length of the
+//candidate, -1 if it would get too long and -2 if the rule is invalid
+static int apply_rule(const char *rule, const char *word, int len, char *out) {
+    char x, y;
+    int i, pos;
+
+#define RULE_ARG(c) do { if(RULE_END(rule[1])) return -2; c = *++rule; } while(0)
+#define RULE_POS(n) do { if(RULE_END(rule[1]) || (n = rule_pos(*++rule)) < 0) return -2; } while(0)
+    memcpy(out, word, len);
+    for(; !RULE_END(*rule); rule++) {
+        switch(*rule) {
+            case ' ':
+            case ':':
+                break;
+            case 'l':
+                for(i = 0; i < len; i++)
+                    if(isupper((unsigned char) out[i]))
+                        out[i] = toggle_case(out[i]);
+                break;
+            case 'u':
+                for(i = 0; i < len; i++)
+                    if(islower((unsigned char) out[i]))
+                        out[i] = toggle_case(out[i]);
+                break;
+            case 'c':
+            case 'C':
+                //upper or lower case the first character, the rest the other way
+                for(i = 0; i < len; i++)
+                    if(((i == 0) == (*rule == 'c')) ? islower((unsigned char) out[i]) : isupper((unsigned char) out[i]))
+                        out[i] = toggle_case(out[i]);
+                break;
+            case 't':
+                for(i = 0; i < len; i++)
+                    out[i] = toggle_case(out[i]);
+                break;
+            case 'T':
+                RULE_POS(pos);
+                if(pos < len)
+                    out[pos] = toggle_case(out[pos]);
+                break;
+            case 'r':
+                for(i = 0; i < len / 2; i++) {
+                    x = out[i];
+                    out[i] = out[len - 1 - i];
+                    out[len - 1 - i] = x;
+                }
+                break;
+            case 'd':
+                if(len * 2 >= BF_LINE_LEN)
+                    return -1;
+                memcpy(out + len, out, len);
+                len *= 2;
+                break;
+            case '[':
+                if(len)
+                    memmove(out, out + 1, --len);
+                break;
+            case ']':
+                if(len)
+                    len--;
+                break;
+            case 'D':
+                RULE_POS(pos);
+                if(pos < len) {
+                    memmove(out + pos, out + pos + 1, len - pos - 1);
+                    len--;
+                }
+                break;
+            case '$':
+                RULE_ARG(x);
+                if(len + 1 >= BF_LINE_LEN)
+                    return -1;
+                out[len++] = x;
+                break;
+            case '^':
+                RULE_ARG(x);
+                if(len + 1 >= BF_LINE_LEN)
+                    return -1;
+                memmove(out + 1, out, len++);
+                out[0] = x;
+                break;
+            case 's':
+                RULE_ARG(x);
+                RULE_ARG(y);
+                for(i = 0; i < len; i++)
+                    if(out[i] == x)
+                        out[i] = y;
+                break;
+            case '@':
+                RULE_ARG(x);
+                for(i = 0, pos = 0; i < len; i++)
+                    if(out[i] != x)
+                        out[pos++] = out[i];
+                len = pos;
+                break;
+            default:
+                return -2;
+        }
+    }
+#undef RULE_ARG
+#undef RULE_POS
+    memset(out + len, 0, BF_MAX_PW_LEN);
+    return len;
+}
+
+//returns 0 if a rule is invalid, no rules (NULL, empty or only comments)
+//test the words as they are
+int bf_rules(bf_job *job, const char *rules) {
+    char out[BF_LINE_LEN + BF_MAX_PW_LEN];
+    const char *rule;
+
+    job->rules = NULL;
+    job->num_rules = 0;
+    if(!rules)
+        return 1;
+    for(rule = skip_rules(rules); rule; rule = next_rule(rule)) {
+        if(apply_rule(rule, "password", 8, out) == -2)
+            return 0;
+        job->num_rules++;
+    }
+    if(job->num_rules)
+        job->rules = rules;
+    return 1;
+}
+
+static int check_lockfile(bf_job *job, int num, const char *cur, int len) {
+    struct stat fcheck;
+    FILE *lock;
+
+    if(!job->lockfile)
+        return 1;
+    if(stat(job->lockfile, &fcheck)) {
+        fprintf(stderr, "No lockfile, exiting.\n");
+        job->stop = 1;
+        return 0;
+    }
+    if(num == 0) {
+        if(!(lock = fopen(job->lockfile, "w"))) {
+            fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
+            job->stop = 1;
+            return 0;
+        }
+        fprintf(lock, "%.*s", len, cur);
+        fclose(lock);
+    }
+    return 1;
+}
+
+static void found(bf_job *job, int num, const char *pw, int len) {
+    bf_target *target = &job->targets[num];
+    bf_status_hit *hit;
+
+    //the pw isnt terminated if it comes straight from the wordlist
+    if(len > BF_LINE_LEN - 1)
+        len = BF_LINE_LEN - 1;
+    pthread_mutex_lock(&job->mutex);
+    if(!target->found) {
+        target->found = 1;
+        memcpy(target->pw, pw, len);
+        target->pw[len] = '\0';
+        job->groups[target->group].left--;
+        job->found++;
+        if(job->num_targets > 1)
+            fprintf(stderr, "Found pw '%s' for target %d.\n", target->pw, num);
+        else
+            fprintf(stderr, "Found pw '%s'.\n", target->pw);
+        if(num < job->num_hits) {
+            hit = &job->hits[num];
+            strncpy(hit->pw, target->pw, BF_HIT_PW_LEN - 1);
+            hit->pw[BF_HIT_PW_LEN - 1] = '\0';
+            //the pw has to be there before the caller sees the flag
+            __sync_synchronize();
+            hit->found = 1;
+        }
+        if(job->status)
+            job->status->found = job->found;
+        if(job->found == job->num_targets)
+            job->stop = 1;
+    }
+    pthread_mutex_unlock(&job->mutex);
+}
+
+static unsigned int digest_key(const unsigned char *digest) {
+    unsigned int key;
+
+    memcpy(&key, digest, sizeof(key));
+    //md5 digests are uniform anyway, but nothing says the targets are
+    key ^= key >> 16;
+    key *= 0x45d9f3b;
+    key ^= key >> 16;
+    return key;
+}
+
+//looks the digest up in the set of the group, every target with that
+//digest is found. targets of a group are unique by their digest unless the
+//same packet got added twice, so the probing doesnt stop at the first one.
+static void lookup(bf_job *job, bf_group *group, const unsigned char *digest, const char *pw, int len) {
+    unsigned int i;
+    int num;
+
+    for(i = digest_key(digest) & group->mask; group->slots[i]; i = (i + 1) & group->mask) {
+        num = group->slots[i] - 1;
+        if(!memcmp(job->targets[num].digest, digest, BF_DIGEST_LEN) && !job->targets[num].found)
+            found(job, num, pw, len);
+    }
+}
+
+//tests n candidates against all targets not found yet, with one hash call
+//per group. returns 0 if the thread has to stop
+static int test_batch(bf_thread_arg *t, const char **pws, const int *lens, int n) {
+    bf_job *job = t->job;
+    unsigned char digests[BF_MAX_LANES][BF_DIGEST_LEN];
+    bf_group *group;
+    int g, i;
+
+    if(t->count >= t->next_check) {
+        if(!check_lockfile(job, t->num, pws[0], lens[0]))
+            return 0;
+        t->next_check += BF_CHECK_FOR_LOCKFILE;
+    }
+    t->count += n;
+    t->tried += n;
+    for(g = 0; g < job->num_groups; g++) {
+        group = &job->groups[g];
+        if(!group->left)
+            continue;
+        job->hash(job, group->salt, pws, lens, n, digests);
+        for(i = 0; i < n; i++)
+            lookup(job, group, digests[i], pws[i], lens[i]);
+    }
+    return !job->stop;
+}
+
+//puts targets with the same data into one group and their digests into its
+//set, returns 0 if out of memory
+static int group_targets(bf_job *job) {
+    bf_target *target, *first;
+    bf_group *group;
+    unsigned int i;
+    int g, num;
+
+    if(!(job->groups = calloc(job->num_targets, sizeof(bf_group))))
+        return 0;
+    job->num_groups = 0;
+    //quadratic, but there are no more targets than captured packets
+    for(num = 0; num < job->num_targets; num++) {
+        target = &job->targets[num];
+        for(g = 0; g < job->num_groups; g++) {
+            first = &job->targets[job->groups[g].first];
+            if(first->len == target->len && !memcmp(first->data, target->data, target->len))
+                break;
+        }
+        group = &job->groups[g];
+        if(g == job->num_groups) {
+            group->salt = target->salt;
+            group->first = num;
+            job->num_groups++;
+        }
+        group->num++;
+        target->group = g;
+        target->found = 0;
+    }
+    for(g = 0; g < job->num_groups; g++) {
+        group = &job->groups[g];
+        group->left = group->num;
+        //at most half full
+        for(group->mask = 1; group->mask < (unsigned int) group->num * 2; group->mask <<= 1);
+        if(!(group->slots = calloc(group->mask, sizeof(int))))
+            return 0;
+        group->mask--;
+    }
+    for(num = 0; num < job->num_targets; num++) {
+        group = &job->groups[job->targets[num].group];
+        for(i = digest_key((const unsigned char *) job->targets[num].digest) & group->mask; group->slots[i]; i = (i + 1) & group->mask);
+        group->slots[i] = num + 1;
+    }
+    return 1;
+}
+
+static void free_groups(bf_job *job) {
+    int g;
+
+    if(!job->groups)
+        return;
+    for(g = 0; g < job->num_groups; g++)
+        free(job->groups[g].slots);
+    free(job->groups);
+    job->groups = NULL;
+}
+
+//called with the mutex held whenever a thread claims new work, so the
+//candidate loops never touch shared memory
+static void report(bf_job *job, unsigned long long *tried, const char *cur) {
+    job->tried += *tried;
+    *tried = 0;
+    if(job->status) {
+        if(job->status->cancel)
+            job->stop = 1;
+        job->status->tried = job->tried;
+        job->status->position = job->position;
+        if(cur) {
+            strncpy(job->status->current, cur, BF_STATUS_PW_LEN - 1);
+            job->status->current[BF_STATUS_PW_LEN - 1] = '\0';
+        }
+    }
+}
+
+//called with the mutex held after the threads claimed work, the
+//checkpoint is where the oldest work still going on starts or, if there
+//is none, where the next work would start
+static void checkpoint(bf_job *job) {
+    bf_thread_arg *oldest = NULL;
+    bf_status *status = job->status;
+    long long next;
+    int i;
+
+    if(!status)
+        return;
+    //wordlist threads claim without the mutex, but only after they put a
+    //lower bound of their claim into claimed. so anything claimed after
+    //wl_next gets read here is past it, anything before shows up below
+    next = job->wl_next;
+    __sync_synchronize();
+    for(i = 0; i < job->num_args; i++)
+        if(job->args[i].busy && (!oldest || job->args[i].claimed < oldest->claimed))
+            oldest = &job->args[i];
+    status->seq++;
+    __sync_synchronize();
+    if(!job->bf && (!oldest || next < oldest->offset)) {
+        if(next > job->total)
+            next = job->total;
+        status->saved = next;
+        status->offset = next;
+        status->next[0] = '\0';
+    }
+    else if(oldest) {
+        status->saved = oldest->claimed;
+        status->offset = oldest->offset;
+        strncpy(status->next, oldest->from, BF_STATUS_PW_LEN - 1);
+    }
+    else {
+        status->saved = job->exhausted ? job->total : job->position;
+        status->offset = (long long) job->position;
+        if(job->mask_len)
+            render_mask(job, job->mask_next, status->next);
+        else
+            strncpy(status->next, job->next, BF_STATUS_PW_LEN - 1);
+    }
+    status->next[BF_STATUS_PW_LEN - 1] = '\0';
+    __sync_synchronize();
+    status->seq++;
+}
+
+//a wordlist mapped into memory. jobs running on the same file (same
+//name, size and modification time) at the same time share one mapping.
+struct bf_wordlist {
+    char *path;
+    long long size;
+    time_t mtime;
+    const char *data;
+    int refs;
+    bf_wordlist *next;
+};
+
+static pthread_mutex_t wordlists_mutex = PTHREAD_MUTEX_INITIALIZER;
+static bf_wordlist *wordlists = NULL;
+
+static const char *map_wordlist(int fd, size_t size) {
+#ifdef _WIN32
+    HANDLE map;
+    const char *data;
+
+    if(!(map = CreateFileMapping((HANDLE) _get_osfhandle(fd), NULL, PAGE_READONLY, 0, 0, NULL))) {
+        errno = EACCES;
+        return NULL;
+    }
+    data = MapViewOfFile(map, FILE_MAP_READ, 0, 0, size);
+    //the view keeps the mapping alive
+    CloseHandle(map);
+    if(!data)
+        errno = ENOMEM;
+    return data;
+#else
+    void *data = mmap(NULL, size, PROT_READ, MAP_SHARED, fd, 0);
+
+    if(data == MAP_FAILED)
+        return NULL;
+#ifdef MADV_SEQUENTIAL
+    madvise(data, size, MADV_SEQUENTIAL);
+#endif
+    return data;
+#endif
+}
+
+static void unmap_wordlist(const char *data, size_t size) {
+#ifdef _WIN32
+    UnmapViewOfFile(data);
+#else
+    munmap((void *) data, size);
+#endif
+}
+
+//called with wordlists_mutex held
+static bf_wordlist *new_wordlist(const char *path, int fd, const struct stat *st) {
+    bf_wordlist *wl;
+    int err;
+
+    if((unsigned long long) st->st_size > (size_t) -1) {
+        errno = EFBIG;
+        return NULL;
+    }
+    if(!(wl = calloc(1, sizeof(bf_wordlist) + strlen(path) + 1))) {
+        errno = ENOMEM;
+        return NULL;
+    }
+    wl->path = (char *) (wl + 1);
+    strcpy(wl->path, path);
+    wl->size = st->st_size;
+    wl->mtime = st->st_mtime;
+    wl->refs = 1;
+    //an empty file cant be mapped, there are no lines in it anyway
+    if(wl->size && !(wl->data = map_wordlist(fd, wl->size))) {
+        err = errno;
+        free(wl);
+        errno = err;
+        return NULL;
+    }
+    wl->next = wordlists;
+    wordlists = wl;
+    return wl;
+}
+
+//maps the wordlist, or takes another reference on the mapping of a job
+//running on the same file. returns NULL with errno set if it cant
+static bf_wordlist *open_wordlist(const char *path) {
+    struct stat st;
+    bf_wordlist *wl;
+    int fd, err;
+
+    if((fd = open(path, O_RDONLY | O_BINARY)) < 0)
+        return NULL;
+    if(fstat(fd, &st)) {
+        err = errno;
+        close(fd);
+        errno = err;
+        return NULL;
+    }
+    pthread_mutex_lock(&wordlists_mutex);
+    for(wl = wordlists; wl; wl = wl->next)
+        if(wl->size == st.st_size && wl->mtime == st.st_mtime && !strcmp(wl->path, path))
+            break;
+    if(wl)
+        wl->refs++;
+    else
+        wl = new_wordlist(path, fd, &st);
+    err = errno;
+    pthread_mutex_unlock(&wordlists_mutex);
+    close(fd);
+    errno = err;
+    return wl;
+}
+
+static void close_wordlist(bf_wordlist *wl) {
+    bf_wordlist **prev;
+
+    pthread_mutex_lock(&wordlists_mutex);
+    if(!--wl->refs) {
+        for(prev = &wordlists; *prev != wl; prev = &(*prev)->next);
+        *prev = wl->next;
+        if(wl->data)
+            unmap_wordlist(wl->data, wl->size);
+        free(wl);
+    }
+    pthread_mutex_unlock(&wordlists_mutex);
+}
+
+//the line at p, without the line break and cut at the first \r or after
+//BF_LINE_LEN - 1 bytes. returns where the next line starts
+static const char *next_line(const char *p, const char *eof, int *len) {
+    const char *end, *cr;
+
+    if(!(end = memchr(p, '\n', eof - p)))
+        end = eof;
+    if((cr = memchr(p, '\r', end - p)))
+        *len = cr - p;
+    else
+        *len = end - p;
+    if(*len > BF_LINE_LEN - 1)
+        *len = BF_LINE_LEN - 1;
+    return end < eof ? end + 1 : eof;
+}
+
+//takes the next BF_WL_CHUNK bytes of the wordlist without the mutex, the
+//thread gets the lines starting in them (from up to to). returns 0 once
+//the wordlist is done
+static int claim_lines(bf_thread_arg *t, const char **from, const char **to) {
+    bf_job *job = t->job;
+    const char *data = job->wlist->data;
+    long long size = job->wlist->size;
+    long long start, end;
+    char cur[BF_STATUS_PW_LEN];
+    int len;
+
+    if(job->status && job->status->cancel)
+        job->stop = 1;
+    //see checkpoint()
+    t->claimed = t->offset = job->wl_next;
+    __sync_synchronize();
+    t->busy = 1;
+    start = __sync_fetch_and_add(&job->wl_next, BF_WL_CHUNK);
+    if(start >= size) {
+        t->busy = 0;
+        return 0;
+    }
+    t->claimed = t->offset = start;
+    end = start + BF_WL_CHUNK < size ? start + BF_WL_CHUNK : size;
+    *from = data + start;
+    *to = data + end;
+    //the line going on at the start belongs to the chunk before, that
+    //holds for a checkpoint at the start of a chunk as well
+    if(start > 0 && data[start - 1] != '\n') {
+        *from = memchr(*from, '\n', size - start);
+        *from = *from ? *from + 1 : *to;
+    }
+
+    //only one thread reports at a time, the others go on
+    if(!pthread_mutex_trylock(&job->mutex)) {
+        if(end > job->position)
+            job->position = end;
+        len = 0;
+        if(*from < *to)
+            next_line(*from, data + size, &len);
+        if(len > BF_STATUS_PW_LEN - 1)
+            len = BF_STATUS_PW_LEN - 1;
+        memcpy(cur, *from, len);
+        cur[len] = '\0';
+        report(job, &t->tried, len ? cur : NULL);
+        checkpoint(job);
+        pthread_mutex_unlock(&job->mutex);
+    }
+    return 1;
+}
+
+#define LINE(lines, i) ((lines) + (i) * (BF_LINE_LEN + BF_MAX_PW_LEN))
+
+static void *thread_wordlist(void *arg) {
+    bf_thread_arg *t = (bf_thread_arg *) arg;
+    bf_job *job = t->job;
+    const char *eof = job->wlist->data + job->wlist->size;
+    const char *p, *to, *word, *rule;
+    const char *pws[BF_MAX_LANES];
+    int lens[BF_MAX_LANES];
+    char *cands;
+    int m, len, go = 1;
+
+    cands = malloc(BF_MAX_LANES * (BF_LINE_LEN + BF_MAX_PW_LEN));
+    while(go && !job->stop && claim_lines(t, &p, &to)) {
+        m = 0;
+        while(p < to && go && !job->stop) {
+            word = p;
+            p = next_line(p, eof, &len);
+            if(!job->rules) {
+                if(job->zero_copy)
+                    pws[m] = word;
+                else {
+                    memcpy(LINE(cands, m), word, len);
+                    memset(LINE(cands, m) + len, 0, BF_MAX_PW_LEN);
+                    pws[m] = LINE(cands, m);
+                }
+                lens[m++] = len;
+                if(m == job->lanes) {
+                    go = test_batch(t, pws, lens, m);
+                    m = 0;
+                }
+                continue;
+            }
+            //every rule gives one candidate per word
+            for(rule = skip_rules(job->rules); rule && go; rule = next_rule(rule)) {
+                if((lens[m] = apply_rule(rule, word, len, LINE(cands, m))) < 0)
+                    continue;
+                pws[m] = LINE(cands, m);
+                if(++m == job->lanes) {
+                    go = test_batch(t, pws, lens, m);
+                    m = 0;
+                }
+            }
+        }
+        //the chunk has to be done before the next claim, see checkpoint()
+        if(m && go && !job->stop)
+            go = test_batch(t, pws, lens, m);
+    }
+    free(cands);
+
+    pthread_mutex_lock(&job->mutex);
+    report(job, &t->tried, NULL);
+    pthread_mutex_unlock(&job->mutex);
+    return NULL;
+}
+
+//takes the next BF_BLOCK candidates off the shared keyspace
+static int claim_block(bf_thread_arg *t, char *cur) {
+    bf_job *job = t->job;
+    int ret = 0;
+
+    pthread_mutex_lock(&job->mutex);
+    report(job, &t->tried, job->next);
+    if(!job->exhausted && !job->stop) {
+        memcpy(cur, job->next, BF_MAX_PW_LEN+1);
+        memcpy(t->from, job->next, BF_MAX_PW_LEN+1);
+        t->claimed = job->position;
+        job->position += BF_BLOCK;
+        if(!skip_brute_pw(job->next, BF_BLOCK, job->full)) {
+            job->exhausted = 1;
+            job->position = job->total;
+        }
+        ret = 1;
+    }
+    t->busy = ret;
+    checkpoint(job);
+    pthread_mutex_unlock(&job->mutex);
+    return ret;
+}
+
+static void *thread_bruteforce(void *arg) {
+    bf_thread_arg *t = (bf_thread_arg *) arg;
+    bf_job *job = t->job;
+    //one more than the lanes for the candidate after the batch
+    char cur[BF_MAX_LANES+1][BF_MAX_PW_LEN+1];
+    const char *pws[BF_MAX_LANES];
+    int lens[BF_MAX_LANES];
+    int i, m, more, go = 1;
+
+    for(i = 0; i < BF_MAX_LANES; i++)
+        pws[i] = cur[i];
+    while(go && claim_block(t, cur[0])) {
+        more = 1;
+        for(i = 0; i < BF_BLOCK && more && go && !job->stop; i += m) {
+            for(m = 0; m < job->lanes && i + m < BF_BLOCK && more; m++) {
+                lens[m] = strlen(cur[m]);
+                memcpy(cur[m+1], cur[m], BF_MAX_PW_LEN+1);
+                more = inc_brute_pw(cur[m+1], 0, job->full);
+            }
+            go = test_batch(t, pws, lens, m);
+            memcpy(cur[0], cur[m], BF_MAX_PW_LEN+1);
+        }
+    }
+
+    pthread_mutex_lock(&job->mutex);
+    report(job, &t->tried, NULL);
+    pthread_mutex_unlock(&job->mutex);
+    return NULL;
+}
+
+//takes the next BF_BLOCK candidates off the mask
+static int claim_mask(bf_thread_arg *t, int *idx) {
+    bf_job *job = t->job;
+    char cur[BF_MAX_PW_LEN+1];
+    int ret = 0;
+
+    pthread_mutex_lock(&job->mutex);
+    render_mask(job, job->mask_next, cur);
+    report(job, &t->tried, cur);
+    if(!job->exhausted && !job->stop) {
+        memcpy(idx, job->mask_next, sizeof(job->mask_next));
+        memcpy(t->from, cur, BF_MAX_PW_LEN+1);
+        t->claimed = job->position;
+        job->position += BF_BLOCK;
+        if(!skip_mask(job, job->mask_next, BF_BLOCK)) {
+            job->exhausted = 1;
+            job->position = job->total;
+        }
+        ret = 1;
+    }
+    t->busy = ret;
+    checkpoint(job);
+    pthread_mutex_unlock(&job->mutex);
+    return ret;
+}
+
+static void *thread_mask(void *arg) {
+    bf_thread_arg *t = (bf_thread_arg *) arg;
+    bf_job *job = t->job;
+    char cur[BF_MAX_LANES][BF_MAX_PW_LEN+1];
+    const char *pws[BF_MAX_LANES];
+    int lens[BF_MAX_LANES];
+    int idx[BF_MAX_PW_LEN];
+    int i, m, more, go = 1;
+
+    memset(cur, 0, sizeof(cur));
+    for(i = 0; i < BF_MAX_LANES; i++) {
+        pws[i] = cur[i];
+        lens[i] = job->mask_len;
+    }
+    while(go && claim_mask(t, idx)) {
+        more = 1;
+        for(i = 0; i < BF_BLOCK && more && go && !job->stop; i += m) {
+            for(m = 0; m < job->lanes && i + m < BF_BLOCK && more; m++) {
+                render_mask(job, idx, cur[m]);
+                more = skip_mask(job, idx, 1);
+            }
+            go = test_batch(t, pws, lens, m);
+        }
+    }
+
+    pthread_mutex_lock(&job->mutex);
+    report(job, &t->tried, NULL);
+    pthread_mutex_unlock(&job->mutex);
+    return NULL;
+}
+
+//size of the brute force keyspace, as a double as it doesnt fit 64 bit
+static double keyspace(int full) {
+    double n = strlen(full ? charset_full : charset_alnum);
+    double total = 1, cur = 1;
+    int i;
+
+    for(i = 0; i < BF_MAX_PW_LEN; i++) {
+        cur *= n;
+        total += cur;
+    }
+    return total;
+}
+
+static double mask_keyspace(bf_job *job) {
+    double total = 1;
+    int i;
+
+    for(i = 0; i < job->mask_len; i++)
+        total *= job->mask_sizes[i];
+    return total;
+}
+
+//moves the job to the checkpoint in its status, after the wordlist got
+//opened and the total is known. returns 0 if the checkpoint doesnt fit
+//the job
+static int resume(bf_job *job) {
+    bf_status *status = job->status;
+
+    job->tried = status->tried;
+    if(!job->bf) {
+        if(status->offset < 0 || status->offset > job->total)
+            return 0;
+        job->wl_next = status->offset;
+        job->position = status->offset;
+        return 1;
+    }
+    if(status->saved >= job->total) {
+        job->exhausted = 1;
+        job->position = job->total;
+        return 1;
+    }
+    if(job->mask_len) {
+        if(!parse_mask(job, status->next, job->mask_next))
+            return 0;
+    }
+    else {
+        if(!valid_brute_pw(status->next, job->full))
+            return 0;
+        strcpy(job->next, status->next);
+    }
+    job->position = status->saved;
+    return 1;
+}
+
+//runs the job on num_threads threads, call it without holding the GIL.
+//returns the number of targets found or -1 on error, EINVAL if the
+//checkpoint to resume at doesnt fit the job.
+int bf_run(bf_job *job, int num_threads) {
+    bf_thread_arg *args;
+    pthread_t *threads;
+    void *(*thread_func)(void *);
+    struct timeval start, end;
+    int i, err;
+
+    if(num_threads < 1)
+        num_threads = 1;
+
+    if(!group_targets(job)) {
+        free_groups(job);
+        errno = ENOMEM;
+        return -1;
+    }
+    if(!job->bf) {
+        if(!(job->wlist = open_wordlist(job->wl))) {
+            err = errno;
+            fprintf(stderr, "Cant open wordlist: %s\n", strerror(err));
+            free_groups(job);
+            errno = err;
+            return -1;
+        }
+        job->total = job->wlist->size;
+        job->wl_next = 0;
+        thread_func = thread_wordlist;
+    }
+    else if(job->mask_len) {
+        memset(job->mask_next, 0, sizeof(job->mask_next));
+        job->total = mask_keyspace(job);
+        thread_func = thread_mask;
+    }
+    else {
+        memset(job->next, 0, BF_MAX_PW_LEN+1);
+        job->total = keyspace(job->full);
+        thread_func = thread_bruteforce;
+    }
+    if(job->status && job->status->resume && !resume(job)) {
+        fprintf(stderr, "Cant resume, the checkpoint doesnt fit the job.\n");
+        if(job->wlist)
+            close_wordlist(job->wlist);
+        job->wlist = NULL;
+        free_groups(job);
+        errno = EINVAL;
+        return -1;
+    }
+    for(i = 0; i < job->num_hits && i < job->num_targets; i++) {
+        //targets found before the checkpoint stay found
+        if(job->status->resume && job->hits[i].found) {
+            job->targets[i].found = 1;
+            memcpy(job->targets[i].pw, job->hits[i].pw, BF_HIT_PW_LEN);
+            job->targets[i].pw[BF_HIT_PW_LEN - 1] = '\0';
+            job->groups[job->targets[i].group].left--;
+            if(++job->found == job->num_targets)
+                job->stop = 1;
+        }
+        else
+            job->hits[i].found = 0;
+    }
+    if(job->status) {
+        job->status->found = job->found;
+        job->status->tried = job->tried;
+        job->status->position = job->position;
+        job->status->total = job->total;
+    }
+
+    threads = malloc(sizeof(pthread_t) * num_threads);
+    args = calloc(num_threads, sizeof(bf_thread_arg));
+    job->args = args;
+    job->num_args = num_threads;
+    checkpoint(job);
+
+    gettimeofday(&start, NULL);
+    for(i = 0; i < num_threads; i++) {
+        args[i].job = job;
+        args[i].num = i;
+        if((err = pthread_create(&threads[i], NULL, thread_func, &args[i]))) {
+            fprintf(stderr, "Cant create thread: %s\n", strerror(err));
+            errno = err;
+            break;
+        }
+    }
+    num_threads = i;
+    for(i = 0; i < num_threads; i++)
+        pthread_join(threads[i], NULL);
+    gettimeofday(&end, NULL);
+    job->elapsed = (end.tv_sec - start.tv_sec) + (end.tv_usec - start.tv_usec) / 1000000.0;
+    //the work of threads that didnt get created isnt claimed by anyone
+    job->num_args = num_threads;
+    checkpoint(job);
+
+    job->args = NULL;
+    job->num_args = 0;
+    free(args);
+    free(threads);
+    if(job->wlist) {
+        close_wordlist(job->wlist);
+        job->wlist = NULL;
+    }
+    free_groups(job);
+    pthread_mutex_destroy(&job->mutex);
+
+    if(!num_threads)
+        return -1;
+    return job->found;
+}
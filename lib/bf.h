@@ -0,0 +1,295 @@
+/*
+ *      bf.h
+ *
+ *      Copyright 2014 Daniel Mende <dmende@ernw.de>
+ */
+
+/*
+ *      Redistribution and use in source and binary forms, with or without
+ *      modification, are permitted provided that the following conditions are
+ *      met:
+ *      
+ *      * Redistributions of source code must retain the above copyright
+ *        notice, this list of conditions and the following disclaimer.
+ *      * Redistributions in binary form must reproduce the above
+ *        copyright notice, this list of conditions and the following disclaimer
+ *        in the documentation and/or other materials provided with the
+ *        distribution.
+ *      * Neither the name of the  nor the names of its
+ *        contributors may be used to endorse or promote products derived from
+ *        this software without specific prior written permission.
+ *      
+ *      THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ *      "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ *      LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ *      A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ *      OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ *      SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ *      LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ *      DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ *      THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ *      (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ *      OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#ifndef BF_H
+#define BF_H 1
+
+#include <stdio.h>
+#include <pthread.h>
+
+#define BF_MAX_PW_LEN 16
+#define BF_LINE_LEN 512
+#define BF_CHECK_FOR_LOCKFILE 100000
+//candidates a brute force thread claims at once
+#define BF_BLOCK 4096
+//bytes of the wordlist a thread claims at once
+#define BF_WL_CHUNK 16384
+#define BF_STATUS_PW_LEN 32
+//most candidates handed to a batch test at once
+#define BF_MAX_LANES 16
+//most characters one position of a mask can take
+#define BF_MASK_SET_LEN 256
+#define BF_DIGEST_LEN 16
+//bytes of a found pw in its bf_status_hit, longer ones get cut
+#define BF_HIT_PW_LEN 124
+
+typedef struct bf_job bf_job;
+typedef struct bf_wordlist bf_wordlist;
+struct bf_thread_arg;
+
+//progress and cancellation without syscalls, shared with the caller for
+//the whole run. the caller sets cancel, the threads update the rest
+//whenever they claim new work. found counts the targets found so far,
+//position and total count bytes of the wordlist or brute force candidates.
+//the checkpoint is the point everything before got tested at, its position
+//and the wordlist offset or the next brute force or mask candidate. seq is
+//odd while the threads write it. if the caller sets resume, the run starts
+//at the checkpoint (and tried where it was) instead of the beginning.
+typedef struct {
+    volatile int cancel;
+    volatile int found;
+    volatile unsigned long long tried;
+    volatile double position;
+    volatile double total;
+    char current[BF_STATUS_PW_LEN];
+
+    volatile int resume;
+    volatile unsigned int seq;
+    volatile double saved;
+    volatile long long offset;
+    char next[BF_STATUS_PW_LEN];
+} bf_status;
+
+//if the status buffer is larger than a bf_status, one of these per target
+//follows it and is filled in as soon as the target is found
+typedef struct {
+    volatile int found;
+    char pw[BF_HIT_PW_LEN];
+} bf_status_hit;
+
+//one (data, digest) pair to crack, data says how the digest is salted. the
+//binding sets salt to whatever its hash function needs to hash a candidate
+//with that data (like the md5 state after the data), the rest is the result.
+typedef struct {
+    const char *data;
+    int len;
+    const char *digest;
+    const void *salt;
+
+    int group;
+    int found;
+    char pw[BF_LINE_LEN];
+} bf_target;
+
+//targets with the same data share one hash per candidate, their digests
+//go into a set (open addressing on the first four bytes of the digest)
+typedef struct {
+    const void *salt;
+    int first;
+    int num;
+    volatile int left;
+    unsigned int mask;
+    int *slots;
+} bf_group;
+
+//hashes n candidates (up to lanes) for the salt of a target, the
+//candidates are zero padded to at least BF_MAX_PW_LEN bytes unless the
+//job is set to bf_zero_copy()
+typedef void (*bf_hash_func)(bf_job *, const void *, const char **, const int *, int, unsigned char (*)[BF_DIGEST_LEN]);
+
+struct bf_job {
+    int bf;
+    int full;
+    const char *wl;
+    const char *lockfile;
+    bf_status *status;
+    bf_status_hit *hits;
+    int num_hits;
+    bf_hash_func hash;
+    int lanes;
+    int zero_copy;
+    void *arg;
+    bf_target *targets;
+    int num_targets;
+    //mask instead of the charsets for brute force, see bf_mask()
+    int mask_len;
+    char mask_sets[BF_MAX_PW_LEN][BF_MASK_SET_LEN];
+    int mask_sizes[BF_MAX_PW_LEN];
+    //mangling rules for the wordlist, see bf_rules()
+    const char *rules;
+    int num_rules;
+
+    //result, the pws are in the targets
+    int found;
+    unsigned long long tried;
+    double elapsed;
+
+    //shared between the threads
+    volatile int stop;
+    pthread_mutex_t mutex;
+    struct bf_thread_arg *args;
+    int num_args;
+    bf_group *groups;
+    int num_groups;
+    //the wordlist is mapped, the threads claim BF_WL_CHUNK bytes of it
+    //at a time by moving wl_next on without the mutex
+    bf_wordlist *wlist;
+    volatile long long wl_next;
+    char next[BF_MAX_PW_LEN+1];
+    int mask_next[BF_MAX_PW_LEN];
+    int exhausted;
+    double position;
+    double total;
+};
+
+extern int inc_brute_pw(char *, int, int);
+extern void bf_init(bf_job *, int, int, const char *, const char *, bf_status *, bf_hash_func, void *);
+extern void bf_batch(bf_job *, int);
+extern void bf_zero_copy(bf_job *);
+extern void bf_targets(bf_job *, bf_target *, int);
+extern int bf_mask(bf_job *, const char *);
+extern int bf_rules(bf_job *, const char *);
+extern int bf_run(bf_job *, int);
+
+#ifdef Py_PYTHON_H
+//the lockfile argument of the bindings is either the name of a lockfile,
+//which gets polled every BF_CHECK_FOR_LOCKFILE candidates, or a writable
+//buffer (a bytearray) of sizeof(bf_status) bytes, optionally followed by
+//a bf_status_hit per target
+static int bf_parse_control(PyObject *obj, const char **lockfile, bf_status **status, Py_buffer *view) {
+    *lockfile = NULL;
+    *status = NULL;
+    view->obj = NULL;
+    if(PyString_Check(obj)) {
+        *lockfile = PyString_AsString(obj);
+        return 1;
+    }
+    if(PyObject_GetBuffer(obj, view, PyBUF_WRITABLE) < 0)
+        return 0;
+    if(view->len < (Py_ssize_t) sizeof(bf_status)) {
+        PyBuffer_Release(view);
+        view->obj = NULL;
+        PyErr_Format(PyExc_ValueError, "status buffer must have at least %d bytes", (int) sizeof(bf_status));
+        return 0;
+    }
+    *status = (bf_status *) view->buf;
+    return 1;
+}
+
+//points the job at the bf_status_hits following the status, call it
+//after bf_init
+static void bf_control_hits(bf_job *job, Py_buffer *view) {
+    if(!view->obj)
+        return;
+    job->hits = (bf_status_hit *) ((char *) view->buf + sizeof(bf_status));
+    job->num_hits = (view->len - sizeof(bf_status)) / sizeof(bf_status_hit);
+}
+
+static void bf_release_control(Py_buffer *view) {
+    if(view->obj)
+        PyBuffer_Release(view);
+}
+
+//the optional mask and rules arguments of the bindings, either may be NULL
+static int bf_parse_mode(bf_job *job, const char *mask, const char *rules) {
+    if(!bf_mask(job, mask)) {
+        PyErr_SetString(PyExc_ValueError, "invalid mask");
+        return 0;
+    }
+    if(!bf_rules(job, rules)) {
+        PyErr_SetString(PyExc_ValueError, "invalid rules");
+        return 0;
+    }
+    return 1;
+}
+
+//the targets argument of the bindings, a sequence of (digest, data) string
+//tuples. returns a new array of n targets with data and digest pointing
+//into seq, which the caller has to keep until the targets are freed.
+static bf_target *bf_parse_targets(PyObject *obj, PyObject **seq, int *n) {
+    bf_target *targets;
+    PyObject *item;
+    Py_ssize_t len;
+    int i;
+
+    if(!(*seq = PySequence_Fast(obj, "targets must be a sequence")))
+        return NULL;
+    *n = PySequence_Fast_GET_SIZE(*seq);
+    if(!*n) {
+        PyErr_SetString(PyExc_ValueError, "no targets");
+        Py_DECREF(*seq);
+        return NULL;
+    }
+    if(!(targets = calloc(*n, sizeof(bf_target)))) {
+        PyErr_NoMemory();
+        Py_DECREF(*seq);
+        return NULL;
+    }
+    for(i = 0; i < *n; i++) {
+        item = PySequence_Fast_GET_ITEM(*seq, i);
+        if(!PyTuple_Check(item) || PyTuple_GET_SIZE(item) != 2 || !PyString_Check(PyTuple_GET_ITEM(item, 0)) || !PyString_Check(PyTuple_GET_ITEM(item, 1))) {
+            PyErr_SetString(PyExc_TypeError, "targets must be (digest, data) tuples");
+            break;
+        }
+        PyString_AsStringAndSize(PyTuple_GET_ITEM(item, 0), (char **) &targets[i].digest, &len);
+        if(len != BF_DIGEST_LEN) {
+            PyErr_Format(PyExc_ValueError, "digest must have len %d", BF_DIGEST_LEN);
+            break;
+        }
+        PyString_AsStringAndSize(PyTuple_GET_ITEM(item, 1), (char **) &targets[i].data, &len);
+        targets[i].len = len;
+    }
+    if(i < *n) {
+        free(targets);
+        Py_DECREF(*seq);
+        return NULL;
+    }
+    return targets;
+}
+
+//a list with the pw of every target, None for the ones not found
+static PyObject *bf_found_list(bf_target *targets, int n) {
+    PyObject *list, *pw;
+    int i;
+
+    if(!(list = PyList_New(n)))
+        return NULL;
+    for(i = 0; i < n; i++) {
+        if(targets[i].found)
+            pw = PyString_FromString(targets[i].pw);
+        else {
+            Py_INCREF(Py_None);
+            pw = Py_None;
+        }
+        if(!pw) {
+            Py_DECREF(list);
+            return NULL;
+        }
+        PyList_SET_ITEM(list, i, pw);
+    }
+    return list;
+}
+#endif
+
+#endif
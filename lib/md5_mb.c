@@ -0,0 +1,452 @@
+/*
+ *      md5_mb.c
+ *
+ *      Copyright 2014 Daniel Mende <dmende@ernw.de>
+ */
+
+/*
+ *      Redistribution and use in source and binary forms, with or without
+ *      modification, are permitted provided that the following conditions are
+ *      met:
+ *      
+ *      * Redistributions of source code must retain the above copyright
+ *        notice, this list of conditions and the following disclaimer.
+ *      * Redistributions in binary form must reproduce the above
+ *        copyright notice, this list of conditions and the following disclaimer
+ *        in the documentation and/or other materials provided with the
+ *        distribution.
+ *      * Neither the name of the  nor the names of its
+ *        contributors may be used to endorse or promote products derived from
+ *        this software without specific prior written permission.
+ *      
+ *      THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ *      "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ *      LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ *      A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ *      OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ *      SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ *      LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ *      DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ *      THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ *      (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ *      OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#include <stdlib.h>
+#include <string.h>
+
+#include "lib/md5_mb.h"
+
+//room for the buffered bytes of a state, a tail and the padding
+#define MD5_MB_BUF (MD5_MB_MAX_TAIL + 128)
+
+#define MD5_MB_WORD(p) ((md5_word_t) (p)[0] | (md5_word_t) (p)[1] << 8 | (md5_word_t) (p)[2] << 16 | (md5_word_t) (p)[3] << 24)
+
+//the portable fallback, one message at a time
+#define MD5_MB_NAME md5_mb_scalar
+#define MD5_MB_ATTR
+#define MD5_MB_LANES 1
+#define V md5_word_t
+#define V_LOAD(p) (*(p))
+#define V_STORE(p, v) (*(p) = (v))
+#define V_SET1(x) ((md5_word_t) (x))
+#define V_ADD(x, y) ((x) + (y))
+#define V_AND(x, y) ((x) & (y))
+#define V_OR(x, y) ((x) | (y))
+#define V_XOR(x, y) ((x) ^ (y))
+#define V_ROL(x, n) (((x) << (n)) | ((x) >> (32 - (n))))
+#define V_BLOCKS(w, p) do { \
+        int j_; \
+        for(j_ = 0; j_ < 16; j_++) \
+            w[j_] = MD5_MB_WORD(p[0] + j_ * 4); \
+    } while(0)
+#include "lib/md5_mb_impl.h"
+#undef MD5_MB_NAME
+#undef MD5_MB_ATTR
+#undef MD5_MB_LANES
+#undef V
+#undef V_LOAD
+#undef V_STORE
+#undef V_SET1
+#undef V_ADD
+#undef V_AND
+#undef V_OR
+#undef V_XOR
+#undef V_ROL
+#undef V_BLOCKS
+
+//the simd engines need the target attribute to build them without
+//raising the instruction set of the whole binding
+#if (defined(__x86_64__) || defined(__i386__)) && (defined(__clang__) || (defined(__GNUC__) && __GNUC__ >= 5))
+#define MD5_MB_X86 1
+#include <immintrin.h>
+
+//x86 is little endian, so the words come straight out of 16 byte loads.
+//r0..r3 hold four words of four blocks each (per 128 bit part), the
+//unpacks turn them into one word of every block per vector
+#define MD5_MB_TRANSPOSE(w, j, r0, r1, r2, r3, UNPACKLO32, UNPACKHI32, UNPACKLO64, UNPACKHI64) do { \
+        V t0_ = UNPACKLO32(r0, r1), t1_ = UNPACKLO32(r2, r3); \
+        V t2_ = UNPACKHI32(r0, r1), t3_ = UNPACKHI32(r2, r3); \
+        w[(j)] = UNPACKLO64(t0_, t1_); \
+        w[(j) + 1] = UNPACKHI64(t0_, t1_); \
+        w[(j) + 2] = UNPACKLO64(t2_, t3_); \
+        w[(j) + 3] = UNPACKHI64(t2_, t3_); \
+    } while(0)
+#define MD5_MB_LOAD128(p, q) _mm_loadu_si128((const __m128i *) ((p) + (q) * 16))
+
+#define MD5_MB_NAME md5_mb_sse2
+#define MD5_MB_ATTR __attribute__((target("sse2")))
+#define MD5_MB_LANES 4
+#define V __m128i
+#define V_LOAD(p) _mm_loadu_si128((const __m128i *) (p))
+#define V_STORE(p, v) _mm_storeu_si128((__m128i *) (p), v)
+#define V_SET1(x) _mm_set1_epi32((int) (x))
+#define V_ADD(x, y) _mm_add_epi32(x, y)
+#define V_AND(x, y) _mm_and_si128(x, y)
+#define V_OR(x, y) _mm_or_si128(x, y)
+#define V_XOR(x, y) _mm_xor_si128(x, y)
+#define V_ROL(x, n) _mm_or_si128(_mm_slli_epi32(x, n), _mm_srli_epi32(x, 32 - (n)))
+#define V_BLOCKS(w, p) do { \
+        int q_; \
+        for(q_ = 0; q_ < 4; q_++) \
+            MD5_MB_TRANSPOSE(w, q_ * 4, MD5_MB_LOAD128(p[0], q_), MD5_MB_LOAD128(p[1], q_), \
+                MD5_MB_LOAD128(p[2], q_), MD5_MB_LOAD128(p[3], q_), \
+                _mm_unpacklo_epi32, _mm_unpackhi_epi32, _mm_unpacklo_epi64, _mm_unpackhi_epi64); \
+    } while(0)
+#include "lib/md5_mb_impl.h"
+#undef MD5_MB_NAME
+#undef MD5_MB_ATTR
+#undef MD5_MB_LANES
+#undef V
+#undef V_LOAD
+#undef V_STORE
+#undef V_SET1
+#undef V_ADD
+#undef V_AND
+#undef V_OR
+#undef V_XOR
+#undef V_ROL
+#undef V_BLOCKS
+
+#define MD5_MB_NAME md5_mb_avx2
+#define MD5_MB_ATTR __attribute__((target("avx2")))
+#define MD5_MB_LANES 8
+#define V __m256i
+#define V_LOAD(p) _mm256_loadu_si256((const __m256i *) (p))
+#define V_STORE(p, v) _mm256_storeu_si256((__m256i *) (p), v)
+#define V_SET1(x) _mm256_set1_epi32((int) (x))
+#define V_ADD(x, y) _mm256_add_epi32(x, y)
+#define V_AND(x, y) _mm256_and_si256(x, y)
+#define V_OR(x, y) _mm256_or_si256(x, y)
+#define V_XOR(x, y) _mm256_xor_si256(x, y)
+#define V_ROL(x, n) _mm256_or_si256(_mm256_slli_epi32(x, n), _mm256_srli_epi32(x, 32 - (n)))
+//blocks i and i + 4 share a register
+#define MD5_MB_LOAD256(p, i, q) _mm256_inserti128_si256(_mm256_castsi128_si256(MD5_MB_LOAD128(p[(i)], q)), MD5_MB_LOAD128(p[(i) + 4], q), 1)
+#define V_BLOCKS(w, p) do { \
+        int q_; \
+        for(q_ = 0; q_ < 4; q_++) \
+            MD5_MB_TRANSPOSE(w, q_ * 4, MD5_MB_LOAD256(p, 0, q_), MD5_MB_LOAD256(p, 1, q_), \
+                MD5_MB_LOAD256(p, 2, q_), MD5_MB_LOAD256(p, 3, q_), \
+                _mm256_unpacklo_epi32, _mm256_unpackhi_epi32, _mm256_unpacklo_epi64, _mm256_unpackhi_epi64); \
+    } while(0)
+#include "lib/md5_mb_impl.h"
+#undef MD5_MB_NAME
+#undef MD5_MB_ATTR
+#undef MD5_MB_LANES
+#undef V
+#undef V_LOAD
+#undef V_STORE
+#undef V_SET1
+#undef V_ADD
+#undef V_AND
+#undef V_OR
+#undef V_XOR
+#undef V_ROL
+#undef V_BLOCKS
+
+#define MD5_MB_NAME md5_mb_avx512
+#define MD5_MB_ATTR __attribute__((target("avx512f")))
+#define MD5_MB_LANES 16
+#define V __m512i
+#define V_LOAD(p) _mm512_loadu_si512((const void *) (p))
+#define V_STORE(p, v) _mm512_storeu_si512((void *) (p), v)
+#define V_SET1(x) _mm512_set1_epi32((int) (x))
+#define V_ADD(x, y) _mm512_add_epi32(x, y)
+#define V_AND(x, y) _mm512_and_si512(x, y)
+#define V_OR(x, y) _mm512_or_si512(x, y)
+#define V_XOR(x, y) _mm512_xor_si512(x, y)
+#define V_ROL(x, n) _mm512_rol_epi32(x, n)
+//blocks i, i + 4, i + 8 and i + 12 share a register
+#define MD5_MB_LOAD512(p, i, q) _mm512_inserti32x4(_mm512_inserti32x4(_mm512_inserti32x4( \
+        _mm512_castsi128_si512(MD5_MB_LOAD128(p[(i)], q)), MD5_MB_LOAD128(p[(i) + 4], q), 1), \
+        MD5_MB_LOAD128(p[(i) + 8], q), 2), MD5_MB_LOAD128(p[(i) + 12], q), 3)
+#define V_BLOCKS(w, p) do { \
+        int q_; \
+        for(q_ = 0; q_ < 4; q_++) \
+            MD5_MB_TRANSPOSE(w, q_ * 4, MD5_MB_LOAD512(p, 0, q_), MD5_MB_LOAD512(p, 1, q_), \
+                MD5_MB_LOAD512(p, 2, q_), MD5_MB_LOAD512(p, 3, q_), \
+                _mm512_unpacklo_epi32, _mm512_unpackhi_epi32, _mm512_unpacklo_epi64, _mm512_unpackhi_epi64); \
+    } while(0)
+#include "lib/md5_mb_impl.h"
+#undef MD5_MB_NAME
+#undef MD5_MB_ATTR
+#undef MD5_MB_LANES
+#undef V
+#undef V_LOAD
+#undef V_STORE
+#undef V_SET1
+#undef V_ADD
+#undef V_AND
+#undef V_OR
+#undef V_XOR
+#undef V_ROL
+#undef V_BLOCKS
+
+static int has_sse2(void) {
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("sse2");
+}
+
+static int has_avx2(void) {
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx2");
+}
+
+static int has_avx512(void) {
+    __builtin_cpu_init();
+    return __builtin_cpu_supports("avx512f");
+}
+#endif
+
+typedef void (*md5_mb_func)(md5_word_t [4][MD5_MB_MAX_LANES], const md5_byte_t *const *, int);
+
+typedef struct {
+    const char *name;
+    int lanes;
+    md5_mb_func func;
+    int (*supported)(void);
+} md5_mb_impl;
+
+//best first
+static const md5_mb_impl engines[] = {
+#ifdef MD5_MB_X86
+    { "avx512", 16, md5_mb_avx512, has_avx512 },
+    { "avx2", 8, md5_mb_avx2, has_avx2 },
+    { "sse2", 4, md5_mb_sse2, has_sse2 },
+#endif
+    { "scalar", 1, md5_mb_scalar, NULL },
+};
+
+static const md5_mb_impl *engine = NULL;
+
+//picks the engine, bindings call this on import so the threads never race on it
+void md5_mb_init(void) {
+    const md5_mb_impl *cur = NULL;
+    const char *want;
+    int i;
+
+    if(engine)
+        return;
+    want = getenv("LOKI_MD5_ENGINE");
+    if(want && !*want)
+        want = NULL;
+    //the best supported one, unless another supported one was asked for
+    for(i = 0; i < (int) (sizeof(engines) / sizeof(md5_mb_impl)); i++) {
+        if(engines[i].supported && !engines[i].supported())
+            continue;
+        if(!cur)
+            cur = &engines[i];
+        if(!want || !strcmp(want, engines[i].name)) {
+            cur = &engines[i];
+            break;
+        }
+    }
+    engine = cur;
+}
+
+const char *md5_mb_engine(void) {
+    md5_mb_init();
+    return engine->name;
+}
+
+int md5_mb_lanes(void) {
+    md5_mb_init();
+    return engine->lanes;
+}
+
+//all lanes, so the unused ones of the last vector start out defined
+static void md5_mb_start(md5_word_t state[4][MD5_MB_MAX_LANES], const md5_word_t *abcd) {
+    int i, j;
+
+    for(i = 0; i < 4; i++)
+        for(j = 0; j < MD5_MB_MAX_LANES; j++)
+            state[i][j] = abcd[i];
+}
+
+static void md5_mb_digest(md5_word_t state[4][MD5_MB_MAX_LANES], int lane, md5_byte_t *digest) {
+    md5_word_t word;
+    int i;
+
+    for(i = 0; i < 4; i++) {
+        word = state[i][lane];
+#if ARCH_IS_BIG_ENDIAN
+        word = (word >> 24) | (word >> 8 & 0xff00) | (word << 8 & 0xff0000) | (word << 24);
+#endif
+        memcpy(digest + i * 4, &word, 4);
+    }
+}
+
+//the 0x80 after the message and its length in bits at the end of the
+//last block, the bytes in between have to be zero already
+static void md5_mb_pad(md5_byte_t *end, md5_byte_t *bits, md5_word_t bits_lo, md5_word_t bits_hi) {
+    int i;
+
+    *end = 0x80;
+    for(i = 0; i < 4; i++) {
+        bits[i] = (md5_byte_t) (bits_lo >> (i * 8));
+        bits[i + 4] = (md5_byte_t) (bits_hi >> (i * 8));
+    }
+}
+
+void md5_mb_append_finish(const md5_state_t *base, const md5_byte_t *const *tails, const int *lens, int n, md5_byte_t (*digests)[16]) {
+    md5_byte_t bufs[MD5_MB_MAX_LANES][MD5_MB_BUF];
+    md5_byte_t tmpl[MD5_MB_BUF];
+    md5_word_t state[4][MD5_MB_MAX_LANES];
+    md5_word_t saved[4][MD5_MB_MAX_LANES];
+    const md5_byte_t *blocks[MD5_MB_MAX_LANES];
+    int nblocks[MD5_MB_MAX_LANES];
+    int lane[MD5_MB_MAX_LANES];
+    md5_word_t lo, hi;
+    md5_state_t cur;
+    int used = base->count[0] >> 3 & 63;
+    int i, j, k, len, done, m = 0, max = 0;
+
+    md5_mb_init();
+    //the bytes buffered in base followed by zeros, every lane starts out
+    //as a copy of this
+    memcpy(tmpl, base->buf, used);
+    memset(tmpl + used, 0, MD5_MB_BUF - used);
+    for(i = 0; i < n; i++) {
+        len = lens[i];
+        if(len > MD5_MB_MAX_TAIL) {
+            memcpy(&cur, base, sizeof(md5_state_t));
+            md5_append(&cur, tails[i], len);
+            md5_finish(&cur, digests[i]);
+            continue;
+        }
+        lo = base->count[0] + ((md5_word_t) len << 3);
+        hi = base->count[1] + (lo < base->count[0]);
+        nblocks[m] = (used + len + 8) / 64 + 1;
+        //fixed sizes, so the compiler inlines the copies for the usual
+        //message of up to two blocks
+        if(nblocks[m] <= 2)
+            memcpy(bufs[m], tmpl, 128);
+        else
+            memcpy(bufs[m], tmpl, MD5_MB_BUF);
+        //the keys of ospf and bfd always have 16 bytes, a fixed size copy
+        //is a lot cheaper than a call to memcpy
+        if(len == 16)
+            memcpy(bufs[m] + used, tails[i], 16);
+        else
+            memcpy(bufs[m] + used, tails[i], len);
+        md5_mb_pad(bufs[m] + used + len, bufs[m] + nblocks[m] * 64 - 8, lo, hi);
+        if(nblocks[m] > max)
+            max = nblocks[m];
+        lane[m++] = i;
+    }
+    if(!m)
+        return;
+
+    md5_mb_start(state, base->abcd);
+    for(k = 0; k < max; k++) {
+        done = 0;
+        for(i = 0; i < m; i++) {
+            if(k < nblocks[i])
+                blocks[i] = bufs[i] + k * 64;
+            else {
+                blocks[i] = bufs[i];
+                done = 1;
+            }
+        }
+        if(done)
+            memcpy(saved, state, sizeof(saved));
+        engine->func(state, blocks, m);
+        //messages that were already done get their state back
+        if(done)
+            for(i = 0; i < m; i++)
+                if(k >= nblocks[i])
+                    for(j = 0; j < 4; j++)
+                        state[j][i] = saved[j][i];
+    }
+    for(i = 0; i < m; i++)
+        md5_mb_digest(state, i, digests[lane[i]]);
+}
+
+void md5_mb_hmac(const md5_byte_t *text, int text_len, const md5_byte_t *const *keys, const int *key_lens, int n, md5_byte_t (*digests)[16]) {
+    static const md5_word_t iv[4] = { 0x67452301, 0xefcdab89, 0x98badcfe, 0x10325476 };
+    md5_byte_t ipad[MD5_MB_MAX_LANES][64];
+    md5_byte_t opad[MD5_MB_MAX_LANES][64];
+    md5_byte_t inner[MD5_MB_MAX_LANES][64];
+    md5_byte_t last[128];
+    md5_byte_t tk[16];
+    md5_word_t state[4][MD5_MB_MAX_LANES];
+    const md5_byte_t *blocks[MD5_MB_MAX_LANES];
+    const md5_byte_t *key;
+    md5_state_t cur;
+    int i, j, key_len, full, nlast;
+
+    md5_mb_init();
+    for(i = 0; i < n; i++) {
+        key = keys[i];
+        key_len = key_lens[i];
+        //keys longer than a block are replaced by their md5, as in hmac_md5()
+        if(key_len > 64) {
+            md5_init(&cur);
+            md5_append(&cur, key, key_len);
+            md5_finish(&cur, tk);
+            key = tk;
+            key_len = 16;
+        }
+        for(j = 0; j < 64; j++) {
+            ipad[i][j] = (j < key_len ? key[j] : 0) ^ 0x36;
+            opad[i][j] = (j < key_len ? key[j] : 0) ^ 0x5c;
+        }
+    }
+
+    //inner md5, only the first block differs between the keys
+    md5_mb_start(state, iv);
+    for(i = 0; i < n; i++)
+        blocks[i] = ipad[i];
+    engine->func(state, blocks, n);
+    full = text_len / 64;
+    for(j = 0; j < full; j++) {
+        for(i = 0; i < n; i++)
+            blocks[i] = text + j * 64;
+        engine->func(state, blocks, n);
+    }
+    memset(last, 0, sizeof(last));
+    memcpy(last, text + full * 64, text_len - full * 64);
+    nlast = (text_len - full * 64 + 8) / 64 + 1;
+    md5_mb_pad(last + text_len - full * 64, last + nlast * 64 - 8, (md5_word_t) (64 + text_len) << 3, (md5_word_t) ((64 + (unsigned long long) text_len) >> 29));
+    for(j = 0; j < nlast; j++) {
+        for(i = 0; i < n; i++)
+            blocks[i] = last + j * 64;
+        engine->func(state, blocks, n);
+    }
+    memset(inner, 0, sizeof(inner));
+    for(i = 0; i < n; i++) {
+        md5_mb_digest(state, i, inner[i]);
+        md5_mb_pad(inner[i] + 16, inner[i] + 56, (64 + 16) << 3, 0);
+    }
+
+    //outer md5
+    md5_mb_start(state, iv);
+    for(i = 0; i < n; i++)
+        blocks[i] = opad[i];
+    engine->func(state, blocks, n);
+    for(i = 0; i < n; i++)
+        blocks[i] = inner[i];
+    engine->func(state, blocks, n);
+    for(i = 0; i < n; i++)
+        md5_mb_digest(state, i, digests[i]);
+}
@@ -0,0 +1,60 @@
+/*
+ *      md5_mb.h
+ *
+ *      Copyright 2014 Daniel Mende <dmende@ernw.de>
+ */
+
+/*
+ *      Redistribution and use in source and binary forms, with or without
+ *      modification, are permitted provided that the following conditions are
+ *      met:
+ *      
+ *      * Redistributions of source code must retain the above copyright
+ *        notice, this list of conditions and the following disclaimer.
+ *      * Redistributions in binary form must reproduce the above
+ *        copyright notice, this list of conditions and the following disclaimer
+ *        in the documentation and/or other materials provided with the
+ *        distribution.
+ *      * Neither the name of the  nor the names of its
+ *        contributors may be used to endorse or promote products derived from
+ *        this software without specific prior written permission.
+ *      
+ *      THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ *      "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ *      LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ *      A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ *      OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ *      SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ *      LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ *      DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ *      THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ *      (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ *      OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+#ifndef MD5_MB_H
+#define MD5_MB_H 1
+
+#ifndef ARCH_IS_BIG_ENDIAN
+#define ARCH_IS_BIG_ENDIAN 0
+#endif
+#include "lib/md5.h"
+
+//multi buffer md5, hashes a number of independent messages at once with
+//one message per simd lane. the engine (avx512, avx2, sse2 or the scalar
+//fallback) is chosen at runtime by what the cpu supports, setting
+//LOKI_MD5_ENGINE in the environment overrides that.
+#define MD5_MB_MAX_LANES 16
+//tails longer than this are hashed with md5_append
+#define MD5_MB_MAX_TAIL 192
+
+extern void md5_mb_init(void);
+extern const char *md5_mb_engine(void);
+extern int md5_mb_lanes(void);
+
+//digests[i] = md5 of the message in base followed by lens[i] bytes of tails[i]
+extern void md5_mb_append_finish(const md5_state_t *, const md5_byte_t *const *, const int *, int, md5_byte_t (*)[16]);
+//digests[i] = hmac-md5 of text with the key keys[i] of len key_lens[i]
+extern void md5_mb_hmac(const md5_byte_t *, int, const md5_byte_t *const *, const int *, int, md5_byte_t (*)[16]);
+
+#endif
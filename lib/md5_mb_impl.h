@@ -0,0 +1,152 @@
+/*
+ *      md5_mb_impl.h
+ *
+ *      Copyright 2014 Daniel Mende <dmende@ernw.de>
+ */
+
+/*
+ *      Redistribution and use in source and binary forms, with or without
+ *      modification, are permitted provided that the following conditions are
+ *      met:
+ *      
+ *      * Redistributions of source code must retain the above copyright
+ *        notice, this list of conditions and the following disclaimer.
+ *      * Redistributions in binary form must reproduce the above
+ *        copyright notice, this list of conditions and the following disclaimer
+ *        in the documentation and/or other materials provided with the
+ *        distribution.
+ *      * Neither the name of the  nor the names of its
+ *        contributors may be used to endorse or promote products derived from
+ *        this software without specific prior written permission.
+ *      
+ *      THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ *      "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ *      LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ *      A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+ *      OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+ *      SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+ *      LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+ *      DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+ *      THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+ *      (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+ *      OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+ */
+
+//the md5 block function for one engine, md5_mb.c includes this once per
+//engine after defining
+//  MD5_MB_NAME     name of the function
+//  MD5_MB_ATTR     function attributes (the target instruction set)
+//  MD5_MB_LANES    messages per vector
+//  V               the vector type
+//  V_LOAD(p), V_STORE(p, v), V_SET1(x), V_ADD(x, y), V_AND(x, y),
+//  V_OR(x, y), V_XOR(x, y), V_ROL(x, n)
+//  V_BLOCKS(w, p)  loads the 16 words of the blocks p[0..MD5_MB_LANES-1]
+//                  into w, word j of block i goes to lane i of w[j]
+//
+//it compresses one 64 byte block per message into state, which holds the
+//a, b, c and d words of every message in lanes.
+
+#define MB_F(x, y, z) V_XOR(z, V_AND(x, V_XOR(y, z)))
+#define MB_G(x, y, z) V_XOR(y, V_AND(z, V_XOR(x, y)))
+#define MB_H(x, y, z) V_XOR(V_XOR(x, y), z)
+#define MB_I(x, y, z) V_XOR(y, V_OR(x, V_XOR(z, ones)))
+#define MB_STEP(f, a, b, c, d, k, s, t) \
+    a = V_ADD(a, V_ADD(f(b, c, d), V_ADD(w[k], V_SET1(t)))); \
+    a = V_ADD(V_ROL(a, s), b);
+
+static MD5_MB_ATTR void MD5_MB_NAME(md5_word_t state[4][MD5_MB_MAX_LANES], const md5_byte_t *const *blocks, int n) {
+    const md5_byte_t *p[MD5_MB_LANES];
+    V w[16], a, b, c, d, aa, bb, cc, dd, ones;
+    int g, i;
+
+    ones = V_SET1(0xffffffff);
+    for(g = 0; g < n; g += MD5_MB_LANES) {
+        //unused lanes of the last vector hash the first block again
+        for(i = 0; i < MD5_MB_LANES; i++)
+            p[i] = blocks[g + i < n ? g + i : g];
+        V_BLOCKS(w, p);
+        a = aa = V_LOAD(&state[0][g]);
+        b = bb = V_LOAD(&state[1][g]);
+        c = cc = V_LOAD(&state[2][g]);
+        d = dd = V_LOAD(&state[3][g]);
+
+        MB_STEP(MB_F, a, b, c, d,  0,  7, 0xd76aa478)
+        MB_STEP(MB_F, d, a, b, c,  1, 12, 0xe8c7b756)
+        MB_STEP(MB_F, c, d, a, b,  2, 17, 0x242070db)
+        MB_STEP(MB_F, b, c, d, a,  3, 22, 0xc1bdceee)
+        MB_STEP(MB_F, a, b, c, d,  4,  7, 0xf57c0faf)
+        MB_STEP(MB_F, d, a, b, c,  5, 12, 0x4787c62a)
+        MB_STEP(MB_F, c, d, a, b,  6, 17, 0xa8304613)
+        MB_STEP(MB_F, b, c, d, a,  7, 22, 0xfd469501)
+        MB_STEP(MB_F, a, b, c, d,  8,  7, 0x698098d8)
+        MB_STEP(MB_F, d, a, b, c,  9, 12, 0x8b44f7af)
+        MB_STEP(MB_F, c, d, a, b, 10, 17, 0xffff5bb1)
+        MB_STEP(MB_F, b, c, d, a, 11, 22, 0x895cd7be)
+        MB_STEP(MB_F, a, b, c, d, 12,  7, 0x6b901122)
+        MB_STEP(MB_F, d, a, b, c, 13, 12, 0xfd987193)
+        MB_STEP(MB_F, c, d, a, b, 14, 17, 0xa679438e)
+        MB_STEP(MB_F, b, c, d, a, 15, 22, 0x49b40821)
+
+        MB_STEP(MB_G, a, b, c, d,  1,  5, 0xf61e2562)
+        MB_STEP(MB_G, d, a, b, c,  6,  9, 0xc040b340)
+        MB_STEP(MB_G, c, d, a, b, 11, 14, 0x265e5a51)
+        MB_STEP(MB_G, b, c, d, a,  0, 20, 0xe9b6c7aa)
+        MB_STEP(MB_G, a, b, c, d,  5,  5, 0xd62f105d)
+        MB_STEP(MB_G, d, a, b, c, 10,  9, 0x02441453)
+        MB_STEP(MB_G, c, d, a, b, 15, 14, 0xd8a1e681)
+        MB_STEP(MB_G, b, c, d, a,  4, 20, 0xe7d3fbc8)
+        MB_STEP(MB_G, a, b, c, d,  9,  5, 0x21e1cde6)
+        MB_STEP(MB_G, d, a, b, c, 14,  9, 0xc33707d6)
+        MB_STEP(MB_G, c, d, a, b,  3, 14, 0xf4d50d87)
+        MB_STEP(MB_G, b, c, d, a,  8, 20, 0x455a14ed)
+        MB_STEP(MB_G, a, b, c, d, 13,  5, 0xa9e3e905)
+        MB_STEP(MB_G, d, a, b, c,  2,  9, 0xfcefa3f8)
+        MB_STEP(MB_G, c, d, a, b,  7, 14, 0x676f02d9)
+        MB_STEP(MB_G, b, c, d, a, 12, 20, 0x8d2a4c8a)
+
+        MB_STEP(MB_H, a, b, c, d,  5,  4, 0xfffa3942)
+        MB_STEP(MB_H, d, a, b, c,  8, 11, 0x8771f681)
+        MB_STEP(MB_H, c, d, a, b, 11, 16, 0x6d9d6122)
+        MB_STEP(MB_H, b, c, d, a, 14, 23, 0xfde5380c)
+        MB_STEP(MB_H, a, b, c, d,  1,  4, 0xa4beea44)
+        MB_STEP(MB_H, d, a, b, c,  4, 11, 0x4bdecfa9)
+        MB_STEP(MB_H, c, d, a, b,  7, 16, 0xf6bb4b60)
+        MB_STEP(MB_H, b, c, d, a, 10, 23, 0xbebfbc70)
+        MB_STEP(MB_H, a, b, c, d, 13,  4, 0x289b7ec6)
+        MB_STEP(MB_H, d, a, b, c,  0, 11, 0xeaa127fa)
+        MB_STEP(MB_H, c, d, a, b,  3, 16, 0xd4ef3085)
+        MB_STEP(MB_H, b, c, d, a,  6, 23, 0x04881d05)
+        MB_STEP(MB_H, a, b, c, d,  9,  4, 0xd9d4d039)
+        MB_STEP(MB_H, d, a, b, c, 12, 11, 0xe6db99e5)
+        MB_STEP(MB_H, c, d, a, b, 15, 16, 0x1fa27cf8)
+        MB_STEP(MB_H, b, c, d, a,  2, 23, 0xc4ac5665)
+
+        MB_STEP(MB_I, a, b, c, d,  0,  6, 0xf4292244)
+        MB_STEP(MB_I, d, a, b, c,  7, 10, 0x432aff97)
+        MB_STEP(MB_I, c, d, a, b, 14, 15, 0xab9423a7)
+        MB_STEP(MB_I, b, c, d, a,  5, 21, 0xfc93a039)
+        MB_STEP(MB_I, a, b, c, d, 12,  6, 0x655b59c3)
+        MB_STEP(MB_I, d, a, b, c,  3, 10, 0x8f0ccc92)
+        MB_STEP(MB_I, c, d, a, b, 10, 15, 0xffeff47d)
+        MB_STEP(MB_I, b, c, d, a,  1, 21, 0x85845dd1)
+        MB_STEP(MB_I, a, b, c, d,  8,  6, 0x6fa87e4f)
+        MB_STEP(MB_I, d, a, b, c, 15, 10, 0xfe2ce6e0)
+        MB_STEP(MB_I, c, d, a, b,  6, 15, 0xa3014314)
+        MB_STEP(MB_I, b, c, d, a, 13, 21, 0x4e0811a1)
+        MB_STEP(MB_I, a, b, c, d,  4,  6, 0xf7537e82)
+        MB_STEP(MB_I, d, a, b, c, 11, 10, 0xbd3af235)
+        MB_STEP(MB_I, c, d, a, b,  2, 15, 0x2ad7d2bb)
+        MB_STEP(MB_I, b, c, d, a,  9, 21, 0xeb86d391)
+
+        V_STORE(&state[0][g], V_ADD(a, aa));
+        V_STORE(&state[1][g], V_ADD(b, bb));
+        V_STORE(&state[2][g], V_ADD(c, cc));
+        V_STORE(&state[3][g], V_ADD(d, dd));
+    }
+}
+
+#undef MB_F
+#undef MB_G
+#undef MB_H
+#undef MB_I
+#undef MB_STEP
@@ -34,176 +34,119 @@
 
 #include <Python.h>
 
-#include <sys/stat.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
-#include <errno.h>
 
 #include "lib/hmac_md5.h"
+#include "lib/md5_mb.h"
 
-#define VERSION "0.1"
-#define MAX_BRUTE_PW_LEN 16
-#define CHECK_FOR_LOCKFILE 100000
+#include "lib/bf.h"
 
-int inc_brute_pw_r(char *cur, int pos) {
-    if(cur[pos] == 0) {
-        cur[pos] = 33;
-        return 1;
-    }
-    else if(cur[pos] >= 33 && cur[pos] < 126) {
-        cur[pos]++;
-        return 1;
-    }
-    else {
-        cur[pos] = 33;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw_r(cur, pos+1);
-        else
-            return 0;
-    }
-}
+#define VERSION "0.5"
 
-int inc_brute_pw(char *cur, int pos, int full) {    
-    if(full)
-        return inc_brute_pw_r(cur, pos);
+//salt is the target, the key goes into the hmac
+static void isismd5_hash(bf_job *job, const void *salt, const char **pws, const int *lens, int n, unsigned char (*digests)[BF_DIGEST_LEN]) {
+    const bf_target *target = (const bf_target *) salt;
 
-    if(cur[pos] == 0) {
-        cur[pos] = 48;
-        return 1;
-    }
-    else if(cur[pos] >= 48 && cur[pos] < 57) {
-        cur[pos]++;
-        return 1;
-    }
-    else if(cur[pos] == 57) {
-        cur[pos] = 65;
-        return 1;
-    }
-    else if(cur[pos] >= 57 && cur[pos] < 90) {
-        cur[pos]++;
-        return 1;
-    }
-    else if(cur[pos] == 90) {
-        cur[pos] = 97;
-        return 1;
-    }
-    else if(cur[pos] >= 97 && cur[pos] < 122) {
-        cur[pos]++;
-        return 1;
+    if(n > 1) {
+        md5_mb_hmac((const md5_byte_t *) target->data, target->len, (const md5_byte_t *const *) pws, lens, n, digests);
+        return;
     }
-    else {
-        cur[pos] = 48;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw(cur, pos+1, full);
-        else
-            return 0;
+    hmac_md5((unsigned char *) target->data, target->len, (unsigned char *) pws[0], lens[0], digests[0]);
+}
+
+//cracks the n targets in one run, returns the number found or -1 with an
+//exception set
+static int
+isismd5bf_crack(bf_target *targets, int n, int bf, int full, const char *wl, PyObject *control, int num_threads, const char *mask, const char *rules)
+{
+    const char *lockfile;
+    bf_status *status;
+    Py_buffer view;
+    bf_job job;
+    int i, ret = -1;
+
+    if(!bf_parse_control(control, &lockfile, &status, &view))
+        return -1;
+    for(i = 0; i < n; i++)
+        targets[i].salt = &targets[i];
+    bf_init(&job, bf, full, wl, lockfile, status, isismd5_hash, NULL);
+    bf_batch(&job, md5_mb_lanes());
+    bf_zero_copy(&job);
+    bf_targets(&job, targets, n);
+    bf_control_hits(&job, &view);
+    if(bf_parse_mode(&job, mask, rules)) {
+        Py_BEGIN_ALLOW_THREADS
+        ret = bf_run(&job, num_threads);
+        Py_END_ALLOW_THREADS
+        if(ret < 0)
+            PyErr_SetFromErrnoWithFilename(PyExc_IOError, (char *) wl);
     }
+    bf_release_control(&view);
+    return ret;
 }
 
 static PyObject *
 isismd5bf_bf(PyObject *self, PyObject *args)
 {
-    int bf, full, len, foo;
-    unsigned char *wl, *data;
-    FILE *wlist, *lock;
-    char brute_pw[MAX_BRUTE_PW_LEN+1];
-    char line[512];
-    char *pw = NULL;
-    unsigned char *md5sum;
-    int count = 0;
-    char *lockfile;
-    struct stat fcheck;
-    md5_byte_t digest[16];
-    int i;
-
-    if(!PyArg_ParseTuple(args, "iiss#s#s", &bf, &full, &wl, &md5sum, &foo, &data, &len, &lockfile))
+    int bf, full, len, foo, ret;
+    int num_threads = 1;
+    const char *wl, *data, *md5sum;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *control;
+    bf_target target;
+
+    if(!PyArg_ParseTuple(args, "iiss#s#O|izz", &bf, &full, &wl, &md5sum, &foo, &data, &len, &control, &num_threads, &mask, &rules))
         return NULL;
     if(foo != 16) {
-        fprintf(stderr, "md5sum must have len 16!\n");
+        PyErr_SetString(PyExc_ValueError, "md5sum must have len 16");
         return NULL;
     }
 
-    if(!bf) {
-        if(!(wlist = fopen(wl, "r"))) {
-            fprintf(stderr, "Cant open wordlist: %s\n", strerror(errno));
-            return NULL;
-        }
-
-        Py_BEGIN_ALLOW_THREADS
-            
-        while(fgets(line, 512, wlist)) {
-            char *tmp = strchr(line, '\n');
-            if(tmp)
-                *tmp = '\0';
-            tmp = strchr(line, '\r');
-            if(tmp)
-                *tmp = '\0';
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck)) {
-                    fprintf(stderr, "No lockfile, exiting.\n");
-                    break;
-                }
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", line);
-                fclose(lock);
-                count = 0;
-            }
-
-            hmac_md5((unsigned char *) data, len, line, strlen(line), digest);
-            
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = line;
-                fprintf(stderr, "Found pw '%s'.\n", pw);
-                break;
-            }
-            count++;
-        }
-
-        Py_END_ALLOW_THREADS
-    }
-    else {
-        bzero(brute_pw, MAX_BRUTE_PW_LEN+1);
-
-        Py_BEGIN_ALLOW_THREADS
+    memset(&target, 0, sizeof(bf_target));
+    target.data = data;
+    target.len = len;
+    target.digest = md5sum;
+    if((ret = isismd5bf_crack(&target, 1, bf, full, wl, control, num_threads, mask, rules)) < 0)
+        return NULL;
+    if(!ret)
+        Py_RETURN_NONE;
+    return Py_BuildValue("s", target.pw);
+}
 
-        do {
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck)) {
-                    fprintf(stderr, "No lockfile, exiting.\n");
-                    break;
-                }
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", brute_pw);
-                fclose(lock);
-                count = 0;
-            }
-            
-            hmac_md5((unsigned char *) data, len, brute_pw, strlen(brute_pw), digest);
-            
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = brute_pw;
-                fprintf(stderr, "Found pw '%s'.\n", pw);
-                break;
-            }
-            count++;
-        } while(inc_brute_pw(brute_pw, 0, full));
-        
-        Py_END_ALLOW_THREADS
-    }
+static PyObject *
+isismd5bf_bf_multi(PyObject *self, PyObject *args)
+{
+    int bf, full, n;
+    int num_threads = 1;
+    const char *wl;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *obj, *seq, *control, *ret = NULL;
+    bf_target *targets;
+
+    if(!PyArg_ParseTuple(args, "iisOO|izz", &bf, &full, &wl, &obj, &control, &num_threads, &mask, &rules))
+        return NULL;
+    if(!(targets = bf_parse_targets(obj, &seq, &n)))
+        return NULL;
 
-    return Py_BuildValue("s", pw);
+    if(isismd5bf_crack(targets, n, bf, full, wl, control, num_threads, mask, rules) >= 0)
+        ret = bf_found_list(targets, n);
+    free(targets);
+    Py_DECREF(seq);
+    return ret;
+}
 
+static PyObject *
+isismd5bf_engine(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("s", md5_mb_engine());
 }
 
 static PyMethodDef Isismd5bfMethods[] = {
     {"bf", isismd5bf_bf, METH_VARARGS, "Bruteforce cracking of isis hmac-md5 auth"},
+    {"bf_multi", isismd5bf_bf_multi, METH_VARARGS, "Bruteforce cracking of a list of (md5sum, data) isis hmac-md5 auths at once"},
+    {"engine", isismd5bf_engine, METH_NOARGS, "Name of the md5 engine in use"},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -215,4 +158,5 @@ initisismd5bf(void)
     m = Py_InitModule("isismd5bf", Isismd5bfMethods);
     if (m == NULL)
         return;
+    md5_mb_init();
 }
@@ -34,11 +34,9 @@
 
 #include <Python.h>
 
-#include <sys/stat.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
-#include <errno.h>
 
 #ifdef _WIN32
 #include <winsock2.h>
@@ -51,175 +49,127 @@
 #define ARCH_IS_BIG_ENDIAN 0
 #endif
 #include "lib/md5.h"
+#include "lib/md5_mb.h"
 
-#define VERSION "0.3"
-#define MAX_BRUTE_PW_LEN 16
-#define CHECK_FOR_LOCKFILE 100000
+#include "lib/bf.h"
 
-int inc_brute_pw_r(char *cur, int pos) {
-    if(cur[pos] == 0) {
-        cur[pos] = 33;
-        return 1;
-    }
-    else if(cur[pos] >= 33 && cur[pos] < 126) {
-        cur[pos]++;
-        return 1;
-    }
-    else {
-        cur[pos] = 33;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw_r(cur, pos+1);
-        else
-            return 0;
-    }
-}
+#define VERSION "0.7"
 
-int inc_brute_pw(char *cur, int pos, int full) {    
-    if(full)
-        return inc_brute_pw_r(cur, pos);
+static const int ospfmd5_lens[BF_MAX_LANES] = { 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16, 16 };
 
-    if(cur[pos] == 0) {
-        cur[pos] = 48;
-        return 1;
-    }
-    else if(cur[pos] >= 48 && cur[pos] < 57) {
-        cur[pos]++;
-        return 1;
-    }
-    else if(cur[pos] == 57) {
-        cur[pos] = 65;
-        return 1;
-    }
-    else if(cur[pos] >= 57 && cur[pos] < 90) {
-        cur[pos]++;
-        return 1;
+//salt is the md5 state after the packet
+static void ospfmd5_hash(bf_job *job, const void *salt, const char **pws, const int *lens, int n, unsigned char (*digests)[BF_DIGEST_LEN]) {
+    md5_state_t cur;
+
+    if(n > 1) {
+        md5_mb_append_finish((const md5_state_t *) salt, (const md5_byte_t *const *) pws, ospfmd5_lens, n, digests);
+        return;
     }
-    else if(cur[pos] == 90) {
-        cur[pos] = 97;
-        return 1;
+    memcpy(&cur, salt, sizeof(md5_state_t));
+    md5_append(&cur, (const md5_byte_t *) pws[0], 16);
+    md5_finish(&cur, digests[0]);
+}
+
+//cracks the n targets in one run, returns the number found or -1 with an
+//exception set
+static int
+ospfmd5bf_crack(bf_target *targets, int n, int bf, int full, const char *wl, PyObject *control, int num_threads, const char *mask, const char *rules)
+{
+    const char *lockfile;
+    bf_status *status;
+    Py_buffer view;
+    md5_state_t *bases;
+    bf_job job;
+    int i, ret = -1;
+
+    if(!bf_parse_control(control, &lockfile, &status, &view))
+        return -1;
+    if(!(bases = malloc(n * sizeof(md5_state_t)))) {
+        bf_release_control(&view);
+        PyErr_NoMemory();
+        return -1;
     }
-    else if(cur[pos] >= 97 && cur[pos] < 122) {
-        cur[pos]++;
-        return 1;
+    for(i = 0; i < n; i++) {
+        md5_init(&bases[i]);
+        md5_append(&bases[i], (const md5_byte_t *) targets[i].data, targets[i].len);
+        targets[i].salt = &bases[i];
     }
-    else {
-        cur[pos] = 48;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw(cur, pos+1, full);
-        else
-            return 0;
+    bf_init(&job, bf, full, wl, lockfile, status, ospfmd5_hash, NULL);
+    bf_batch(&job, md5_mb_lanes());
+    bf_targets(&job, targets, n);
+    bf_control_hits(&job, &view);
+    if(bf_parse_mode(&job, mask, rules)) {
+        Py_BEGIN_ALLOW_THREADS
+        ret = bf_run(&job, num_threads);
+        Py_END_ALLOW_THREADS
+        if(ret < 0)
+            PyErr_SetFromErrnoWithFilename(PyExc_IOError, (char *) wl);
     }
+    free(bases);
+    bf_release_control(&view);
+    return ret;
 }
 
 static PyObject *
 ospfmd5bf_bf(PyObject *self, PyObject *args)
 {
-    int bf, full, len, foo;
-    const char *wl, *data;
-    FILE *wlist, *lock;
-    char brute_pw[MAX_BRUTE_PW_LEN+1];
-    char line[512];
-    char *pw = NULL;
-    char *md5sum;
-    int count = 0;
-    char *lockfile;
-    struct stat fcheck;
-    md5_state_t base, cur;
-    md5_byte_t digest[16];
-
-    if(!PyArg_ParseTuple(args, "iiss#s#s", &bf, &full, &wl, &md5sum, &foo, &data, &len, &lockfile))
+    int bf, full, len, foo, ret;
+    int num_threads = 1;
+    const char *wl, *data, *md5sum;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *control;
+    bf_target target;
+
+    if(!PyArg_ParseTuple(args, "iiss#s#O|izz", &bf, &full, &wl, &md5sum, &foo, &data, &len, &control, &num_threads, &mask, &rules))
         return NULL;
     if(foo != 16) {
-        fprintf(stderr, "md5sum must have len 16!\n");
+        PyErr_SetString(PyExc_ValueError, "md5sum must have len 16");
         return NULL;
     }
 
-    md5_init(&base);
-    md5_append(&base, (const md5_byte_t *) data, len);
-
-    if(!bf) {
-        if(!(wlist = fopen(wl, "r"))) {
-            fprintf(stderr, "Cant open wordlist: %s\n", strerror(errno));
-            return NULL;
-        }
-
-        Py_BEGIN_ALLOW_THREADS
-            
-        while(fgets(line, 512, wlist)) {
-            char *tmp = strchr(line, '\n');
-            if(tmp)
-                *tmp = '\0';
-            tmp = strchr(line, '\r');
-            if(tmp)
-                *tmp = '\0';
-            len = strlen(line);
-            bzero(line + len, 16 - len);
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck)) {
-                    fprintf(stderr, "No lockfile, exiting.\n");
-                    break;
-                }
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", line);
-                fclose(lock);
-                count = 0;
-            }
-            memcpy(&cur, &base, sizeof(md5_state_t));
-            md5_append(&cur, (const md5_byte_t *) line, 16);
-            md5_finish(&cur, digest);
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = line;
-                fprintf(stderr, "Found pw '%s'.\n", pw);
-                //fprintf(stderr, "Found pw '%s' ('%s' == '%s').\n", pw, md5sum, digest);
-                break;
-            }
-            count++;
-        }
-
-        Py_END_ALLOW_THREADS
-    }
-    else {
-        bzero(brute_pw, MAX_BRUTE_PW_LEN+1);
+    memset(&target, 0, sizeof(bf_target));
+    target.data = data;
+    target.len = len;
+    target.digest = md5sum;
+    if((ret = ospfmd5bf_crack(&target, 1, bf, full, wl, control, num_threads, mask, rules)) < 0)
+        return NULL;
+    if(!ret)
+        Py_RETURN_NONE;
+    return Py_BuildValue("s", target.pw);
+}
 
-        Py_BEGIN_ALLOW_THREADS
+static PyObject *
+ospfmd5bf_bf_multi(PyObject *self, PyObject *args)
+{
+    int bf, full, n;
+    int num_threads = 1;
+    const char *wl;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *obj, *seq, *control, *ret = NULL;
+    bf_target *targets;
+
+    if(!PyArg_ParseTuple(args, "iisOO|izz", &bf, &full, &wl, &obj, &control, &num_threads, &mask, &rules))
+        return NULL;
+    if(!(targets = bf_parse_targets(obj, &seq, &n)))
+        return NULL;
 
-        do {
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck)) {
-                    fprintf(stderr, "No lockfile, exiting.\n");
-                    break;
-                }
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", brute_pw);
-                fclose(lock);
-                count = 0;
-            }
-            memcpy(&cur, &base, sizeof(md5_state_t));
-            md5_append(&cur, (const md5_byte_t *) brute_pw, 16);
-            md5_finish(&cur, digest);
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = brute_pw;
-                fprintf(stderr, "Found pw '%s'.\n", pw);
-                //fprintf(stderr, "Found pw '%s' ('%s' == '%s').\n", pw, md5sum, digest);
-                break;
-            }
-            count++;
-        } while(inc_brute_pw(brute_pw, 0, full));
-        
-        Py_END_ALLOW_THREADS
-    }
+    if(ospfmd5bf_crack(targets, n, bf, full, wl, control, num_threads, mask, rules) >= 0)
+        ret = bf_found_list(targets, n);
+    free(targets);
+    Py_DECREF(seq);
+    return ret;
+}
 
-    return Py_BuildValue("s", pw);
+static PyObject *
+ospfmd5bf_engine(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("s", md5_mb_engine());
 }
 
 static PyMethodDef Ospfmd5bfMethods[] = {
     {"bf", ospfmd5bf_bf, METH_VARARGS, "Bruteforce cracking of ospfmd5 auth"},
+    {"bf_multi", ospfmd5bf_bf_multi, METH_VARARGS, "Bruteforce cracking of a list of (md5sum, data) ospfmd5 auths at once"},
+    {"engine", ospfmd5bf_engine, METH_NOARGS, "Name of the md5 engine in use"},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -231,4 +181,5 @@ initospfmd5bf(void)
     m = Py_InitModule("ospfmd5bf", Ospfmd5bfMethods);
     if (m == NULL)
         return;
+    md5_mb_init();
 }
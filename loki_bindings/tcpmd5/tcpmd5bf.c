@@ -34,11 +34,9 @@
 
 #include <Python.h>
 
-#include <sys/stat.h>
 #include <stdlib.h>
 #include <stdio.h>
 #include <string.h>
-#include <errno.h>
 
 #ifdef _WIN32
 #include <winsock2.h>
@@ -106,10 +104,11 @@ struct tcphdr {
 #define ARCH_IS_BIG_ENDIAN 0
 #endif
 #include "lib/md5.h"
+#include "lib/md5_mb.h"
 
-#define VERSION "0.1.4"
-#define MAX_BRUTE_PW_LEN 16
-#define CHECK_FOR_LOCKFILE 100000
+#include "lib/bf.h"
+
+#define VERSION "0.5"
 
 struct tcp4_pseudohdr {
 	__uint32_t		saddr;
@@ -119,61 +118,6 @@ struct tcp4_pseudohdr {
 	__uint16_t 		len;
 };
 
-int inc_brute_pw_r(char *cur, int pos) {
-    if(cur[pos] == 0) {
-        cur[pos] = 33;
-        return 1;
-    }
-    else if(cur[pos] >= 33 && cur[pos] < 126) {
-        cur[pos]++;
-        return 1;
-    }
-    else {
-        cur[pos] = 33;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw_r(cur, pos+1);
-        else
-            return 0;
-    }
-}
-
-int inc_brute_pw(char *cur, int pos, int full) {
-    if(full)
-        return inc_brute_pw_r(cur, pos);
-
-    if(cur[pos] == 0) {
-        cur[pos] = 48;
-        return 1;
-    }
-    else if(cur[pos] >= 48 && cur[pos] < 57) {
-        cur[pos]++;
-        return 1;
-    }
-    else if(cur[pos] == 57) {
-        cur[pos] = 65;
-        return 1;
-    }
-    else if(cur[pos] >= 57 && cur[pos] < 90) {
-        cur[pos]++;
-        return 1;
-    }
-    else if(cur[pos] == 90) {
-        cur[pos] = 97;
-        return 1;
-    }
-    else if(cur[pos] >= 97 && cur[pos] < 122) {
-        cur[pos]++;
-        return 1;
-    }
-    else {
-        cur[pos] = 48;
-        if(pos < MAX_BRUTE_PW_LEN)
-            return inc_brute_pw(cur, pos+1, full);
-        else
-            return 0;
-    }
-}
-
 void pre_calc_md5(const u_char *packet, int len, md5_state_t *state) {
     struct ip ip;
     struct tcphdr tcp;
@@ -207,100 +151,130 @@ void pre_calc_md5(const u_char *packet, int len, md5_state_t *state) {
     md5_append(state, (const md5_byte_t *) packet + head_len, data_len);
 }
 
-static PyObject *
-tcpmd5bf_bf(PyObject *self, PyObject *args)
-{
-    int bf, full, len;
-    const char *wl, *data;
-    FILE *wlist, *lock;
-    char brute_pw[MAX_BRUTE_PW_LEN];
-    char line[512];
-    char *pw = NULL;
-    char *md5sum;
-    md5_byte_t digest[16];
-    md5_state_t state, cur;
-    int count = 0;
-    char *lockfile;
-    struct stat fcheck;
-
-    if(!PyArg_ParseTuple(args, "iisss#s", &bf, &full, &wl, &md5sum, &data, &len, &lockfile))
-        return NULL;
-
-    pre_calc_md5((u_char *) data, len, &state);
+//salt is the md5 state after the pseudo header, tcp header and segment data
+static void tcpmd5_hash(bf_job *job, const void *salt, const char **pws, const int *lens, int n, unsigned char (*digests)[BF_DIGEST_LEN]) {
+    md5_state_t cur;
 
-    if(!bf) {
-        if(!(wlist = fopen(wl, "r"))) {
-            fprintf(stderr, "Cant open wordlist: %s\n", strerror(errno));
-            return NULL;
-        }
+    if(n > 1) {
+        md5_mb_append_finish((const md5_state_t *) salt, (const md5_byte_t *const *) pws, lens, n, digests);
+        return;
+    }
+    memcpy(&cur, salt, sizeof(md5_state_t));
+    md5_append(&cur, (const md5_byte_t *) pws[0], lens[0]);
+    md5_finish(&cur, digests[0]);
+}
 
+//cracks the n targets in one run, returns the number found or -1 with an
+//exception set
+static int
+tcpmd5bf_crack(bf_job *job, bf_target *targets, int n, int bf, int full, const char *wl, PyObject *control, int num_threads, const char *mask, const char *rules)
+{
+    const char *lockfile;
+    bf_status *status;
+    Py_buffer view;
+    md5_state_t *bases;
+    int i, ret = -1;
+
+    if(!bf_parse_control(control, &lockfile, &status, &view))
+        return -1;
+    if(!(bases = malloc(n * sizeof(md5_state_t)))) {
+        bf_release_control(&view);
+        PyErr_NoMemory();
+        return -1;
+    }
+    //the pseudo header, tcp header and segment data are the same for
+    //every candidate, only the key gets appended to a copy of this state
+    for(i = 0; i < n; i++) {
+        pre_calc_md5((const u_char *) targets[i].data, targets[i].len, &bases[i]);
+        targets[i].salt = &bases[i];
+    }
+    bf_init(job, bf, full, wl, lockfile, status, tcpmd5_hash, NULL);
+    bf_batch(job, md5_mb_lanes());
+    bf_zero_copy(job);
+    bf_targets(job, targets, n);
+    bf_control_hits(job, &view);
+    if(bf_parse_mode(job, mask, rules)) {
         Py_BEGIN_ALLOW_THREADS
-            
-        while(fgets(line, 512, wlist)) {
-            char *tmp = strchr(line, '\n');
-            if(tmp)
-                *tmp = '\0';
-            tmp = strchr(line, '\r');
-            if(tmp)
-                *tmp = '\0';
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck))
-                    break;
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", line);
-                fclose(lock);
-                count = 0;
-            }
-            memcpy(&cur, &state, sizeof(md5_state_t));
-            md5_append(&cur, (const md5_byte_t *) line, strlen(line));
-            md5_finish(&cur, digest);
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = line;
-                break;
-            }
-            count++;
-        }
-
+        ret = bf_run(job, num_threads);
         Py_END_ALLOW_THREADS
+        if(ret < 0)
+            PyErr_SetFromErrnoWithFilename(PyExc_IOError, (char *) wl);
     }
-    else {
-        bzero(brute_pw, MAX_BRUTE_PW_LEN);
+    free(bases);
+    bf_release_control(&view);
+    return ret;
+}
 
-        Py_BEGIN_ALLOW_THREADS
+static PyObject *
+tcpmd5bf_bf(PyObject *self, PyObject *args)
+{
+    int bf, full, len, foo, ret;
+    int num_threads = 1;
+    int stats = 0;
+    const char *wl, *data, *md5sum;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *control;
+    bf_target target;
+    bf_job job;
+    PyObject *pw;
+
+    if(!PyArg_ParseTuple(args, "iiss#s#O|iizz", &bf, &full, &wl, &md5sum, &foo, &data, &len, &control, &num_threads, &stats, &mask, &rules))
+        return NULL;
+    if(foo != 16) {
+        PyErr_SetString(PyExc_ValueError, "md5sum must have len 16");
+        return NULL;
+    }
 
-        do {
-            if(count % CHECK_FOR_LOCKFILE == 0) {
-                if(stat(lockfile, &fcheck))
-                    break;
-                if(!(lock = fopen(lockfile, "w"))) {
-                    fprintf(stderr, "Cant open lockfile: %s\n", strerror(errno));
-                    return NULL;
-                }
-                fprintf(lock, "%s", brute_pw);
-                fclose(lock);
-                count = 0;
-            }
-            memcpy(&cur, &state, sizeof(md5_state_t));
-            md5_append(&cur, (const md5_byte_t *) brute_pw, strlen(brute_pw));
-            md5_finish(&cur, digest);
-            if(!memcmp(md5sum, digest, 16)) {
-                pw = brute_pw;
-                break;
-            }
-            count++;
-        } while(inc_brute_pw(brute_pw, 0, full));
-        
-        Py_END_ALLOW_THREADS
+    memset(&target, 0, sizeof(bf_target));
+    target.data = data;
+    target.len = len;
+    target.digest = md5sum;
+    if((ret = tcpmd5bf_crack(&job, &target, 1, bf, full, wl, control, num_threads, mask, rules)) < 0)
+        return NULL;
+    if(ret)
+        pw = PyString_FromString(target.pw);
+    else {
+        Py_INCREF(Py_None);
+        pw = Py_None;
     }
+    if(!stats)
+        return pw;
+    return Py_BuildValue("NKd", pw, job.tried, job.elapsed);
+}
 
-    return Py_BuildValue("s", pw);
+static PyObject *
+tcpmd5bf_bf_multi(PyObject *self, PyObject *args)
+{
+    int bf, full, n;
+    int num_threads = 1;
+    const char *wl;
+    const char *mask = NULL, *rules = NULL;
+    PyObject *obj, *seq, *control, *ret = NULL;
+    bf_target *targets;
+    bf_job job;
+
+    if(!PyArg_ParseTuple(args, "iisOO|izz", &bf, &full, &wl, &obj, &control, &num_threads, &mask, &rules))
+        return NULL;
+    if(!(targets = bf_parse_targets(obj, &seq, &n)))
+        return NULL;
+
+    if(tcpmd5bf_crack(&job, targets, n, bf, full, wl, control, num_threads, mask, rules) >= 0)
+        ret = bf_found_list(targets, n);
+    free(targets);
+    Py_DECREF(seq);
+    return ret;
+}
+
+static PyObject *
+tcpmd5bf_engine(PyObject *self, PyObject *args)
+{
+    return Py_BuildValue("s", md5_mb_engine());
 }
 
 static PyMethodDef Tcpmd5bfMethods[] = {
     {"bf", tcpmd5bf_bf, METH_VARARGS, "Bruteforce cracking of tcpmd5 auth"},
+    {"bf_multi", tcpmd5bf_bf_multi, METH_VARARGS, "Bruteforce cracking of a list of (md5sum, data) tcpmd5 auths at once"},
+    {"engine", tcpmd5bf_engine, METH_NOARGS, "Name of the md5 engine in use"},
     {NULL, NULL, 0, NULL}        /* Sentinel */
 };
 
@@ -312,4 +286,5 @@ inittcpmd5bf(void)
     m = Py_InitModule("tcpmd5bf", Tcpmd5bfMethods);
     if (m == NULL)
         return;
+    md5_mb_init();
 }
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+#       crack_bench.py
+#
+#       Copyright 2009 Daniel Mende <dmende@ernw.de>
+#
+
+#       Redistribution and use in source and binary forms, with or without
+#       modification, are permitted provided that the following conditions are
+#       met:
+#
+#       * Redistributions of source code must retain the above copyright
+#         notice, this list of conditions and the following disclaimer.
+#       * Redistributions in binary form must reproduce the above
+#         copyright notice, this list of conditions and the following disclaimer
+#         in the documentation and/or other materials provided with the
+#         distribution.
+#       * Neither the name of the  nor the names of its
+#         contributors may be used to endorse or promote products derived from
+#         this software without specific prior written permission.
+#
+#       THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#       "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#       LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#       A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#       OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#       SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#       LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#       DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#       THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#       (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Runs the md5 based crackers in brute force mode against a digest that
+#never matches and prints the hashes/s of every binding. the md5 engine
+#is picked by the cpu, -e compares others (LOKI_MD5_ENGINE) side by side.
+#-n runs against that many digests at once, spread over -p different
+#packets, and prints candidates/s.
+#
+#   crack_bench.py
+#   crack_bench.py -j 4 -t 10 -a ospf-md5,tcp-md5
+#   crack_bench.py -e scalar,sse2,avx2,avx512
+#   crack_bench.py -n 100 -p 4
+
+import os
+import struct
+import sys
+import threading
+import time
+
+from optparse import OptionParser
+
+import dpkt
+
+#algorithm -> (package, binding)
+BINDINGS = {    "ospf-md5"          :   ("ospfmd5", "ospfmd5bf"),
+                "isis-hmac-md5"     :   ("isismd5", "isismd5bf"),
+                "tcp-md5"           :   ("tcpmd5", "tcpmd5bf"),
+                "bfd-md5"           :   ("bfd", "bfdbf"),
+                }
+
+def sample_data(algorithm, size):
+    #what the modules pass as data, without the digest
+    if algorithm == "tcp-md5":
+        tcp = dpkt.tcp.TCP(sport=179, dport=34567, flags=dpkt.tcp.TH_ACK, data="B" * size)
+        ip = dpkt.ip.IP(p=dpkt.ip.IP_PROTO_TCP, src="\x0a\x00\x00\x01", dst="\x0a\x00\x00\x02", data=tcp)
+        ip.len = len(str(ip))
+        return str(ip)
+    return "A" * size
+
+def bench(loki, algorithm, threads, secs, size, num, packets):
+    (func, threaded) = loki.CRACK_ALGORITHMS[algorithm]
+    targets = None
+    if num > 1:
+        #packets of different length have different data
+        targets = [ (struct.pack("!I", i) + "\x00" * 12, sample_data(algorithm, size + i % packets)) for i in xrange(num) ]
+    job = loki.crack_job(algorithm, "\x00" * 16, sample_data(algorithm, size), bf=True, full=True, threads=threads, targets=targets)
+    t = threading.Thread(target=func, args=(job,))
+    start = time.time()
+    t.start()
+    time.sleep(secs)
+    struct.pack_into("i", job.status, 0, 1)
+    t.join()
+    took = time.time() - start
+    job.update()
+    return (job.tried, took)
+
+def run(options):
+    sys.path.insert(0, options.src)
+    import loki
+
+    for algorithm in options.algorithms.split(","):
+        if algorithm not in BINDINGS:
+            print "%-14s unknown algorithm" % algorithm
+            continue
+        (package, name) = BINDINGS[algorithm]
+        engine = loki.load_binding(package, name).engine()
+        (tried, took) = bench(loki, algorithm, options.threads, options.time, options.size, options.targets, options.packets)
+        if options.targets > 1:
+            print "%-14s %-7s %2d threads %12.0f candidates/s against %d digests" % (algorithm, engine, options.threads, tried / took, options.targets)
+        else:
+            print "%-14s %-7s %2d threads %12.0f hashes/s" % (algorithm, engine, options.threads, tried / took)
+        sys.stdout.flush()
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-a", "--algorithms", dest="algorithms", default=",".join(sorted(BINDINGS)), help="comma separated list of algorithms to run")
+    parser.add_option("-e", "--engines", dest="engines", help="comma separated list of md5 engines to compare")
+    parser.add_option("-j", "--threads", dest="threads", type="int", default=1, help="number of cracking threads")
+    parser.add_option("-t", "--time", dest="time", type="float", default=3.0, help="seconds to run every algorithm")
+    parser.add_option("-d", "--size", dest="size", type="int", default=64, help="bytes of packet data the digest covers")
+    parser.add_option("-n", "--targets", dest="targets", type="int", default=1, help="number of digests to crack at once")
+    parser.add_option("-p", "--packets", dest="packets", type="int", default=1, help="number of different packets the digests are spread over")
+    parser.add_option("-s", "--src", dest="src", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"), help="directory containing loki.py")
+    (options, args) = parser.parse_args()
+
+    if not options.engines:
+        run(options)
+        return
+    #the bindings pick the engine once on import, so every engine gets a
+    #fresh process. an engine the cpu lacks falls back to the best one
+    for engine in options.engines.split(","):
+        pid = os.fork()
+        if not pid:
+            os.environ["LOKI_MD5_ENGINE"] = engine
+            run(options)
+            os._exit(0)
+        os.waitpid(pid, 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+#       dispatch_bench.py
+#
+#       Copyright 2009 Daniel Mende <dmende@ernw.de>
+#
+
+#       Redistribution and use in source and binary forms, with or without
+#       modification, are permitted provided that the following conditions are
+#       met:
+#
+#       * Redistributions of source code must retain the above copyright
+#         notice, this list of conditions and the following disclaimer.
+#       * Redistributions in binary form must reproduce the above
+#         copyright notice, this list of conditions and the following disclaimer
+#         in the documentation and/or other materials provided with the
+#         distribution.
+#       * Neither the name of the  nor the names of its
+#         contributors may be used to endorse or promote products derived from
+#         this software without specific prior written permission.
+#
+#       THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#       "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#       LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#       A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#       OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#       SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#       LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#       DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#       THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#       (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+#Feeds a recorded (or generated) pcap through pcap_thread.dispatch_packet
+#with a set of checks keyed like the shipped modules and prints pkts/s.
+#
+#   dispatch_bench.py -r capture.pcap
+#   dispatch_bench.py -g 100000 -w mixed.pcap
+#   dispatch_bench.py -r mixed.pcap -x arp,tcp-md5,icmp6
+
+import os
+import struct
+import sys
+import time
+
+from optparse import OptionParser
+
+import dpkt
+
+#key sets of the shipped modules and the field their check looks at
+#(the default arp forward constraint looks at none),
+#(layer, name, keys, field)
+CHECKS = [  ("eth", "802.1X", [0x888e], "type"),
+            ("eth", "arp", [dpkt.ethernet.ETH_TYPE_ARP], "type"),
+            ("eth", "dot1q", [dpkt.ethernet.ETH_TYPE_8021Q], "type"),
+            ("eth", "dtp", ["\x01\x00\x0c\xcc\xcc\xcc"], "type"),
+            ("eth", "isis", ["\x01\x80\xc2\x00\x00\x14", "\x01\x80\xc2\x00\x00\x15"], "type"),
+            ("eth", "mpls", [dpkt.ethernet.ETH_TYPE_MPLS], "type"),
+            ("eth", "icmp6", [dpkt.ethernet.ETH_TYPE_IP6], "type"),
+            ("eth", "wlccp", [0x872d], "type"),
+            ("ip", "arp", None, None),
+            ("ip", "eigrp", [88], "p"),
+            ("ip", "ospf", [89], "p"),
+            ("ip", "vrrp", [112], "p"),
+            ("ip6", "icmp6", None, "src"),
+            ("tcp", "tcp-md5", None, "opts"),
+            ("udp", "bfd", [3784], "dport"),
+            ("udp", "glbp", [3222], "dport"),
+            ("udp", "hsrp", [1985], "dport"),
+            ("udp", "hsrp2", [1985, 2029], "dport"),
+            ("udp", "ldp", [646], "dport"),
+            ("udp", "rip", [520], "dport"),
+            ("udp", "wlccp", [2887], "dport"),
+            ]
+
+class counter(object):
+    def __init__(self, field):
+        self.field = field
+        self.calls = 0
+
+    def check(self, data):
+        if self.field:
+            getattr(data, self.field)
+        return (True, False)
+
+    def call(self, *args):
+        self.calls += 1
+
+def generate(count):
+    #mixed traffic, mostly uninteresting tcp/udp with some routing protocols
+    src = "\x00\x01\x02\x03\x04\x05"
+    dst = "\x00\x0a\x0b\x0c\x0d\x0e"
+
+    def ip(p, data):
+        i = dpkt.ip.IP(p=p, src="\x0a\x00\x00\x01", dst="\x0a\x00\x00\x02", data=data)
+        i.len = len(str(i))
+        return str(i)
+
+    def udp(sport, dport, data):
+        u = dpkt.udp.UDP(sport=sport, dport=dport, data=data)
+        u.ulen = len(str(u))
+        return u
+
+    def ip6(nxt, data):
+        return struct.pack("!IHBB", 0x60000000, len(data), nxt, 64) + "\xfe\x80" + "\x00" * 13 + "\x01" + "\xff\x02" + "\x00" * 13 + "\x02" + data
+
+    payload = "A" * 512
+    frames = [  dst + src + "\x08\x00" + ip(6, str(dpkt.tcp.TCP(sport=34567, dport=80, data=payload))),
+                dst + src + "\x08\x00" + ip(6, str(dpkt.tcp.TCP(sport=443, dport=34568, data=payload))),
+                dst + src + "\x08\x00" + ip(17, str(udp(53, 34569, payload[:64]))),
+                dst + src + "\x08\x00" + ip(17, str(udp(34570, 5060, payload[:256]))),
+                dst + src + "\x86\xdd" + ip6(17, str(udp(34571, 53, payload[:64]))),
+                dst + src + "\x81\x00\x00\x0a\x08\x00" + ip(6, str(dpkt.tcp.TCP(sport=34572, dport=22, data=payload))),
+                "\x01\x00\x5e\x00\x00\x02" + src + "\x08\x00" + ip(17, str(udp(1985, 1985, "\x00" * 20))),
+                "\x01\x00\x5e\x00\x00\x05" + src + "\x08\x00" + ip(89, "\x02\x01" + "\x00" * 42),
+                "\xff" * 6 + src + "\x08\x06" + "\x00\x01\x08\x00\x06\x04\x00\x01" + src + "\x0a\x00\x00\x01" + "\x00" * 6 + "\x0a\x00\x00\x02",
+                dst + src + "\x08\x00" + ip(6, str(dpkt.tcp.TCP(sport=34573, dport=80, data=payload))),
+                ]
+    return [ frames[i % len(frames)] for i in xrange(count) ]
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-r", "--read", dest="read", help="pcap file to replay")
+    parser.add_option("-g", "--generate", dest="generate", type="int", default=100000, help="number of frames to generate if no file is given")
+    parser.add_option("-w", "--write", dest="write", help="write the generated frames to a pcap file")
+    parser.add_option("-l", "--loops", dest="loops", type="int", default=3, help="number of passes over the frames")
+    parser.add_option("-x", "--exclude", dest="exclude", default="", help="comma separated list of modules to leave out")
+    parser.add_option("-s", "--src", dest="src", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"), help="directory containing loki.py")
+    (options, args) = parser.parse_args()
+
+    sys.path.insert(0, options.src)
+    import loki
+
+    if options.read:
+        f = open(options.read, "rb")
+        frames = [ buf for (ts, buf) in dpkt.pcap.Reader(f) ]
+        f.close()
+    else:
+        frames = generate(options.generate)
+        if options.write:
+            f = open(options.write, "wb")
+            w = dpkt.pcap.Writer(f)
+            for i in frames:
+                w.writepkt(i, 0)
+            f.close()
+
+    l = loki.codename_loki()
+    counters = {}
+    exclude = options.exclude.split(",")
+    for (layer, name, keys, field) in CHECKS:
+        if name in exclude:
+            continue
+        c = counter(field)
+        counters[(layer, name)] = c
+        getattr(l, layer + "_checks").add(name, c.check, c.call, keys)
+    t = loki.pcap_thread(l, "null")
+
+    best = None
+    for i in xrange(options.loops):
+        start = time.time()
+        for buf in frames:
+            t.dispatch_packet(len(buf), buf, start)
+        took = time.time() - start
+        if best is None or took < best:
+            best = took
+
+    calls = sum([ c.calls for c in counters.values() ]) / options.loops
+    print "%d frames, %d callbacks per pass" % (len(frames), calls)
+    print "best of %d: %.3fs, %.0f pkts/s" % (options.loops, best, len(frames) / best)
+
+if __name__ == "__main__":
+    main()
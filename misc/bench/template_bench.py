@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+
+#       template_bench.py
+#
+#       Copyright 2009 Daniel Mende <dmende@ernw.de>
+#
+
+#       Redistribution and use in source and binary forms, with or without
+#       modification, are permitted provided that the following conditions are
+#       met:
+#
+#       * Redistributions of source code must retain the above copyright
+#         notice, this list of conditions and the following disclaimer.
+#       * Redistributions in binary form must reproduce the above
+#         copyright notice, this list of conditions and the following disclaimer
+#         in the documentation and/or other materials provided with the
+#         distribution.
+#       * Neither the name of the  nor the names of its
+#         contributors may be used to endorse or promote products derived from
+#         this software without specific prior written permission.
+#
+#       THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#       "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#       LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#       A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#       OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#       SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#       LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#       DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#       THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#       (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Renders the periodic frames of the hsrp, vrrp, glbp, rip, dtp, eigrp and
+#ospf threads through dpkt on every send and from the frame template the
+#threads keep now and prints frames/s for both. Modules which can't be
+#imported here (missing gtk for example) are skipped.
+#
+#   template_bench.py -n 20000
+
+import imp
+import os
+import sys
+import time
+
+from optparse import OptionParser
+
+class entry(object):
+    def __init__(self, text):
+        self.text = text
+
+    def get_text(self):
+        return self.text
+
+    def get_edit_text(self):
+        return self.text
+
+class parent(object):
+    ip = "\x0a\x00\x00\x01"
+    mac = "\x00\x11\x22\x33\x44\x55"
+    ui = "gtk"
+
+    def log(self, msg):
+        pass
+
+def hsrp(mod):
+    p = parent()
+    pkg = mod.hsrp_packet(mod.hsrp_packet.OP_HELLO, mod.hsrp_packet.STATE_ACTIVE, 3, 10, 100, 1, "cisco\x00\x00\x00", 0x0a0000fe)
+    auth = mod.hsrp_auth_tlv(4, 0, "\x0a\x00\x00\x02", 1, "\x00" * 16)
+    thread = mod.hsrp_thread(p)
+    return (lambda: thread.hello(pkg, auth, "secret"),
+            lambda: thread.templates.get(1, (pkg, auth, "secret", p.ip, p.mac), lambda: thread.hello(pkg, auth, "secret")).render())
+
+def vrrp(mod):
+    p = parent()
+    pkg = mod.vrrp_packet(7, 100, 0, "", 1, ["\x0a\x00\x00\xfe"])
+    thread = mod.vrrp_thread(p)
+    return (lambda: thread.advert(pkg),
+            lambda: thread.templates.get(1, (pkg, p.ip), lambda: thread.advert(pkg)).render())
+
+def glbp(mod):
+    p = parent()
+    pkg = mod.glbp_packet(5, p.mac)
+    hello = mod.glbp_tlv_hello(1, 100, 3000, 10000, 600, 14400, 1, 4, "\x0a\x00\x00\xfe")
+    reqs = [ mod.glbp_tlv_req_resp(1, 32, 100, 100, "\x00\x07\xb4\x00\x05\x01") ]
+    auth = mod.glbp_tlv_auth(mod.glbp_tlv_auth.TYPE_MD5_STRING, "\x00" * 16)
+    thread = mod.glbp_thread(p)
+    return (lambda: thread.hello(pkg, hello, reqs, auth),
+            lambda: thread.templates.get(1, (pkg, hello, tuple(reqs), auth, p.ip, p.mac), lambda: thread.hello(pkg, hello, reqs, auth)).render())
+
+def rip(mod):
+    p = parent()
+    routes = tuple([ ("10.%d.0.0" % i, "255.255.0.0", "10.0.0.1", "1") for i in xrange(10) ])
+    thread = mod.rip_thread(p)
+    return (lambda: thread.response(routes),
+            lambda: thread.templates.get("response", (routes, p.ip, p.mac), lambda: thread.response(routes)).render())
+
+def dtp(mod):
+    p = parent()
+    thread = mod.dtp_thread(p)
+    return (lambda: thread.desirable("domain"),
+            lambda: thread.templates.get("desirable", ("domain", p.mac), lambda: thread.desirable("domain")).render())
+
+def eigrp(mod):
+    p = parent()
+    p.ios_ver = 0xc04
+    p.eigrp_ver = 0x102
+    thread = mod.eigrp_hello_thread(p, "eth0", 100)
+    return (lambda: thread.hello_frame(p.ip),
+            lambda: thread.templates.get("hello", (p.ip, p.mac, p.ios_ver, p.eigrp_ver), lambda: thread.hello_frame(p.ip)).render())
+
+def ospf(mod):
+    p = parent()
+    p.area = 0
+    p.auth_type = 0
+    p.auth_data = 0
+    p.mask = "\xff\xff\xff\x00"
+    p.delay = 10
+    p.options = 2
+    p.dr = 0x0a000001
+    p.bdr = 0
+    neighbors = [ "\x0a\x00\x00\x02", "\x0a\x00\x00\x03" ]
+    thread = mod.ospf_thread(p)
+    return (lambda: thread.hello_frame(neighbors),
+            lambda: thread.templates.get("hello", tuple(neighbors), lambda: thread.hello_frame(neighbors)).render())
+
+PROTOCOLS = [ ("hsrp", hsrp), ("vrrp", vrrp), ("glbp", glbp), ("rip", rip), ("dtp", dtp), ("eigrp", eigrp), ("ospf", ospf) ]
+
+def rate(func, count):
+    start = time.time()
+    for i in xrange(count):
+        func()
+    return count / (time.time() - start)
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-n", "--count", dest="count", type="int", default=20000, help="number of frames per protocol")
+    parser.add_option("-s", "--src", dest="src", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"), help="directory containing loki.py")
+    parser.add_option("-m", "--modules", dest="modules", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "modules"), help="directory containing the modules")
+    (options, args) = parser.parse_args()
+
+    sys.path.insert(0, options.src)
+    for (name, setup) in PROTOCOLS:
+        try:
+            mod = imp.load_source("module_%s" % name, os.path.join(options.modules, "module_%s.py" % name))
+        except ImportError, e:
+            print "%-6s skipped: %s" % (name, e)
+            continue
+        (build, template) = setup(mod)
+        assert(build() == template())
+        built = rate(build, options.count)
+        patched = rate(template, options.count)
+        print "%-6s dpkt %8.0f frames/s, template %9.0f frames/s, %5.1fx" % (name, built, patched, patched / built)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+#       tx_bench.py
+#
+#       Copyright 2009 Daniel Mende <dmende@ernw.de>
+#
+
+#       Redistribution and use in source and binary forms, with or without
+#       modification, are permitted provided that the following conditions are
+#       met:
+#
+#       * Redistributions of source code must retain the above copyright
+#         notice, this list of conditions and the following disclaimer.
+#       * Redistributions in binary form must reproduce the above
+#         copyright notice, this list of conditions and the following disclaimer
+#         in the documentation and/or other materials provided with the
+#         distribution.
+#       * Neither the name of the  nor the names of its
+#         contributors may be used to endorse or promote products derived from
+#         this software without specific prior written permission.
+#
+#       THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+#       "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+#       LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+#       A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+#       OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+#       SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+#       LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+#       DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+#       THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+#       (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+#       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+
+#Sends a burst of frames out of an interface once per frame through
+#libdnet (if available) or a plain packet socket and batched through the
+#TPACKET_V2 transmit ring, prints frames/s. Given a peer interface (the
+#other end of a veth pair) the frames arriving there are counted too.
+#
+#   ip link add vb0 type veth peer name vb1
+#   ip link set vb0 up; ip link set vb1 up
+#   tx_bench.py -i vb0 -p vb1
+
+import os
+import socket
+import sys
+import threading
+import time
+
+from optparse import OptionParser
+
+class receiver(threading.Thread):
+    def __init__(self, interface):
+        threading.Thread.__init__(self)
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(0x88b5))
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 64 << 20)
+        self.sock.bind((interface, 0x88b5))
+        self.sock.settimeout(0.5)
+        self.count = 0
+
+    def run(self):
+        try:
+            while True:
+                self.sock.recv(65535)
+                self.count += 1
+        except socket.timeout:
+            pass
+        self.sock.close()
+
+def bench_dnet(interface, frames, batch):
+    import dnet
+    eth = dnet.eth(interface)
+    for i in frames:
+        eth.send(i)
+
+def bench_socket(interface, frames, batch):
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+    sock.bind((interface, 0))
+    for i in frames:
+        sock.send(i)
+    sock.close()
+
+def bench_ring(interface, frames, batch):
+    import loki
+    ring = loki.tpacket_tx_ring(interface, batch)
+    for i in xrange(0, len(frames), batch):
+        ring.put_many(frames[i:i + batch])
+        ring.flush()
+    ring.close()
+
+BACKENDS = [ ("dnet", bench_dnet), ("socket", bench_socket), ("ring", bench_ring) ]
+
+def main():
+    parser = OptionParser(usage="usage: %prog [options]")
+    parser.add_option("-i", "--interface", dest="interface", default="vb0", help="interface to send on")
+    parser.add_option("-p", "--peer", dest="peer", help="interface to count received frames on")
+    parser.add_option("-c", "--count", dest="count", type="int", default=200000, help="number of frames per run")
+    parser.add_option("-l", "--length", dest="length", type="int", default=60, help="frame length")
+    parser.add_option("-b", "--batch", dest="batch", type="int", default=256, help="frames per ring flush")
+    parser.add_option("-x", "--exclude", dest="exclude", default="", help="comma separated list of backends to leave out")
+    parser.add_option("-s", "--src", dest="src", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src"), help="directory containing loki.py")
+    (options, args) = parser.parse_args()
+
+    sys.path.insert(0, options.src)
+    #local experimental ethertype, broadcast from a locally administered mac
+    header = "\xff" * 6 + "\x02\x00\x00\x00\x00\x01" + "\x88\xb5"
+    frames = [ header + ("%08d" % i).ljust(options.length - len(header), "\x00") for i in xrange(options.count) ]
+    exclude = options.exclude.split(",")
+
+    for (name, func) in BACKENDS:
+        if name in exclude:
+            continue
+        recv = None
+        if options.peer:
+            recv = receiver(options.peer)
+            recv.start()
+        start = time.time()
+        try:
+            func(options.interface, frames, options.batch)
+        except ImportError, e:
+            print "%-8s skipped: %s" % (name, e)
+            if recv:
+                recv.join()
+            continue
+        took = time.time() - start
+        line = "%-8s %d frames in %.3fs, %.0f frames/s" % (name, options.count, took, options.count / took)
+        if recv:
+            recv.join()
+            line += ", %d received" % recv.count
+        print line
+
+if __name__ == "__main__":
+    main()
@@ -266,7 +266,10 @@ class mod_class(object):
         self.__log = log
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [DOT1X_ETH_TYPE])
+
+    def get_bpf_filter(self):
+        return "ether proto 0x%04x" % DOT1X_ETH_TYPE
 
     def check_eth(self, eth):
         if eth.type == DOT1X_ETH_TYPE:
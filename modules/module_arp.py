@@ -57,9 +57,7 @@ class spoof_thread(threading.Thread):
                 for iter in self.parent.spoofs:
                     (run, entry, org_data, hosts) = self.parent.spoofs[iter]
                     if run:
-                        for data in entry:
-                            self.parent.dnet.send(data)
-                            time.sleep(0.001)
+                        self.parent.dnet.send_burst(entry, self.parent.name + " spoof")
             for x in xrange(self.parent.spoof_delay):
                 if not self.running:
                     break
@@ -98,9 +96,10 @@ class flood_thread(threading.Thread):
                                                 type=0x9000,
                                                 data="\x00\x00\x01\x00\x00\x00" + "\x00" * 40
                                                 )
-                self.parent.dnet.send(str(_eth))
+                self.parent.dnet.send(str(_eth), name=self.parent.name + " flood")
                 self.no -= 1
-            time.sleep(self.parent.flood_delay)
+            else:
+                time.sleep(1)
         self.parent.flood_togglebutton.set_active(False)
         self.parent.log("ARP: Flood thread terminated")
 
@@ -220,9 +219,12 @@ class mod_class(object):
         self.macs = None
         self.mac = None
         self.spoof_delay = 30
-        self.flood_delay = 0.001
+        self.spoof_rate = 1000
+        self.flood_rate = 1000
+        self.scan_rate = 10000
         self.forward_constrain = "a=True"
         self.forward_lookup = {}
+        self.spoofs = {}
     
     def start_mod(self):
         self.spoof_thread = spoof_thread(self)
@@ -417,6 +419,7 @@ class mod_class(object):
             for i in hosts:
                 (ip, rand_mac, iter, reply) = self.hosts[i]
                 self.hosts[i] = (ip, rand_mac, iter, False)
+        self.parent.update_bpf_filter()
     
     def urw_add_activated(self, button):
         if not len(self.upper_add):
@@ -487,9 +490,17 @@ class mod_class(object):
     def set_dnet(self, dnet_thread):
         self.dnet = dnet_thread
         self.mac = dnet_thread.eth.get()
+        self.set_rates()
+
+    def set_rates(self):
+        self.dnet.set_rate(self.name + " spoof", self.spoof_rate)
+        self.dnet.set_rate(self.name + " flood", self.flood_rate)
+        self.dnet.set_rate(self.name + " scan", self.scan_rate)
+        self.dnet.set_class(self.name + " flood", "bulk")
+        self.dnet.set_class(self.name + " scan", "bulk")
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [dpkt.ethernet.ETH_TYPE_ARP])
 
     def check_eth(self, eth):
         if eth.type == dpkt.ethernet.ETH_TYPE_ARP:
@@ -554,6 +565,13 @@ class mod_class(object):
     def get_ip_checks(self):
         return (self.check_ip, self.input_ip)
 
+    def get_bpf_filter(self):
+        #ip is only needed to forward traffic of running spoofs
+        for (run, data, org_data, hosts) in self.spoofs.values():
+            if run:
+                return "arp or ip"
+        return "arp"
+
     def check_ip(self, ip):
         a = False
         exec(self.forward_constrain)
@@ -619,6 +637,7 @@ class mod_class(object):
         return vendor
     
     def scan(self, ips):
+        frames = []
         for i in ips:
             arp = dpkt.arp.ARP( hrd=dpkt.arp.ARP_HRD_ETH,
                                 pro=dpkt.arp.ARP_PRO_IP,
@@ -632,8 +651,8 @@ class mod_class(object):
                                             type=dpkt.ethernet.ETH_TYPE_ARP,
                                             data=str(arp)
                                             )
-            self.dnet.eth.send(str(eth))
-            time.sleep(0.0001)
+            frames.append(str(eth))
+        self.dnet.send_burst(frames, self.name + " scan")
     
     def add_spoof(self):
         data = []
@@ -776,6 +795,7 @@ class mod_class(object):
             for i in hosts:
                 (ip, rand_mac, iter, reply) = self.hosts[i]
                 self.hosts[i] = (ip, rand_mac, iter, False)
+        self.parent.update_bpf_filter()
 
     def on_start_spoof_button_clicked(self, data):
         select = self.spoof_treeview.get_selection()
@@ -791,6 +811,7 @@ class mod_class(object):
             for i in hosts:
                 (ip, rand_mac, iter, reply) = self.hosts[i]
                 self.hosts[i] = (ip, rand_mac, iter, True)
+        self.parent.update_bpf_filter()
         if not self.spoof_thread.is_alive():
             self.spoof_thread.start()
         self.spoof_thread.wakeup()
@@ -814,10 +835,20 @@ class mod_class(object):
                                         "min" : 1,
                                         "max" : 100
                                         },
-                    "flood_delay" : {   "value" : self.flood_delay,
-                                        "type" : "float",
-                                        "min" : 0,
-                                        "max" : 100
+                    "spoof_rate" : {    "value" : self.spoof_rate,
+                                        "type" : "int",
+                                        "min" : 1,
+                                        "max" : 1000000
+                                        },
+                    "flood_rate" : {    "value" : self.flood_rate,
+                                        "type" : "int",
+                                        "min" : 1,
+                                        "max" : 1000000
+                                        },
+                    "scan_rate" : {     "value" : self.scan_rate,
+                                        "type" : "int",
+                                        "min" : 1,
+                                        "max" : 1000000
                                         },
                     "forward_constrain" :   {   "value" :   self.forward_constrain,
                                                 "type"  :   "str",
@@ -829,7 +860,11 @@ class mod_class(object):
     def set_config_dict(self, dict):
         if dict:
             self.spoof_delay = dict["spoof_delay"]["value"]
-            self.flood_delay = dict["flood_delay"]["value"]
+            self.spoof_rate = dict["spoof_rate"]["value"]
+            self.flood_rate = dict["flood_rate"]["value"]
+            self.scan_rate = dict["scan_rate"]["value"]
             self.forward_constrain = dict["forward_constrain"]["value"]
+        if self.dnet:
+            self.set_rates()
         if not self.spoof_thread is None and self.spoof_thread.is_alive():
             self.spoof_thread.wakeup()
@@ -32,13 +32,13 @@
 import os
 import random
 import struct
-import tempfile
-import threading
 import hashlib
 
 import dnet
 import dpkt
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
@@ -238,58 +238,36 @@ class bfd_auth(object):
             (self.keyid, self.sequence) = struct.unpack("!BxI", data[2:8])
             self.data = data[8:self.length]
 
-class bfd_bf(threading.Thread):
-    def __init__(self, parent, ident, bf, full, wl, digest, data, threads):
+class bfd_bf(loki.crack_job):
+    def __init__(self, parent, ident, bf, full, wl, digest, data, threads, mask="", rules=""):
         self.parent = parent
         self._ident = ident
-        self.bf = bf
-        self.full = full
-        self.wl = wl
-        self.digest = digest
         packet = bfd_control_packet()
         packet.parse(data)
-        self.data = packet.render(True)
-        self.threads = threads
-        threading.Thread.__init__(self)
-
-    def run(self):
-        if self.bf and not self.wl:
-            self.wl = ""
-        #print "bf:%i full:%i, wl:%s digest:%s data:%s" % (self.bf, self.full, self.wl, self.digest.encode('hex'), self.data.encode('hex'))
-        (handle, self.tmpfile) = tempfile.mkstemp(prefix="bfd-bf-", suffix="-lock")
-        print self.tmpfile
-        os.close(handle)
-        if self.parent.platform == "Windows":
-            import bfdbf
-            pw = bfdbf.bfmd5(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile, self.threads)
-        else:
-            import loki_bindings
-            pw = loki_bindings.bfd.bfdbf.bfmd5(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile, self.threads)
-        if os.path.exists(self.tmpfile):
-            if self.parent.ui == 'urw':
-                (iter, discrim, answer, dos, crack, data, _) = self.parent.neighbors[self._ident]
-                button = iter[0]
-                label = button.base_widget.get_label()
-                if pw != None:
-                    label += " PASS(%s)" % pw
-                else:
-                    label += " NO_PASSWORD_FOUND"
-                button.base_widget.set_label(label)
-                button.set_attr_map({None : "button normal"})
-                self.parent.neighbors[self._ident] = (iter, discrim, answer, dos, crack, data, pw)
-            #~ if self.parent.neighbor_liststore.iter_is_valid(self.iter):
-                #~ src = self.parent.neighbor_liststore.get_value(self.iter, self.parent.NEIGH_IP_ROW)
-                #~ if pw != None:
-                    #~ self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, pw)
-                    #~ self.parent.log("BFD: Found password '%s' for host %s" % (pw, src))
-                #~ else:
-                    #~ self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
-                    #~ self.parent.log("BFD: No password found for host %s" % (src))
-            os.remove(self.tmpfile)
-
-    def quit(self):
-        if os.path.exists(self.tmpfile):
-            os.remove(self.tmpfile)
+        loki.crack_job.__init__(self, "bfd-md5", digest, packet.render(True), bf, full, wl, threads, name="BFD", mask=mask, rules=rules, keyid=packet.auth.keyid)
+
+    def done(self):
+        if self.state == loki.CRACK_CANCELLED:
+            return
+        if self.parent.ui == 'urw':
+            (iter, discrim, answer, dos, crack, data, _) = self.parent.neighbors[self._ident]
+            button = iter[0]
+            label = button.base_widget.get_label()
+            if self.pw != None:
+                label += " PASS(%s)" % self.pw
+            else:
+                label += " NO_PASSWORD_FOUND"
+            button.base_widget.set_label(label)
+            button.set_attr_map({None : "button normal"})
+            self.parent.neighbors[self._ident] = (iter, discrim, answer, dos, crack, data, self.pw)
+        #~ if self.parent.neighbor_liststore.iter_is_valid(self.iter):
+            #~ src = self.parent.neighbor_liststore.get_value(self.iter, self.parent.NEIGH_IP_ROW)
+            #~ if pw != None:
+                #~ self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, pw)
+                #~ self.parent.log("BFD: Found password '%s' for host %s" % (pw, src))
+            #~ else:
+                #~ self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
+                #~ self.parent.log("BFD: No password found for host %s" % (src))
 
 class mod_class(object):
     NEIGH_SRC_ROW = 0
@@ -305,6 +283,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "bfd"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_bfd.glade"
         self.ui = ui
         if self.ui == 'gtk':
@@ -323,6 +302,8 @@ class mod_class(object):
             urwid = urwid_
         self.neighbors = {}
         self.filter = False
+        self.cracker = None
+        self.potfile = None
 
     def start_mod(self):
         self.neighbors = {}
@@ -348,7 +329,7 @@ class mod_class(object):
         for id in self.neighbors:
             (iter, discrim, answer, dos, crack, data, password) = self.neighbors[id]
             if crack:
-                crack.quit()
+                crack.cancel()
 
     def get_root(self):
         self.glade_xml = gtk.glade.XML(self.parent.data_dir + self.gladefile)
@@ -454,6 +435,26 @@ class mod_class(object):
     def set_log(self, log):
         self.__log = log
 
+    def set_cracker(self, cracker):
+        self.cracker = cracker
+
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
+    def check_known(self, packet):
+        #cleartext passwords go to the known secrets, md5 digests get looked
+        #up in them, returns the pw or ""
+        if not self.potfile or not packet.flags & bfd_control_packet.FLAG_AUTH:
+            return ""
+        if packet.auth.type == bfd_auth.TYPE_SIMPLE:
+            self.potfile.add("bfd-simple", packet.auth.keyid, packet.auth.data)
+            return packet.auth.data
+        if packet.auth.type == bfd_auth.TYPE_KEYED_MD5 or packet.auth.type == bfd_auth.TYPE_METRIC_MD5:
+            pw = self.potfile.verify("bfd-md5", packet.auth.keyid, packet.auth.data, packet.render(True))
+            if pw is not None:
+                return pw
+        return ""
+
     def set_dnet(self, dnet):
         self.dnet = dnet
 
@@ -473,7 +474,10 @@ class mod_class(object):
                                 }
 
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [BFD_PORT])
+
+    def get_bpf_filter(self):
+        return "udp port %d" % BFD_PORT
 
     def check_udp(self, udp):
         if udp.dport == BFD_PORT:
@@ -500,6 +504,10 @@ class mod_class(object):
             elif self.ui == 'urw':
                 self.filter_checkbox.set_state(True)
             self.log("BFD: got new session: %s -> %s" % (src, dst))
+            known = self.check_known(packet)
+            if known != "" and password == "":
+                password = known
+                self.log("BFD: Known password '%s' for session %s -> %s" % (password, src, dst))
             if self.ui == 'gtk':
                 iter = self.neighbor_treestore.append(None, [src, dst, bfd_control_packet.state_to_str[packet.state], bfd_control_packet.diag_to_str[packet.diag], auth, self.auto_answer, False])
             elif self.ui == 'urw':
@@ -623,6 +631,10 @@ class mod_class(object):
 
     def crack_activated(self, button, ident):
         (iter, discrim, answer, dos, crack, data, password) = self.neighbors[ident]
+        if password != "":
+            #no need to crack what is known already
+            self.log("BFD: Password for session %s is known: '%s'" % (ident, password))
+            return
         if not crack:
             packet = bfd_control_packet()
             packet.parse(data)
@@ -637,11 +649,11 @@ class mod_class(object):
             label = "%s - %s %s %s AUTH(%s)" % (src, dst, bfd_control_packet.state_to_str[packet.state], bfd_control_packet.diag_to_str[packet.diag], auth)
             button.base_widget.set_label(label)
             if self.ui == "urw":
-                crack = bfd_bf(self, ident, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, digest, data, self.parent.bruteforce_threads)
-            crack.start()
+                crack = bfd_bf(self, ident, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, digest, data, self.parent.bruteforce_threads, self.parent.bruteforce_mask, self.parent.wordlist_rules)
+            self.cracker.submit(crack)
             iter[0].set_attr_map({None : "button select"})
         else:
-            crack.quit()
+            crack.cancel()
             crack = False
             iter[0].set_attr_map({None : "button normal"})
         self.neighbors[ident] = (iter, discrim, answer, dos, crack, data, password)
@@ -187,7 +187,10 @@ class mod_class(object):
         self.interface = interface
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [dpkt.ethernet.ETH_TYPE_8021Q])
+
+    def get_bpf_filter(self):
+        return "ether proto 0x%04x" % dpkt.ethernet.ETH_TYPE_8021Q
 
     def check_eth(self, eth):
         if eth.type == dpkt.ethernet.ETH_TYPE_8021Q:
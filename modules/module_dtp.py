@@ -39,6 +39,8 @@ import time
 import dnet
 import dpkt
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
@@ -136,6 +138,21 @@ class dtp_thread(threading.Thread):
         threading.Thread.__init__(self)
         self.parent = parent
         self.running = True
+        self.templates = loki.template_cache()
+
+    def desirable(self, domain):
+        pdu = dtp_pdu(1, [  dtp_tlv(0x1, domain),
+                            dtp_tlv(0x2, "\x81"),
+                            dtp_tlv(0x3, "\xa5"),#self.parent.target["pdu"].get_tlv(0x3).v),
+                            dtp_tlv(0x4, self.parent.mac)
+                         ] )
+        pkg = "\xaa\xaa\x03\x00\x00\x0c\x20\x04" + pdu.render()
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(DTP_DEST_MAC),
+                                            src=self.parent.mac,
+                                            type=len(pkg),
+                                            data=pkg
+                                            )
+        return str(eth_hdr)
 
     def run(self):
         self.parent.log("DTP: Thread started")
@@ -143,28 +160,14 @@ class dtp_thread(threading.Thread):
         while self.running:
             if timer == 30:
                 if not self.parent.target is None:
-                    pdu = dtp_pdu(1, [  dtp_tlv(0x1, self.parent.target["pdu"].get_tlv(0x1).v),
-                                        dtp_tlv(0x2, "\x81"),
-                                        dtp_tlv(0x3, "\xa5"),#self.parent.target["pdu"].get_tlv(0x3).v),
-                                        dtp_tlv(0x4, self.parent.mac)
-                                     ] )
+                    domain = self.parent.target["pdu"].get_tlv(0x1).v
                 else:
                     if self.parent.ui == 'gtk':
                         domain = self.parent.domainentry.get_text()
                     elif self.parent.ui == 'urw':
                         domain = self.parent.domain.get_edit_text()
-                    pdu = dtp_pdu(1, [  dtp_tlv(0x1, domain),
-                                        dtp_tlv(0x2, "\x81"),
-                                        dtp_tlv(0x3, "\xa5"),
-                                        dtp_tlv(0x4, self.parent.mac)
-                                     ] )
-                pkg = "\xaa\xaa\x03\x00\x00\x0c\x20\x04" + pdu.render()
-                eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(DTP_DEST_MAC),
-                                                    src=self.parent.mac,
-                                                    type=len(pkg),
-                                                    data=pkg
-                                                    )
-                self.parent.dnet.send(str(eth_hdr))
+                template = self.templates.get("desirable", (domain, self.parent.mac), lambda: self.desirable(domain))
+                self.parent.dnet.send(template.render())
                 timer = 0
             timer = timer + 1
             time.sleep(1)
@@ -202,6 +205,7 @@ class mod_class(object):
             self.peerlist = None
         self.name = "dtp"
         self.group = "CISCO"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_dtp.glade"
         if ui == 'gtk':
             self.liststore = gtk.ListStore(str, str, str, str, str, str)
@@ -324,7 +328,10 @@ class mod_class(object):
         self.mac = dnet.eth.get()
         
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [dnet.eth_aton(DTP_DEST_MAC)])
+
+    def get_bpf_filter(self):
+        return "ether dst %s" % DTP_DEST_MAC
     
     def check_eth(self, eth):
         if dnet.eth_ntoa(str(eth.dst)) == DTP_DEST_MAC:
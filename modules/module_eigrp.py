@@ -43,6 +43,8 @@ import dnet
 import dpkt
 import pcap
 
+import loki
+
 import gobject
 import gtk
 import gtk.glade
@@ -306,6 +308,7 @@ class eigrp_hello_thread(threading.Thread):
         self.running = True
         self.as_num = as_num
         self.auth = auth
+        self.templates = loki.template_cache()
 
     def send_multicast(self, data):
         ip_hdr = dpkt.ip.IP(    ttl=2,
@@ -322,34 +325,39 @@ class eigrp_hello_thread(threading.Thread):
                                             )
         self.parent.dnet.send(str(eth_hdr))
 
+    def hello_frame(self, src):
+        params = eigrp_param(1, 0, 1, 0, 0, 15)
+        version = eigrp_version(self.parent.ios_ver, self.parent.eigrp_ver) #(0xc02, 0x300)
+        args = [params, version]
+        if self.auth:
+            args.insert(0, self.auth)
+        msg = eigrp_packet(eigrp_packet.EIGRP_OPTCODE_HELLO, 0, 0, 0, self.as_num, args)
+        data = msg.render()
+        ip_hdr = dpkt.ip.IP(    ttl=2,
+                                p=dpkt.ip.IP_PROTO_EIGRP,
+                                src=src,
+                                dst=dnet.ip_aton(EIGRP_MULTICAST_ADDRESS),
+                                data=data
+                                )
+        ip_hdr.len += len(ip_hdr.data)
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(EIGRP_MULTICAST_MAC),
+                                            src=self.parent.mac,
+                                            type=dpkt.ethernet.ETH_TYPE_IP,
+                                            data=str(ip_hdr)
+                                            )
+        return str(eth_hdr)
+
     def hello(self):
         timer = DEFAULT_HOLD_TIME
         while self.running:
             if timer == DEFAULT_HOLD_TIME:
                 timer = 0
-                params = eigrp_param(1, 0, 1, 0, 0, 15)
-                version = eigrp_version(self.parent.ios_ver, self.parent.eigrp_ver) #(0xc02, 0x300)
-                args = [params, version]
-                if self.auth:
-                    args.insert(0, self.auth)
-                msg = eigrp_packet(eigrp_packet.EIGRP_OPTCODE_HELLO, 0, 0, 0, self.as_num, args)
-                data = msg.render()
                 if not self.parent.spoof:
-                    self.send_multicast(data)
+                    src = self.parent.address
                 else:
-                    ip_hdr = dpkt.ip.IP(    ttl=2,
-                                            p=dpkt.ip.IP_PROTO_EIGRP,
-                                            src=self.parent.spoof,
-                                            dst=dnet.ip_aton(EIGRP_MULTICAST_ADDRESS),
-                                            data=data
-                                            )
-                    ip_hdr.len += len(ip_hdr.data)
-                    eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(EIGRP_MULTICAST_MAC),
-                                                        src=self.parent.mac,
-                                                        type=dpkt.ethernet.ETH_TYPE_IP,
-                                                        data=str(ip_hdr)
-                                                        )
-                    self.parent.dnet.send(str(eth_hdr))
+                    src = self.parent.spoof
+                template = self.templates.get("hello", (src, self.parent.mac, self.parent.ios_ver, self.parent.eigrp_ver), lambda: self.hello_frame(src))
+                self.parent.dnet.send(template.render())
             timer += 1
             time.sleep(1)
 
@@ -508,6 +516,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "eigrp"
         self.group = "ROUTING"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_eigrp.glade"
         self.treestore = gtk.TreeStore(str, str)
         self.filter = False
@@ -631,7 +640,10 @@ class mod_class(object):
         self.__log = log
 
     def get_ip_checks(self):
-        return (self.check_ip, self.input_ip)
+        return (self.check_ip, self.input_ip, [dpkt.ip.IP_PROTO_EIGRP])
+
+    def get_bpf_filter(self):
+        return "ip proto %d" % dpkt.ip.IP_PROTO_EIGRP
 
     def check_ip(self, ip):
         if ip.p == dpkt.ip.IP_PROTO_EIGRP:
@@ -36,6 +36,8 @@ import time
 import dnet
 import dpkt
 
+import loki
+
 import gobject
 import gtk
 import gtk.glade
@@ -215,6 +217,49 @@ class glbp_thread(threading.Thread):
         threading.Thread.__init__(self)
         self.parent = parent
         self.running = True
+        self.templates = loki.template_cache()
+
+    def hello(self, pkg, hello, req_resp, auth):
+        glbp = glbp_packet(pkg.group, self.parent.mac)
+        glbp_hello = glbp_tlv_hello(glbp_tlv_hello.STATE_ACTIVE, 255, hello.hello_int, hello.hold_int,
+                            hello.redirect, hello.timeout, hello.addr_type, hello.addr_len, hello.addr)
+        reqs = ""
+        for req in req_resp:
+            req.prio = 255
+            req.weight = 255
+            reqs += req.render()
+        
+        if not auth is None:
+            if auth.auth_type == glbp_tlv_auth.TYPE_PLAIN:
+                data = glbp.render() + auth.render() + glbp_hello.render() + reqs
+            elif auth.auth_type == glbp_tlv_auth.TYPE_MD5_STRING:
+                nonce = "\x00\x01\x02\x03\x04\x05\x06\x07"
+                data = glbp_tlv_nonce().render(nonce) + glbp_hello.render() + reqs
+                import hashlib
+                m = hashlib.md5()
+                m.update(data)
+                auth.secret = m.digest()
+                data = glbp.render() + auth.render() + data
+        else:
+            data = glbp.render() + glbp_hello.render() + reqs
+        udp_hdr = dpkt.udp.UDP( sport=GLBP_PORT,
+                                dport=GLBP_PORT,
+                                data=data
+                                )
+        udp_hdr.ulen += len(udp_hdr.data)
+        ip_hdr = dpkt.ip.IP(    ttl=255,
+                                p=dpkt.ip.IP_PROTO_UDP,
+                                src=self.parent.ip,
+                                dst=dnet.ip_aton(GLBP_MULTICAST_ADDRESS),
+                                data=str(udp_hdr)
+                                )
+        ip_hdr.len += len(ip_hdr.data)
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(GLBP_MULTICAST_MAC),
+                                            src=self.parent.mac,
+                                            type=dpkt.ethernet.ETH_TYPE_IP,
+                                            data=str(ip_hdr)
+                                            )
+        return str(eth_hdr)
 
     def run(self):
         self.parent.log("GLBP: Thread started")
@@ -222,46 +267,8 @@ class glbp_thread(threading.Thread):
             for i in self.parent.peers:
                 (iter, pkg, hello, req_resp, auth, state, arp) = self.parent.peers[i]
                 if state:
-                    glbp = glbp_packet(pkg.group, self.parent.mac)
-                    glbp_hello = glbp_tlv_hello(glbp_tlv_hello.STATE_ACTIVE, 255, hello.hello_int, hello.hold_int,
-                                        hello.redirect, hello.timeout, hello.addr_type, hello.addr_len, hello.addr)
-                    reqs = ""
-                    for req in req_resp:
-                        req.prio = 255
-                        req.weight = 255
-                        reqs += req.render()
-                    
-                    if not auth is None:
-                        if auth.auth_type == glbp_tlv_auth.TYPE_PLAIN:
-                            data = glbp.render() + auth.render() + glbp_hello.render() + reqs
-                        elif auth.auth_type == glbp_tlv_auth.TYPE_MD5_STRING:
-                            nonce = "\x00\x01\x02\x03\x04\x05\x06\x07"
-                            data = glbp_tlv_nonce().render(nonce) + glbp_hello.render() + reqs
-                            import hashlib
-                            m = hashlib.md5()
-                            m.update(data)
-                            auth.secret = m.digest()
-                            data = glbp.render() + auth.render() + data
-                    else:
-                        data = glbp.render() + glbp_hello.render() + reqs
-                    udp_hdr = dpkt.udp.UDP( sport=GLBP_PORT,
-                                            dport=GLBP_PORT,
-                                            data=data
-                                            )
-                    udp_hdr.ulen += len(udp_hdr.data)
-                    ip_hdr = dpkt.ip.IP(    ttl=255,
-                                            p=dpkt.ip.IP_PROTO_UDP,
-                                            src=self.parent.ip,
-                                            dst=dnet.ip_aton(GLBP_MULTICAST_ADDRESS),
-                                            data=str(udp_hdr)
-                                            )
-                    ip_hdr.len += len(ip_hdr.data)
-                    eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(GLBP_MULTICAST_MAC),
-                                                        src=self.parent.mac,
-                                                        type=dpkt.ethernet.ETH_TYPE_IP,
-                                                        data=str(ip_hdr)
-                                                        )
-                    self.parent.dnet.send(str(eth_hdr))
+                    template = self.templates.get(i, (pkg, hello, tuple(req_resp), auth, self.parent.ip, self.parent.mac), lambda: self.hello(pkg, hello, req_resp, auth))
+                    self.parent.dnet.send(template.render())
                     if arp:
                         if arp < 4:
                             src_mac = self.parent.mac
@@ -316,9 +323,11 @@ class mod_class(object):
         self.platform = platform
         self.name = "glbp"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_glbp.glade"
         self.treestore = gtk.TreeStore(str, str, int, str, str)
         self.thread = None
+        self.potfile = None
 
     def start_mod(self):
         self.peers = {}
@@ -389,8 +398,14 @@ class mod_class(object):
         self.dnet = dnet
         self.mac = dnet.eth.get()
 
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [GLBP_PORT])
+
+    def get_bpf_filter(self):
+        return "udp port %d" % GLBP_PORT
 
     def check_udp(self, udp):
         if udp.dport == GLBP_PORT:
@@ -422,6 +437,9 @@ class mod_class(object):
                     data = auth.parse(data)
                     if auth.auth_type == glbp_tlv_auth.TYPE_PLAIN:
                         auth_str = "Plaintext: '%s'" % auth.secret[:-1]
+                        #cleartext keys are often reused for md5 elsewhere
+                        if self.potfile and auth.secret[:-1]:
+                            self.potfile.add("glbp-text", None, auth.secret[:-1])
                     elif auth.auth_type == glbp_tlv_auth.TYPE_MD5_STRING:
                         auth_str = "MD5 String: '%s'" % auth.secret.encode("hex")
                     elif auth.auth_type == glbp_tlv_auth.TYPE_MD5_CHAIN:
@@ -37,6 +37,8 @@ import hashlib
 import dnet
 import dpkt
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
@@ -119,6 +121,42 @@ class hsrp_thread(threading.Thread):
         threading.Thread.__init__(self)
         self.parent = parent
         self.running = True
+        self.templates = loki.template_cache()
+
+    def hello(self, pkg, auth, secret):
+        if not auth is None:
+            hsrp = hsrp_packet(hsrp_packet.OP_HELLO, hsrp_packet.STATE_ACTIVE, pkg.hello, pkg.hold, 255, pkg.group, "\x00" * 8, pkg.ip)
+            auth = hsrp_auth_tlv(auth.algo, auth.flags, self.parent.ip, auth.keyid, "\x00" * 16)
+            key_length = struct.pack("<Q", (len(secret) << 3))
+            key_fill = secret + '\x80' + '\x00' * (55 - len(secret)) + key_length
+            salt = hsrp.render() + auth.render()
+            m = hashlib.md5()
+            m.update(key_fill)
+            m.update(salt)
+            m.update(secret)
+            auth.csum = m.digest()
+            data = hsrp.render() + auth.render()
+        else:
+            hsrp = hsrp_packet(hsrp_packet.OP_HELLO, hsrp_packet.STATE_ACTIVE, pkg.hello, pkg.hold, 255, pkg.group, pkg.auth_data, pkg.ip)
+            data = hsrp.render()
+        udp_hdr = dpkt.udp.UDP( sport=HSRP_PORT,
+                                dport=HSRP_PORT,
+                                data=data
+                                )
+        udp_hdr.ulen += len(udp_hdr.data)
+        ip_hdr = dpkt.ip.IP(    ttl=1,
+                                p=dpkt.ip.IP_PROTO_UDP,
+                                src=self.parent.ip,
+                                dst=dnet.ip_aton(HSRP_MULTICAST_ADDRESS),
+                                data=str(udp_hdr)
+                                )
+        ip_hdr.len += len(ip_hdr.data)
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(HSRP_MULTICAST_MAC),
+                                            src=self.parent.mac,
+                                            type=dpkt.ethernet.ETH_TYPE_IP,
+                                            data=str(ip_hdr)
+                                            )
+        return str(eth_hdr)
 
     def run(self):
         self.parent.log("HSRP: Thread started")
@@ -127,43 +165,15 @@ class hsrp_thread(threading.Thread):
                 if self.parent.peers[i]["state"]:
                     pkg = self.parent.peers[i]["pkg"]
                     auth = self.parent.peers[i]["auth"]
+                    secret = None
                     if not auth is None:
-                        hsrp = hsrp_packet(hsrp_packet.OP_HELLO, hsrp_packet.STATE_ACTIVE, pkg.hello, pkg.hold, 255, pkg.group, "\x00" * 8, pkg.ip)
-                        auth = hsrp_auth_tlv(auth.algo, auth.flags, self.parent.ip, auth.keyid, "\x00" * 16)
                         if self.parent.ui == 'gtk':
                             secret = self.parent.auth_entry.get_text()
                         elif self.parent.ui == 'urw':
                             secret = self.parent.auth_edit.get_edit_text()
-                        key_length = struct.pack("<Q", (len(secret) << 3))
-                        key_fill = secret + '\x80' + '\x00' * (55 - len(secret)) + key_length
-                        salt = hsrp.render() + auth.render()
-                        m = hashlib.md5()
-                        m.update(key_fill)
-                        m.update(salt)
-                        m.update(secret)
-                        auth.csum = m.digest()
-                        data = hsrp.render() + auth.render()
-                    else:
-                        hsrp = hsrp_packet(hsrp_packet.OP_HELLO, hsrp_packet.STATE_ACTIVE, pkg.hello, pkg.hold, 255, pkg.group, pkg.auth_data, pkg.ip)
-                        data = hsrp.render()
-                    udp_hdr = dpkt.udp.UDP( sport=HSRP_PORT,
-                                            dport=HSRP_PORT,
-                                            data=data
-                                            )
-                    udp_hdr.ulen += len(udp_hdr.data)
-                    ip_hdr = dpkt.ip.IP(    ttl=1,
-                                            p=dpkt.ip.IP_PROTO_UDP,
-                                            src=self.parent.ip,
-                                            dst=dnet.ip_aton(HSRP_MULTICAST_ADDRESS),
-                                            data=str(udp_hdr)
-                                            )
-                    ip_hdr.len += len(ip_hdr.data)
-                    eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(HSRP_MULTICAST_MAC),
-                                                        src=self.parent.mac,
-                                                        type=dpkt.ethernet.ETH_TYPE_IP,
-                                                        data=str(ip_hdr)
-                                                        )
-                    self.parent.dnet.send(str(eth_hdr))
+                    #the hello only changes with the peer, our address or the secret
+                    template = self.templates.get(i, (pkg, auth, secret, self.parent.ip, self.parent.mac), lambda: self.hello(pkg, auth, secret))
+                    self.parent.dnet.send(template.render())
                     if self.parent.peers[i]["arp"]:
                         src_mac = dnet.eth_aton("00:00:0c:07:ac:%02x" % (pkg.group))
                         brdc_mac = dnet.eth_aton("ff:ff:ff:ff:ff:ff")
@@ -217,6 +227,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "hsrp"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_hsrp.glade"
         self.ui = ui
         if ui == 'gtk':
@@ -335,7 +346,10 @@ class mod_class(object):
         self.mac = dnet.eth.get()
 
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [HSRP_PORT])
+
+    def get_bpf_filter(self):
+        return "udp port %d" % HSRP_PORT
 
     def check_udp(self, udp):
         if udp.dport == HSRP_PORT:
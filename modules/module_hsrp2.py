@@ -32,12 +32,13 @@
 import struct
 import threading
 import time
-import hashlib
 
 import dnet
 import dpkt
 import IPy
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
@@ -255,16 +256,8 @@ class hsrp2_thread(threading.Thread):
                             secret = self.parent.auth_entry.get_text()
                         elif self.parent.ui == 'urw':
                             secret = self.parent.auth_edit.get_edit_text()
-                        key_length = struct.pack("<Q", (len(secret) << 3))
-                        key_fill = secret + '\x80' + '\x00' * (55 - len(secret)) + key_length
-                        salt = data + auth.render()
-                        m = hashlib.md5()
-                        m.update(key_fill)
-                        m.update(salt)
-                        m.update(secret)
-                        auth.csum = m.digest()
+                        auth.csum = loki.keyed_md5(secret, data + auth.render())
                         data += auth.render()
-                        pass
                     
                     if pkg["hsrp2_group_state_tlv"].ip_ver == 4:
                         udp_hdr = dpkt.udp.UDP( sport=HSRP2_PORT,
@@ -361,6 +354,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "hsrp-v2"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_hsrp2.glade"
         self.ui = ui
         if ui == 'gtk':
@@ -377,6 +371,7 @@ class mod_class(object):
             import urwid as urwid_
             global urwid
             urwid = urwid_
+        self.potfile = None
         self.thread = None
 
     def get_urw(self):
@@ -485,8 +480,23 @@ class mod_class(object):
         self.dnet = dnet
         self.mac = dnet.eth.get()
 
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
+    def set_secret(self, secret):
+        #a known secret is used for the md5 auth unless one is set already
+        if self.ui == 'gtk':
+            if not self.auth_entry.get_text():
+                self.auth_entry.set_text(secret)
+        elif self.ui == 'urw':
+            if not self.auth_edit.get_edit_text():
+                self.auth_edit.set_edit_text(secret)
+
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [HSRP2_PORT, HSRP2_PORT6])
+
+    def get_bpf_filter(self):
+        return "udp port %d or udp port %d" % (HSRP2_PORT, HSRP2_PORT6)
 
     def check_udp(self, udp):
         if udp.dport == HSRP2_PORT or udp.dport == HSRP2_PORT6:
@@ -502,6 +512,7 @@ class mod_class(object):
                 ip_addr = ""
                 prio = 0
                 auth = ""
+                secret = None
                 tlv = hsrp2_tlv()
                 left = str(udp.data)
                 while len(left) > 0:
@@ -517,14 +528,23 @@ class mod_class(object):
                         left = hsrp2_text_auth.parse(left)
                         pkg["hsrp2_text_auth_tlv"] = hsrp2_text_auth
                         auth = hsrp2_text_auth.auth_data
+                        if self.potfile and auth.rstrip("\x00"):
+                            self.potfile.add("hsrp2-text", None, auth.rstrip("\x00"))
                     elif tlv.type == hsrp2_tlv.TYPE_MD5_AUTH:
+                        #the digest covers the packet with a zero digest
+                        off = len(str(udp.data)) - len(left) + 12
                         hsrp2_md5_auth = hsrp2_md5_auth_tlv()
                         left = hsrp2_md5_auth.parse(left)
                         pkg["hsrp2_md5_auth_tlv"] = hsrp2_md5_auth
                         auth = "MD5: %s key#%d" % (hsrp2_md5_auth.csum.encode("hex"), hsrp2_md5_auth.keyid)
+                        if self.potfile:
+                            salt = str(udp.data)[:off] + "\x00" * 16 + str(udp.data)[off + 16:]
+                            secret = self.potfile.verify("hsrp2-md5", hsrp2_md5_auth.keyid, hsrp2_md5_auth.csum, salt)
+                            if secret is not None:
+                                auth += " PASS(%s)" % secret
                     else:
                         return
-                if type(ip) == dpkt.ip6.IP6:
+                if isinstance(ip, dpkt.ip6.IP6):
                     src = dnet.ip6_ntoa(ip.src)
                     ip_addr = dnet.ip6_ntoa(ip_addr)
                 else:
@@ -538,6 +558,9 @@ class mod_class(object):
                     iter = None
                 self.peers[ip.src] = (iter, pkg, False, False)
                 self.log("HSRP2: Got new peer %s" % (src))
+                if secret is not None:
+                    self.log("HSRP2: Known password '%s' for peer %s" % (secret, src))
+                    self.set_secret(secret)
 
     # SIGNALS #
 
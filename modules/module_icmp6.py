@@ -89,9 +89,7 @@ class spoof_thread(threading.Thread):
                 for iter in self.parent.spoofs:
                     (run, entry, org_data, hosts) = self.parent.spoofs[iter]
                     if run:
-                        for data in entry:
-                            self.parent.dnet.send(data)
-                            time.sleep(0.001)
+                        self.parent.dnet.send_burst(entry, self.parent.name + " spoof")
             for x in xrange(self.parent.spoof_delay):
                 if not self.running:
                     break
@@ -210,6 +208,7 @@ class mod_class(object):
         self.macs = None
         self.mac = None
         self.spoof_delay = 30
+        self.spoof_rate = 1000
     
     def start_mod(self):
         self.spoof_thread = spoof_thread(self)
@@ -483,6 +482,7 @@ class mod_class(object):
     def set_dnet(self, dnet_thread):
         self.dnet = dnet_thread
         self.mac = dnet_thread.eth.get()
+        self.dnet.set_rate(self.name + " spoof", self.spoof_rate)
 
     def get_ip6_checks(self):
         return (self.check_ip6, self.input_ip6)
@@ -541,7 +541,10 @@ class mod_class(object):
                 self.mappings_liststore.append([mac, rand_mac])
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [dpkt.ethernet.ETH_TYPE_IP6])
+
+    def get_bpf_filter(self):
+        return "ip6"
 
     def check_eth(self, eth):
         if eth.type == dpkt.ethernet.ETH_TYPE_IP6:
@@ -971,9 +974,17 @@ class mod_class(object):
                                         "type" : "int",
                                         "min" : 1,
                                         "max" : 100
+                                        },
+                    "spoof_rate" : {    "value" : self.spoof_rate,
+                                        "type" : "int",
+                                        "min" : 1,
+                                        "max" : 1000000
                                         }
                     }
 
     def set_config_dict(self, dict):
         if dict:
             self.spoof_delay = dict["spoof_delay"]["value"]
+            self.spoof_rate = dict["spoof_rate"]["value"]
+        if self.dnet:
+            self.dnet.set_rate(self.name + " spoof", self.spoof_rate)
@@ -34,7 +34,6 @@ import hmac
 import math
 import os
 import struct
-import tempfile
 import threading
 import time
 
@@ -42,6 +41,8 @@ import dnet
 import dpkt
 import IPy
 
+import loki
+
 import gobject
 import gtk
 import gtk.glade
@@ -321,45 +322,38 @@ class isis_tlv_area_address(isis_tlv):
             self.v = self.v[1+alen:]
         return data
         
-class isis_md5bf(threading.Thread):
-    def __init__(self, parent, iter, bf, full, wl, digest, data, identifier):
+def isis_crack_target(pdu):
+    #(digest, data) of a hello or lsp with hmac-md5 authentication, the
+    #hmac covers the pdu with a zero digest (and lifetime and checksum)
+    local = copy.deepcopy(pdu)
+    if local.pdu_type == isis_pdu_header.TYPE_L1_LINK_STATE or local.pdu_type == isis_pdu_header.TYPE_L2_LINK_STATE:
+        local.lifetime = 0
+        local.checksum = "\x00\x00"
+    digest = get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest
+    get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest = None
+    return (digest, local.render())
+
+class isis_md5bf(loki.crack_job):
+    #cracks the neighbors in iters in one run, targets are their (digest, data)
+    def __init__(self, parent, iters, bf, full, wl, targets, identifiers, threads, mask="", rules=""):
         self.parent = parent
-        self.iter = iter
-        self.bf = bf
-        self.full = full
-        self.wl = wl
-        self.digest = digest
-        self.data = data
-        self.identifier = identifier
-        threading.Thread.__init__(self)
+        self.iters = iters
+        self.identifiers = identifiers
+        loki.crack_job.__init__(self, "isis-hmac-md5", None, None, bf, full, wl, threads, name="ISIS", mask=mask, rules=rules, targets=targets)
 
-    def run(self):
-        if self.bf and not self.wl:
-            self.wl = ""
-        #print "bf:%i full:%i, wl:%s digest:%s data:%s datalen:%i" % (self.bf, self.full, self.wl, self.digest.encode('hex'), self.data.encode('hex'), len(self.data))
-        (handle, self.tmpfile) = tempfile.mkstemp(prefix="isis-md5-", suffix="-lock")
-        print self.tmpfile
-        os.close(handle)
-        if self.parent.platform == "Windows":
-            import isismd5bf
-            pw = isismd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        else:
-            import loki_bindings
-            pw = loki_bindings.isismd5.isismd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        if os.path.exists(self.tmpfile):
-            if self.parent.neighbor_treestore.iter_is_valid(self.iter):
-                if pw != None:
-                    self.parent.neighbor_treestore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, pw)
-                    self.parent.log("ISIS: Found password '%s' for %s" % (pw, self.identifier))
-                else:
-                    self.parent.neighbor_treestore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
-                    self.parent.log("ISIS: No password found for %s" % (self.identifier))
-                os.remove(self.tmpfile)
+    def hit(self, index):
+        if self.parent.neighbor_treestore.iter_is_valid(self.iters[index]):
+            self.parent.neighbor_treestore.set_value(self.iters[index], self.parent.NEIGH_CRACK_ROW, self.pws[index])
+            self.parent.log("ISIS: Found password '%s' for %s" % (self.pws[index], self.identifiers[index]))
+
+    def done(self):
+        if self.state == loki.CRACK_CANCELLED:
+            return
+        for (iter, identifier, pw) in zip(self.iters, self.identifiers, self.pws):
+            if pw is None and self.parent.neighbor_treestore.iter_is_valid(iter):
+                self.parent.neighbor_treestore.set_value(iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
+                self.parent.log("ISIS: No password found for %s" % (identifier))
 
-    def quit(self):
-        if os.path.exists(self.tmpfile):
-            os.remove(self.tmpfile)
-        
 class isis_thread(threading.Thread):
     def __init__(self, parent):
         self.parent = parent
@@ -613,6 +607,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "isis"
         self.group = "ROUTING"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_isis.glade"
         self.neighbor_treestore = gtk.TreeStore(str, str, str, str, str, gobject.TYPE_PYOBJECT)
         self.network_liststore = gtk.ListStore(str, str)
@@ -626,6 +621,9 @@ class mod_class(object):
                 #~ self.auth_type_liststore.append([i, val])
         self.dnet = None
         self.thread = None
+        self.bf = None
+        self.cracker = None
+        self.potfile = None
         self.mtu = 1514
         self.sleep_time = 1
         self.level = None
@@ -655,6 +653,9 @@ class mod_class(object):
     def shut_mod(self):
         if self.thread:
             self.thread.quit()
+        if self.bf:
+            for i in self.bf:
+                self.bf[i].cancel()
 
     def get_root(self):
         self.glade_xml = gtk.glade.XML(self.parent.data_dir + self.gladefile)
@@ -752,6 +753,24 @@ class mod_class(object):
         self.ip6_ll = dnet.ip6_aton(ip6_ll)
         self.mask6_ll = len(IPy.IP(mask6_ll).strBin().replace("0", ""))
 
+    def set_cracker(self, cracker):
+        self.cracker = cracker
+
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
+    def check_known(self, iter, ident, pdu):
+        #looks the pdu up in the secrets known so far, returns the pw
+        auth = get_tlv(pdu, isis_tlv.TYPE_AUTHENTICATION)
+        if not self.potfile or auth is None or auth.auth_type != isis_tlv_authentication.AUTH_TYPE_HMAC_MD5:
+            return None
+        (digest, data) = isis_crack_target(pdu)
+        pw = self.potfile.verify("isis-hmac-md5", None, digest, data)
+        if pw is not None:
+            self.neighbor_treestore.set_value(iter, self.NEIGH_CRACK_ROW, pw)
+            self.log("ISIS: Known password '%s' for %s" % (pw, ident))
+        return pw
+
     def set_dnet(self, dnet):
         self.dnet = dnet
         self.mac = dnet.eth.get()
@@ -760,7 +779,10 @@ class mod_class(object):
         self.interface = interface
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [dnet.eth_aton(ISIS_ALL_L1_IS_MAC), dnet.eth_aton(ISIS_ALL_L2_IS_MAC)])
+
+    def get_bpf_filter(self):
+        return "ether dst %s or ether dst %s" % (ISIS_ALL_L1_IS_MAC, ISIS_ALL_L2_IS_MAC)
 
     def check_eth(self, eth):
         if eth.dst == dnet.eth_aton(ISIS_ALL_L1_IS_MAC) or eth.dst == dnet.eth_aton(ISIS_ALL_L2_IS_MAC):
@@ -804,6 +826,7 @@ class mod_class(object):
                         
                         self.log("ISIS: Got new peer %s" % (dnet.eth_ntoa(eth.src)))
                         neighbors[eth.src] = cur
+                        self.check_known(cur["iter"], dnet.eth_ntoa(eth.src), hello)
                     else:
                         neighbors[eth.src]["hello"] = hello
                     if self.lan_id == None:
@@ -840,6 +863,7 @@ class mod_class(object):
                                                                     ])
                         new["lsp"] = lsp
                         cur["lsps"][lsp.lsp_id] = new
+                        self.check_known(new["iter"], lsp.lsp_id.encode("hex"), lsp)
                         tlv = get_tlv(lsp, isis_tlv.TYPE_IP_INT_REACH)
                         if not tlv is None:
                             prefixes = tlv.v
@@ -955,8 +979,13 @@ class mod_class(object):
         self.nets_changed = True
     
     def on_bf_button_clicked(self, btn):
+        #all selected neighbors get cracked in one run, a level often
+        #shares one key
         select = self.neighbor_treeview.get_selection()
         (model, paths) = select.get_selected_rows()
+        idents = []
+        iters = []
+        targets = []
         for i in paths:
             iter = model.get_iter(i)
             obj = model.get_value(iter, self.NEIGH_DICT_ROW)
@@ -968,26 +997,25 @@ class mod_class(object):
                 pdu = obj["lsp"]
             if ident in self.bf:
                 if self.bf[ident].is_alive():
-                    return
+                    continue
             enc = model.get_value(iter, self.NEIGH_AUTH_ROW)
             if not enc == "HMAC-MD5":
                 self.log("ISIS: Cant crack %s, doesnt use HMAC-MD5 authentication" % ident)
-                return
-            local = copy.deepcopy(pdu)
-            if local.pdu_type == isis_pdu_header.TYPE_L1_HELLO or local.pdu_type == isis_pdu_header.TYPE_L2_HELLO:
-                digest = get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest
-                get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest = None
-                data = local.render()
-            elif local.pdu_type == isis_pdu_header.TYPE_L1_LINK_STATE or local.pdu_type == isis_pdu_header.TYPE_L2_LINK_STATE:
-                local.lifetime = 0
-                local.checksum = "\x00\x00"
-                digest = get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest
-                get_tlv(local, isis_tlv.TYPE_AUTHENTICATION).digest = None
-                data = local.render()
-            thread = isis_md5bf(self, iter, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, digest, data, ident)
+                continue
+            #no need to crack what is known already
+            if self.check_known(iter, ident, pdu) is not None:
+                continue
+            (digest, data) = isis_crack_target(pdu)
+            idents.append(ident)
+            iters.append(iter)
+            targets.append((digest, data))
+        if not targets:
+            return
+        job = isis_md5bf(self, iters, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, targets, idents, self.parent.bruteforce_threads, self.parent.bruteforce_mask, self.parent.wordlist_rules)
+        for (ident, iter) in zip(idents, iters):
             model.set_value(iter, self.NEIGH_CRACK_ROW, "RUNNING")
-            thread.start()
-            self.bf[ident] = thread
+            self.bf[ident] = job
+        self.cracker.submit(job)
 
     def get_config_dict(self):
         return {    "mtu" : {   "value" : self.mtu,
@@ -409,7 +409,10 @@ class mod_class(object):
         self.ip = ip
 
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [LDP_PORT])
+
+    def get_bpf_filter(self):
+        return "udp port %d" % LDP_PORT
 
     def check_udp(self, udp):
         if udp.dport == LDP_PORT:
@@ -34,7 +34,6 @@ import random
 import socket
 import struct
 import os
-import tempfile
 import threading
 import time
 
@@ -42,6 +41,8 @@ import dnet
 import dpkt
 import IPy
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
@@ -738,9 +739,10 @@ class ospf_thread(threading.Thread):
         self.hello = False
         self.hello_count = 0
         self.state = self.GLOBAL_STATE_INIT
+        self.templates = loki.template_cache()
         threading.Thread.__init__(self)
 
-    def send_multicast(self, data):
+    def multicast_frame(self, data):
         ip_hdr = dpkt.ip.IP(    ttl=1,
                                 p=dpkt.ip.IP_PROTO_OSPF,
                                 src=self.parent.ip,
@@ -753,7 +755,34 @@ class ospf_thread(threading.Thread):
                                             type=dpkt.ethernet.ETH_TYPE_IP,
                                             data=str(ip_hdr)
                                             )
-        self.parent.dnet.send(str(eth_hdr))
+        return str(eth_hdr)
+
+    def send_multicast(self, data):
+        self.parent.dnet.send(self.multicast_frame(data))
+
+    def hello_frame(self, neighbors):
+        packet = ospf_hello(    self.parent.area,
+                                self.parent.auth_type,
+                                self.parent.auth_data,
+                                self.parent.ip,
+                                self.parent.mask,
+                                self.parent.delay,
+                                ospf_hello.OPTION_TOS_CAPABILITY | (self.parent.options & ospf_hello.OPTION_EXTERNAL_ROUTING_CAPABILITY),
+                                1,
+                                self.parent.delay * 4,
+                                self.parent.dr,
+                                self.parent.bdr,
+                                neighbors
+                                )
+        return self.multicast_frame(packet.render())
+
+    def unicast_hello_frame(self, hello, mac, ip):
+        #same hello, only the destination addresses differ
+        template = hello.copy()
+        template.patch(0, mac)
+        template.patch(30, ip)
+        template.ip_checksum()
+        return template.render()
 
     def send_unicast(self, mac, ip, data):
         ip_hdr = dpkt.ip.IP(    ttl=1,
@@ -833,23 +862,15 @@ class ospf_thread(threading.Thread):
                         self.state = self.GLOBAL_STATE_DONE
                         self.send_multicast(packet.render())
 
+                    #the hello only changes with the neighbors or the settings
+                    hello_key = (   tuple(neighbors), self.parent.area, self.parent.auth_type, self.parent.auth_data,
+                                    self.parent.ip, self.parent.mask, self.parent.delay, self.parent.options,
+                                    self.parent.dr, self.parent.bdr, self.parent.mac )
+                    hello = self.templates.get("hello", hello_key, lambda: self.hello_frame(neighbors))
                     if self.hello_count >= self.parent.delay - 1:
                         self.hello_count = 0
                         #Multicast hello
-                        packet = ospf_hello(    self.parent.area,
-                                                self.parent.auth_type,
-                                                self.parent.auth_data,
-                                                self.parent.ip,
-                                                self.parent.mask,
-                                                self.parent.delay,
-                                                ospf_hello.OPTION_TOS_CAPABILITY | (self.parent.options & ospf_hello.OPTION_EXTERNAL_ROUTING_CAPABILITY),
-                                                1,
-                                                self.parent.delay * 4,
-                                                self.parent.dr,
-                                                self.parent.bdr,
-                                                neighbors
-                                                )
-                        self.send_multicast(packet.render())
+                        self.parent.dnet.send(hello.render())
                     else:
                         self.hello_count += 1
                    
@@ -858,20 +879,8 @@ class ospf_thread(threading.Thread):
 
                         if state == self.STATE_HELLO:
                             #Unicast hello
-                            packet = ospf_hello(    self.parent.area,
-                                                    self.parent.auth_type,
-                                                    self.parent.auth_data,
-                                                    self.parent.ip,
-                                                    self.parent.mask,
-                                                    self.parent.delay,
-                                                    ospf_hello.OPTION_TOS_CAPABILITY | (self.parent.options & ospf_hello.OPTION_EXTERNAL_ROUTING_CAPABILITY),
-                                                    1,
-                                                    self.parent.delay * 4,
-                                                    self.parent.dr,
-                                                    self.parent.bdr,
-                                                    neighbors
-                                                    )
-                            self.send_unicast(mac, ip, packet.render())                        
+                            template = self.templates.get(id, hello_key + (mac, ip), lambda: self.unicast_hello_frame(hello, mac, ip))
+                            self.parent.dnet.send(template.render())
                         elif state == self.STATE_2WAY:
                             if dbd:
                                 if master:
@@ -1051,44 +1060,36 @@ class ospf_thread(threading.Thread):
     def quit(self):
         self.running = False
 
-class ospf_md5bf(threading.Thread):
-    def __init__(self, parent, iter, bf, full, wl, digest, data):
+def ospf_crack_target(packet):
+    #(digest, data, key id) of a packet with crypt authentication
+    hdr = ospf_header()
+    hdr.parse(packet)
+    digest = packet[hdr.len:hdr.len+16]
+    data = packet[:12] + "\0\0" + packet[14:hdr.len]
+    return (digest, data, (hdr.auth_data >> 40) & 0xff)
+
+class ospf_md5bf(loki.crack_job):
+    #cracks the neighbors in iters in one run, targets are their (digest, data)
+    def __init__(self, parent, iters, bf, full, wl, targets, keyids, threads, mask="", rules=""):
         self.parent = parent
-        self.iter = iter
-        self.bf = bf
-        self.full = full
-        self.wl = wl
-        self.digest = digest
-        self.data = data
-        threading.Thread.__init__(self)
-
-    def run(self):
-        if self.bf and not self.wl:
-            self.wl = ""
-        #print "bf:%i full:%i, wl:%s digest:%s data:%s" % (self.bf, self.full, self.wl, self.digest.encode('hex'), self.data.encode('hex'))
-        (handle, self.tmpfile) = tempfile.mkstemp(prefix="ospf-md5-", suffix="-lock")
-        print self.tmpfile
-        os.close(handle)
-        if self.parent.platform == "Windows":
-            import ospfmd5bf
-            pw = ospfmd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        else:
-            import loki_bindings
-            pw = loki_bindings.ospfmd5.ospfmd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        if os.path.exists(self.tmpfile):
-            if self.parent.neighbor_liststore.iter_is_valid(self.iter):
-                src = self.parent.neighbor_liststore.get_value(self.iter, self.parent.NEIGH_IP_ROW)
-                if pw != None:
-                    self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, pw)
-                    self.parent.log("OSPF: Found password '%s' for host %s" % (pw, src))
-                else:
-                    self.parent.neighbor_liststore.set_value(self.iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
-                    self.parent.log("OSPF: No password found for host %s" % (src))
-            os.remove(self.tmpfile)
-
-    def quit(self):
-        if os.path.exists(self.tmpfile):
-            os.remove(self.tmpfile)
+        self.iters = iters
+        loki.crack_job.__init__(self, "ospf-md5", None, None, bf, full, wl, threads, name="OSPF", mask=mask, rules=rules, targets=targets, keyid=keyids)
+
+    def hit(self, index):
+        iter = self.iters[index]
+        if self.parent.neighbor_liststore.iter_is_valid(iter):
+            src = self.parent.neighbor_liststore.get_value(iter, self.parent.NEIGH_IP_ROW)
+            self.parent.neighbor_liststore.set_value(iter, self.parent.NEIGH_CRACK_ROW, self.pws[index])
+            self.parent.log("OSPF: Found password '%s' for host %s" % (self.pws[index], src))
+
+    def done(self):
+        if self.state == loki.CRACK_CANCELLED:
+            return
+        for (iter, pw) in zip(self.iters, self.pws):
+            if pw is None and self.parent.neighbor_liststore.iter_is_valid(iter):
+                src = self.parent.neighbor_liststore.get_value(iter, self.parent.NEIGH_IP_ROW)
+                self.parent.neighbor_liststore.set_value(iter, self.parent.NEIGH_CRACK_ROW, "NOT FOUND")
+                self.parent.log("OSPF: No password found for host %s" % (src))
 
 ### MODULE_CLASS ###
 
@@ -1190,6 +1191,7 @@ class mod_class(object):
             self.NeighParentNode = NeighParentNode_
         self.name = "ospf"
         self.group = "ROUTING"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_ospf.glade"
         if self.ui == 'gtk':
             self.neighbor_liststore = gtk.TreeStore(str, str, str, str, str, str, bool)
@@ -1211,6 +1213,8 @@ class mod_class(object):
         self.filter = False
         self.thread = None
         self.bf = None
+        self.cracker = None
+        self.potfile = None
         self.mtu = 1500
         self.delay = 10
         self.sleep_time = 1
@@ -1247,7 +1251,7 @@ class mod_class(object):
             self.filter = False
         if self.bf:
             for i in self.bf:
-                self.bf[i].quit()
+                self.bf[i].cancel()
         if self.ui == 'gtk':
             self.neighbor_liststore.clear()
             self.network_liststore.clear()
@@ -1452,6 +1456,24 @@ class mod_class(object):
     def set_fw(self, fw):
         self.fw = fw
 
+    def set_cracker(self, cracker):
+        self.cracker = cracker
+
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
+    def check_known(self, iter, src, packet):
+        #looks the packet up in the secrets known so far, returns the pw
+        if not self.potfile:
+            return None
+        (digest, data, keyid) = ospf_crack_target(packet)
+        pw = self.potfile.verify("ospf-md5", keyid, digest, data)
+        if pw is not None:
+            if self.ui == 'gtk':
+                self.neighbor_liststore.set_value(iter, self.NEIGH_CRACK_ROW, pw)
+            self.log("OSPF: Known password '%s' for host %s" % (pw, src))
+        return pw
+
     def set_int(self, interface):
         self.interface = interface
         self.ospf_filter = {    "device"    : self.interface,
@@ -1465,7 +1487,10 @@ class mod_class(object):
                                 }
 
     def get_ip_checks(self):
-        return (self.check_ip, self.input_ip)
+        return (self.check_ip, self.input_ip, [dpkt.ip.IP_PROTO_OSPF])
+
+    def get_bpf_filter(self):
+        return "ip proto %d" % dpkt.ip.IP_PROTO_OSPF
 
     def check_ip(self, ip):
         if ip.p == dpkt.ip.IP_PROTO_OSPF:
@@ -1511,6 +1536,8 @@ class mod_class(object):
                         #                    (iter, mac,     src,    dbd, lsa, state,                   master, seq,  last_packet, adverts)
                         self.neighbors[id] = (iter, eth.src, ip.src, None, [], ospf_thread.STATE_HELLO, master, 1337, ip.data, {})
                         self.log("OSPF: Got new peer %s" % (dnet.ip_ntoa(ip.src)))
+                        if header.auth_type == ospf_header.AUTH_CRYPT:
+                            self.check_known(iter, dnet.ip_ntoa(ip.src), data)
                     elif self.thread.hello:
                         (iter, mac, src, dbd, lsa, state, master, seq, last_packet, adverts) = self.neighbors[id]
                         if state == ospf_thread.STATE_HELLO:
@@ -1831,29 +1858,41 @@ class mod_class(object):
         self.thread.hello = btn.get_active()
 
     def on_bf_button_clicked(self, btn):
+        #all selected neighbors get cracked in one run, an area often
+        #shares one key
         select = self.neighbor_treeview.get_selection()
         (model, paths) = select.get_selected_rows()
+        idents = []
+        iters = []
+        targets = []
+        keyids = []
         for i in paths:
             iter = model.get_iter(i)
             id = model.get_value(iter, self.NEIGH_ID_ROW)
             ident = "%s" % (id)
             if ident in self.bf:
                 if self.bf[ident].is_alive():
-                    return
+                    continue
             (iter, mac, src, org_dbd, lsa, state, master, seq, last_packet, adverts) = self.neighbors[id]
             type = self.neighbor_liststore.get_value(iter, self.NEIGH_AUTH_ROW)
             if not type == "CRYPT":
                 self.log("OSPF: Cant crack %s, doesnt use CRYPT authentication" % ident)
-                return
-            packet_str = str(last_packet)
-            hdr = ospf_header()
-            hdr.parse(packet_str)
-            digest = packet_str[hdr.len:hdr.len+16]
-            data = packet_str[:12] + "\0\0" + packet_str[14:hdr.len]
-            thread = ospf_md5bf(self, iter, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, digest, data)
+                continue
+            #no need to crack what is known already
+            if self.check_known(iter, dnet.ip_ntoa(src), str(last_packet)) is not None:
+                continue
+            (digest, data, keyid) = ospf_crack_target(str(last_packet))
+            idents.append(ident)
+            iters.append(iter)
+            targets.append((digest, data))
+            keyids.append(keyid)
+        if not targets:
+            return
+        job = ospf_md5bf(self, iters, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, targets, keyids, self.parent.bruteforce_threads, self.parent.bruteforce_mask, self.parent.wordlist_rules)
+        for (ident, iter) in zip(idents, iters):
             model.set_value(iter, self.NEIGH_CRACK_ROW, "RUNNING")
-            thread.start()
-            self.bf[ident] = thread
+            self.bf[ident] = job
+        self.cracker.submit(job)
 
     def on_auth_type_combobox_changed(self, cbox):
         if self.auth_type_liststore and len(self.auth_type_liststore):
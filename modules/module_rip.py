@@ -36,6 +36,8 @@ import time
 import dnet
 import dpkt
 
+import loki
+
 import gobject
 import gtk
 import gtk.glade
@@ -147,6 +149,32 @@ class rip_thread(threading.Thread):
         threading.Thread.__init__(self)
         self.running = True
         self.parent = parent
+        self.templates = loki.template_cache()
+
+    def response(self, routes):
+        rlist = []
+        for (ip, mask, nh, metrik) in routes:
+            rlist.append(rip_entry(rip_entry.AF_INET, 0, dnet.ip_aton(ip), dnet.ip_aton(mask), dnet.ip_aton(nh), int(metrik)))
+        msg = rip_message(rip_message.COMMAND_RESPONSE, rlist)
+        data = msg.render()
+        udp_hdr = dpkt.udp.UDP( sport=RIP_PORT,
+                                dport=RIP_PORT,
+                                data=data
+                                )
+        udp_hdr.ulen += len(udp_hdr.data)
+        ip_hdr = dpkt.ip.IP(    ttl=2,
+                                p=dpkt.ip.IP_PROTO_UDP,
+                                src=self.parent.ip,
+                                dst=dnet.ip_aton(RIP_MULTICAST_ADDRESS),
+                                data=str(udp_hdr)
+                                )
+        ip_hdr.len += len(ip_hdr.data)
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(RIP_MULTICAST_MAC),
+                                            src=self.parent.mac,
+                                            type=dpkt.ethernet.ETH_TYPE_IP,
+                                            data=str(ip_hdr)
+                                            )
+        return str(eth_hdr)
 
     def run(self):
         self.parent.log("RIP: Thread started")
@@ -154,31 +182,14 @@ class rip_thread(threading.Thread):
         while self.running:
             if timer == 15:
                 timer = 0
-                rlist = []
+                routes = []
                 for ip in self.parent.routes:
                     (iter, mask, nh, metrik) = self.parent.routes[ip]
-                    rlist.append(rip_entry(rip_entry.AF_INET, 0, dnet.ip_aton(ip), dnet.ip_aton(mask), dnet.ip_aton(nh), int(metrik)))
-                msg = rip_message(rip_message.COMMAND_RESPONSE, rlist)
-                data = msg.render()
+                    routes.append((ip, mask, nh, metrik))
+                routes = tuple(routes)
+                template = self.templates.get("response", (routes, self.parent.ip, self.parent.mac), lambda: self.response(routes))
                 for dst in self.parent.hosts:
-                    udp_hdr = dpkt.udp.UDP( sport=RIP_PORT,
-                                            dport=RIP_PORT,
-                                            data=data
-                                            )
-                    udp_hdr.ulen += len(udp_hdr.data)
-                    ip_hdr = dpkt.ip.IP(    ttl=2,
-                                            p=dpkt.ip.IP_PROTO_UDP,
-                                            src=self.parent.ip,
-                                            dst=dnet.ip_aton(RIP_MULTICAST_ADDRESS),
-                                            data=str(udp_hdr)
-                                            )
-                    ip_hdr.len += len(ip_hdr.data)
-                    eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(RIP_MULTICAST_MAC),
-                                                        src=self.parent.mac,
-                                                        type=dpkt.ethernet.ETH_TYPE_IP,
-                                                        data=str(ip_hdr)
-                                                        )
-                    self.parent.dnet.send(str(eth_hdr))
+                    self.parent.dnet.send(template.render())
             timer = timer + 1
             time.sleep(1)
         self.parent.log("RIP: Thread terminated")
@@ -199,6 +210,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "rip"
         self.group = "ROUTING"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_rip.glade"
         self.host_treestore = gtk.TreeStore(str)
         self.route_liststore = gtk.ListStore(str, str, str, str)
@@ -285,7 +297,10 @@ class mod_class(object):
         self.mac = dnet.eth.get()
 
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [RIP_PORT])
+
+    def get_bpf_filter(self):
+        return "udp port %d" % RIP_PORT
 
     def check_udp(self, udp):
         if udp.dport == RIP_PORT:
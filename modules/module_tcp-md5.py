@@ -29,57 +29,43 @@
 #       (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 #       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import os
-import tempfile
-import threading
-
 import dpkt
 import dnet
 
+import loki
+
 gobject = None
 gtk = None
 urwid = None
 
-class bgp_md5bf(threading.Thread):
-    def __init__(self, parent, iter, bf, full, wl, digest, data):
+class bgp_md5bf(loki.crack_job):
+    #cracks the connections in iters in one run, targets are their (digest, data)
+    def __init__(self, parent, iters, bf, full, wl, targets, threads, mask="", rules=""):
         self.parent = parent
-        self.iter = iter
-        self.bf = bf
-        self.full = full
-        self.wl = wl
-        self.digest = digest
-        self.data = data
-        self.running = True
-        threading.Thread.__init__(self)
-
-    def run(self):
-        if self.bf and not self.wl:
-            self.wl = ""
-        (handle, self.tmpfile) = tempfile.mkstemp(prefix="tcp-md5-", suffix="-lock")
-        os.close(handle)
-        if self.parent.platform == "Windows":
-            import tcpmd5bf
-            tcpmd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        else:
-            import loki_bindings
-            pw = loki_bindings.tcpmd5.tcpmd5bf.bf(self.bf, self.full, self.wl, self.digest, self.data, self.tmpfile)
-        if self.running:
-            if self.parent.ui == 'gtk':
-                src = self.parent.liststore.get_value(self.iter, self.parent.SOURCE_ROW)
-                dst = self.parent.liststore.get_value(self.iter, self.parent.DESTINATION_ROW)
-                if pw:
-                    self.parent.liststore.set_value(self.iter, self.parent.SECRET_ROW, pw)
-                    self.parent.log("TCP-MD5: Found password '%s' for connection %s->%s" % (pw, src, dst))
-                else:
-                    self.paren.liststore.set_value(self.iter, self.parent.SECRET_ROW, "NOT FOUND")
+        self.iters = iters
+        loki.crack_job.__init__(self, "tcp-md5", None, None, bf, full, wl, threads, name="TCP-MD5", mask=mask, rules=rules, targets=targets)
+
+    def hit(self, index):
+        if self.parent.ui == 'gtk':
+            iter = self.iters[index]
+            src = self.parent.liststore.get_value(iter, self.parent.SOURCE_ROW)
+            dst = self.parent.liststore.get_value(iter, self.parent.DESTINATION_ROW)
+            self.parent.liststore.set_value(iter, self.parent.SECRET_ROW, self.pws[index])
+            self.parent.log("TCP-MD5: Found password '%s' for connection %s->%s" % (self.pws[index], src, dst))
+
+    def done(self):
+        if self.state == loki.CRACK_CANCELLED:
+            return
+        took = self.runtime()
+        if took > 0:
+            self.parent.log("TCP-MD5: Tried %d keys in %.1fs on %d threads (%.0f hashes/s)" % (self.tried - self.tried_before, took, self.threads, (self.tried - self.tried_before) / took))
+        if self.parent.ui == 'gtk':
+            for (iter, pw) in zip(self.iters, self.pws):
+                if pw is None:
+                    src = self.parent.liststore.get_value(iter, self.parent.SOURCE_ROW)
+                    dst = self.parent.liststore.get_value(iter, self.parent.DESTINATION_ROW)
+                    self.parent.liststore.set_value(iter, self.parent.SECRET_ROW, "NOT FOUND")
                     self.parent.log("TCP-MD5: No password found for connection %s->%s" % (src, dst))
-            if os.path.exists(self.tmpfile):
-                os.remove(self.tmpfile)
-
-    def quit(self):
-        self.running = False
-        if os.path.exists(self.tmpfile):
-            os.remove(self.tmpfile)
 
 class mod_class(object):
     SOURCE_ROW = 0
@@ -107,6 +93,8 @@ class mod_class(object):
             global urwid
             urwid = urwid_
         self.opts = None
+        self.cracker = None
+        self.potfile = None
 
     def start_mod(self):
         self.opts = {}
@@ -114,10 +102,10 @@ class mod_class(object):
     def shut_mod(self):
         if self.opts:
             for i in self.opts:
-                (iter, data, digest, thread) = self.opts[i]
-                if thread:
-                    if thread.is_alive():
-                        thread.quit()
+                (iter, data, digest, job) = self.opts[i]
+                if job:
+                    if job.is_alive():
+                        job.cancel()
         if self.ui == 'gtk':
             self.liststore.clear()
         
@@ -157,9 +145,29 @@ class mod_class(object):
     def set_log(self, log):
         self.__log = log
 
+    def set_cracker(self, cracker):
+        self.cracker = cracker
+
+    def set_potfile(self, potfile):
+        self.potfile = potfile
+
+    def check_known(self, iter, ident, digest, data):
+        #looks the connection up in the secrets known so far, returns the pw
+        if not self.potfile:
+            return None
+        pw = self.potfile.verify("tcp-md5", None, digest, data)
+        if pw is not None:
+            if self.ui == 'gtk':
+                self.liststore.set_value(iter, self.SECRET_ROW, pw)
+            self.log("TCP-MD5: Known password '%s' for connection %s" % (pw, ident))
+        return pw
+
     def get_tcp_checks(self):
         return (self.check_tcp, self.input_tcp)
 
+    def get_bpf_filter(self):
+        return "(tcp[12] & 0xf0 > 0x50) or (ip6 and tcp)"
+
     def check_tcp(self, tcp):
         if tcp.opts != '':
             return (True, False)
@@ -178,22 +186,37 @@ class mod_class(object):
                         iter = self.liststore.append(["%s:%i" % (src, tcp.sport), "%s:%i" % (dst, tcp.dport), "CAPTURED"])
                     self.opts[ident] = (iter, str(eth.data), data, None)
                     self.log("TCP-MD5: Got MD5 data for connection %s" % (ident))
+                    self.check_known(iter, ident, data, str(eth.data))
 
     # SIGNALS #
 
     def on_crack_button_clicked(self, btn):
+        #all selected connections get cracked in one run, the sessions of
+        #a bgp mesh often share one key
         select = self.treeview.get_selection()
         (model, paths) = select.get_selected_rows()
+        idents = []
+        iters = []
+        targets = []
         for i in paths:
             iter = model.get_iter(i)
             src = model.get_value(iter, self.SOURCE_ROW)
             dst = model.get_value(iter, self.DESTINATION_ROW)
             ident = "%s->%s" % (src, dst)
-            (iter, data, digest, thread) = self.opts[ident]
-            if thread:
-                return
-            thread = bgp_md5bf(self, iter, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, digest, data)
+            (iter, data, digest, job) = self.opts[ident]
+            if job:
+                continue
+            #no need to crack what is known already
+            if self.check_known(iter, ident, digest, data) is not None:
+                continue
+            idents.append(ident)
+            iters.append(iter)
+            targets.append((digest, data))
+        if not targets:
+            return
+        job = bgp_md5bf(self, iters, self.parent.bruteforce, self.parent.bruteforce_full, self.parent.wordlist, targets, self.parent.bruteforce_threads, self.parent.bruteforce_mask, self.parent.wordlist_rules)
+        for (ident, iter, (digest, data)) in zip(idents, iters, targets):
             model.set_value(iter, self.SECRET_ROW, "RUNNING")
-            thread.start()
-            self.opts[ident] = (iter, data, digest, thread)
+            self.opts[ident] = (iter, data, digest, job)
+        self.cracker.submit(job)
             
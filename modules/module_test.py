@@ -84,6 +84,36 @@ class mod_class(object):
     #def get_tcp_checks(self):
         #return (self.some_tcp_check_func, self.the_input_func)
 
+    #a third element lists the keys the check is interested in (ethertypes
+    #or dst macs for eth, protocol numbers for ip/ip6, ports for tcp/udp/sctp),
+    #the check is then only called for matching packets
+    #def get_udp_checks(self):
+        #return (self.some_udp_check_func, self.the_input_func, [1985])
+
+    #with per module worker queues enabled, the input funcs run in their own
+    #thread. the queue size and the policy when it is full (drop-oldest,
+    #drop-newest or block) can be overridden by the module
+    #self.queue_size = 100
+    #self.queue_policy = "block"
+
+    #frames sent through the dnet given to set_dnet() are queued in the
+    #transmit class of the module, control (keepalives and hellos),
+    #interactive (default) or bulk (floods and scans)
+    #self.tx_class = "control"
+
+    #password cracking goes through the shared crack_manager, submit a
+    #loki.crack_job and get called back with the result instead of
+    #starting an own cracker thread
+    #def set_cracker(self, cracker):
+        #self.cracker = cracker
+        #self.cracker.submit(loki.crack_job("ospf-md5", digest, data, wl=wordlist, done=self.cracked))
+
+    #secrets recovered before, also from earlier runs, check captured
+    #digests against them before cracking
+    #def set_potfile(self, potfile):
+        #self.potfile = potfile
+        #pw = self.potfile.verify("ospf-md5", keyid, digest, data)
+
     #~ def get_config_dict(self):
         #~ return {    "foo" : {   "value" : self.foo,
                                 #~ "type" : "int",
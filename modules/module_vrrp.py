@@ -36,6 +36,8 @@ import time
 import dnet
 import dpkt
 
+import loki
+
 import gobject
 import gtk
 import gtk.glade
@@ -129,6 +131,25 @@ class vrrp_thread(threading.Thread):
         threading.Thread.__init__(self)
         self.parent = parent
         self.running = True
+        self.templates = loki.template_cache()
+
+    def advert(self, pkg):
+        src_mac = dnet.eth_aton("00:00:5e:00:01:%02x" % (pkg.id))
+        vrrp = vrrp_packet(pkg.id, 255, pkg.auth_type, pkg.auth_data, 1, pkg.ips)
+        data = vrrp.render()
+        ip_hdr = dpkt.ip.IP(    ttl=255,
+                                p=dpkt.ip.IP_PROTO_VRRP,
+                                src=self.parent.ip,
+                                dst=dnet.ip_aton(VRRP_MULTICAST_ADDRESS),
+                                data=data
+                                )
+        ip_hdr.len += len(ip_hdr.data)
+        eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(VRRP_MULTICAST_MAC),
+                                            src=src_mac,
+                                            type=dpkt.ethernet.ETH_TYPE_IP,
+                                            data=str(ip_hdr)
+                                            )
+        return str(eth_hdr)
 
     def run(self):
         self.parent.log("VRRP: Thread started")
@@ -136,22 +157,8 @@ class vrrp_thread(threading.Thread):
             for i in self.parent.peers:
                 (iter, pkg, state, arp) = self.parent.peers[i]
                 if state:
-                    src_mac = dnet.eth_aton("00:00:5e:00:01:%02x" % (pkg.id))
-                    vrrp = vrrp_packet(pkg.id, 255, pkg.auth_type, pkg.auth_data, 1, pkg.ips)
-                    data = vrrp.render()
-                    ip_hdr = dpkt.ip.IP(    ttl=255,
-                                            p=dpkt.ip.IP_PROTO_VRRP,
-                                            src=self.parent.ip,
-                                            dst=dnet.ip_aton(VRRP_MULTICAST_ADDRESS),
-                                            data=data
-                                            )
-                    ip_hdr.len += len(ip_hdr.data)
-                    eth_hdr = dpkt.ethernet.Ethernet(   dst=dnet.eth_aton(VRRP_MULTICAST_MAC),
-                                                        src=src_mac,
-                                                        type=dpkt.ethernet.ETH_TYPE_IP,
-                                                        data=str(ip_hdr)
-                                                        )
-                    self.parent.dnet.send(str(eth_hdr))
+                    template = self.templates.get(i, (pkg, self.parent.ip), lambda: self.advert(pkg))
+                    self.parent.dnet.send(template.render())
                     if arp:
                         brdc_mac = dnet.eth_aton("ff:ff:ff:ff:ff:ff")
                         stp_uplf_mac = dnet.eth_aton("01:00:0c:cd:cd:cd")
@@ -205,6 +212,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "vrrp"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_vrrp.glade"
         self.liststore = gtk.ListStore(str, str, int, int, str)
         self.thread = None
@@ -279,7 +287,10 @@ class mod_class(object):
         self.mac = dnet.eth.get()
 
     def get_ip_checks(self):
-        return (self.check_ip, self.input_ip)
+        return (self.check_ip, self.input_ip, [dpkt.ip.IP_PROTO_VRRP])
+
+    def get_bpf_filter(self):
+        return "ip proto %d" % dpkt.ip.IP_PROTO_VRRP
 
     def check_ip(self, ip):
         if ip.p == dpkt.ip.IP_PROTO_VRRP:
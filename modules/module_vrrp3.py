@@ -208,6 +208,7 @@ class mod_class(object):
         self.platform = platform
         self.name = "vrrp-v3"
         self.group = "HOT-STANDBY"
+        self.tx_class = "control"
         self.gladefile = "/modules/module_vrrp3.glade"
         self.liststore = gtk.ListStore(str, str, int, int, str)
         self.thread = None
@@ -285,7 +286,10 @@ class mod_class(object):
         #~ return (self.check_eth, self.input_eth)
 
     def get_ip_checks(self):
-        return (self.check_ip, self.input_ip)
+        return (self.check_ip, self.input_ip, [dpkt.ip.IP_PROTO_VRRP])
+
+    def get_bpf_filter(self):
+        return "ip proto %d" % dpkt.ip.IP_PROTO_VRRP
 
     #~ def check_eth(self, eth):
         #~ if dnet.eth_ntoa(eth.dst).startswith("00:00:5e:00:01:"):
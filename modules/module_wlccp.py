@@ -45,7 +45,7 @@ import gtk.glade
 import dnet
 import dpkt
 
-import loki_bindings
+import loki
 
 DEBUG = False
 
@@ -203,6 +203,7 @@ class mod_class(object):
         self.comms_treestore = gtk.TreeStore(str, str, str, str)
         self.dnet = None
         self.election_thread = None
+        self.cracker = None
 
     def start_mod(self):
         self.hosts = {}
@@ -303,13 +304,16 @@ class mod_class(object):
         self.__log = log
 
     def get_eth_checks(self):
-        return (self.check_eth, self.input_eth)
+        return (self.check_eth, self.input_eth, [0x872d])
 
     def set_ip(self, ip, mask):
         self.ip = ip
         self.mask = mask
         self.ip_entry.set_text(self.ip)
 
+    def set_cracker(self, cracker):
+        self.cracker = cracker
+
     def set_dnet(self, dnet_thread):
         self.dnet = dnet_thread
         self.mac = dnet.eth_ntoa(dnet_thread.eth.get())
@@ -345,7 +349,10 @@ class mod_class(object):
                     self.hosts_liststore.set(iter, self.HOSTS_TYPE_ROW, type, self.HOSTS_PRIO_ROW, prio)
 
     def get_udp_checks(self):
-        return (self.check_udp, self.input_udp)
+        return (self.check_udp, self.input_udp, [2887])
+
+    def get_bpf_filter(self):
+        return "ether proto 0x872d or udp port 2887"
 
     def check_udp(self, udp):
         if udp.sport == 2887 and udp.dport == 2887:
@@ -652,29 +659,37 @@ class mod_class(object):
                 wl = self.wordlist_filechooserbutton.get_filename()
                 if not wl:
                     return
-                pw = loki_bindings.asleap.asleap.attack_leap(wl, chall, leap_auth_resp, id, user)
-                if pw != "":
-                    self.log("WLCCP: Found LEAP-Password %s for connection %s" % (pw, connection.replace('\n       <=>\n', ' <=> ')))
-                    for j in xrange(self.comms_treestore.iter_n_children(iter)):
-                        child = self.comms_treestore.iter_nth_child(iter, j)
-                        if self.comms_treestore.get(child, self.COMMS_HOST_ROW) == ("Password",):
-                           self.comms_treestore.set(child, self.COMMS_TYPE_ROW, pw)
-                           break
-                    self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
-                    if model.get_value(iter, self.COMMS_TYPE_ROW) != self.node_types[0x40]:
-                        nsk = self.gen_nsk(host)
-                        self.comms_treestore.append(iter, [ "NSK", nsk.encode("hex"), "", "" ])
-                        self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
-                        ctk = self.gen_ctk(host)
-                        self.comms_treestore.append(iter, [ "CTK", ctk.encode("hex"), "", "" ])
-                        self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
-
-                    for client in self.clients:
-                        (iter, c_host, ssid, key_mgmt, ap, crypt, msc, pmk) = self.clients[client]
-                        if c_host == host:
-                            self.get_pmk(client)
-                else:
-                    self.log("WLCCP: Password for %s not found." % connection.replace('\n       <=>\n', ' <=> '))
+                job = loki.crack_job("leap", leap_auth_resp, (chall, id, user), bf=False, wl=wl, name="WLCCP",
+                                     done=lambda job, host=host, connection=connection: self.leap_done(job, host, connection))
+                self.cracker.submit(job)
+
+    def leap_done(self, job, host, connection):
+        if job.state == loki.CRACK_CANCELLED:
+            return
+        pw = job.pw
+        (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), leap_pw, nsk, nonces, ctk) = self.comms[host]
+        if pw:
+            self.log("WLCCP: Found LEAP-Password %s for connection %s" % (pw, connection.replace('\n       <=>\n', ' <=> ')))
+            for j in xrange(self.comms_treestore.iter_n_children(iter)):
+                child = self.comms_treestore.iter_nth_child(iter, j)
+                if self.comms_treestore.get(child, self.COMMS_HOST_ROW) == ("Password",):
+                   self.comms_treestore.set(child, self.COMMS_TYPE_ROW, pw)
+                   break
+            self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
+            if self.comms_treestore.get_value(iter, self.COMMS_TYPE_ROW) != self.node_types[0x40]:
+                nsk = self.gen_nsk(host)
+                self.comms_treestore.append(iter, [ "NSK", nsk.encode("hex"), "", "" ])
+                self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
+                ctk = self.gen_ctk(host)
+                self.comms_treestore.append(iter, [ "CTK", ctk.encode("hex"), "", "" ])
+                self.comms[host] = (iter, (leap_auth_chall, leap_auth_resp, leap_supp_chall, leap_supp_resp), pw, nsk, nonces, ctk)
+
+            for client in self.clients:
+                (iter, c_host, ssid, key_mgmt, ap, crypt, msc, pmk) = self.clients[client]
+                if c_host == host:
+                    self.get_pmk(client)
+        else:
+            self.log("WLCCP: Password for %s not found." % connection.replace('\n       <=>\n', ' <=> '))
 
     def on_get_master_togglebutton_toggled(self, btn):
         if btn.get_active():
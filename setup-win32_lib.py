@@ -3,17 +3,17 @@
 
 from distutils.core import setup, Extension
 
-ospfmd5bf_srcs = [ 'loki_bindings/ospfmd5/ospfmd5bf.c', 'lib/md5.c' ]
+ospfmd5bf_srcs = [ 'loki_bindings/ospfmd5/ospfmd5bf.c', 'lib/md5.c', 'lib/md5_mb.c', 'lib/bf.c' ]
 ospfmd5bf_incdirs = [ '.' ]
 ospfmd5bf_libdirs = []
-ospfmd5bf_libs = []
+ospfmd5bf_libs = ['pthreadVC2']
 ospfmd5bf_extargs = []
 ospfmd5bf_extobj = []
 
-tcpmd5bf_srcs = [ 'loki_bindings/tcpmd5/tcpmd5bf.c', 'lib/md5.c' ]
+tcpmd5bf_srcs = [ 'loki_bindings/tcpmd5/tcpmd5bf.c', 'lib/md5.c', 'lib/md5_mb.c', 'lib/bf.c' ]
 tcpmd5bf_incdirs = [ '.' ]
 tcpmd5bf_libdirs = []
-tcpmd5bf_libs = ['ws2_32']
+tcpmd5bf_libs = ['ws2_32', 'pthreadVC2']
 tcpmd5bf_extargs = []
 tcpmd5bf_extobj = []
 
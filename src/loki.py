@@ -32,11 +32,20 @@
 #       OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import base64
+import bisect
+import collections
 import copy
+import errno
 import hashlib
+import heapq
+import hmac
+import mmap
+import multiprocessing
 import sys
 import os
 import platform
+import select
+import socket
 import threading
 import time
 import traceback
@@ -56,27 +65,726 @@ VERSION = "0.3.0"
 PLATFORM = platform.system()
 
 MODULE_PATH="/modules"
+REPLAY_MAX_SPEED="max-speed"
+REPLAY_TIMESTAMP="timestamp"
+REPLAY_MODES=[REPLAY_MAX_SPEED, REPLAY_TIMESTAMP]
+QUEUE_DROP_OLDEST="drop-oldest"
+QUEUE_DROP_NEWEST="drop-newest"
+QUEUE_BLOCK="block"
+QUEUE_POLICIES=[QUEUE_DROP_OLDEST, QUEUE_DROP_NEWEST, QUEUE_BLOCK]
+TX_CONTROL="control"
+TX_INTERACTIVE="interactive"
+TX_BULK="bulk"
+TX_CLASSES=[TX_CONTROL, TX_INTERACTIVE, TX_BULK]
+TX_WEIGHTS={TX_CONTROL : 16, TX_INTERACTIVE : 4, TX_BULK : 1}
+TX_STRICT="strict"
+TX_WEIGHTED="weighted"
+TX_SCHEDULINGS=[TX_STRICT, TX_WEIGHTED]
+CRACK_QUEUED="queued"
+CRACK_RUNNING="running"
+CRACK_FOUND="found"
+CRACK_NOT_FOUND="not found"
+CRACK_CANCELLED="cancelled"
+CRACK_FAILED="failed"
+CRACK_SUSPENDED="suspended"
+#bf_status of lib/bf.h, (cancel, found, tried, position, total, current,
+#resume, seq, saved, offset, next)
+CRACK_STATUS=struct.Struct("iiQdd32siIdq32s")
+#bf_status_hit of lib/bf.h, one per target after the status, (found, pw)
+CRACK_HIT=struct.Struct("i124s")
+CHECK_HOOKS=["get_eth_checks", "get_ip_checks", "get_ip6_checks", "get_tcp_checks", "get_udp_checks", "get_sctp_checks"]
 CONFIG_PATH=os.path.expanduser("~/.loki")
 DATA_DIR="."
 #~ For OSX Bundeling
 #~ DATA_DIR=os.path.expandvars("$bundle_data/loki")
 
+class dispatch_table(object):
+    #checks of one layer, indexed by the keys a module declares
+    #(ethertype / dst mac, ip proto, tcp/udp/sctp port). checks without
+    #keys are generic and see every packet. lookup() keeps registration
+    #order, so the stop flag of a check still works.
+
+    def __init__(self):
+        self.entries = []
+        self.keys = {}
+        self.order = {}
+        self.seq = 0
+        self.generic = ()
+        self.table = {}
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, name, check, call, keys=None):
+        entry = (check, call, name)
+        self.order[entry] = self.seq
+        self.seq += 1
+        self.entries.append(entry)
+        self.keys[entry] = keys
+        self.rebuild()
+
+    def remove(self, name):
+        for entry in self.entries[:]:
+            (check, call, n) = entry
+            if n == name:
+                self.entries.remove(entry)
+                del self.keys[entry]
+                del self.order[entry]
+        self.rebuild()
+
+    def rebuild(self):
+        #build new objects and swap them in, lookup() runs in the pcap thread
+        generic = []
+        keyed = {}
+        for entry in self.entries:
+            keys = self.keys[entry]
+            if keys is None:
+                generic.append(entry)
+            else:
+                for k in keys:
+                    keyed.setdefault(k, set()).add(entry)
+        table = {}
+        for k in keyed:
+            table[k] = tuple(sorted(keyed[k].union(generic), key=self.order.get))
+        self.table = table
+        self.generic = tuple(generic)
+
+    def lookup(self, *keys):
+        table = self.table
+        found = None
+        for k in keys:
+            l = table.get(k)
+            if l is None or l is found:
+                continue
+            if found is None:
+                found = l
+            else:
+                order = self.order
+                found = tuple(sorted(set(found) | set(l), key=order.get))
+        if found is None:
+            return self.generic
+        return found
+
+class packet_view(object):
+    #lazy view on a layer shared by all handlers of a packet. the layer is
+    #decoded on first access, the first write gives the handler its own
+    #(shallow) copy. _decode is None once the view owns its object
+    __slots__ = ("_obj", "_decode")
+
+    def __init__(self, decode):
+        object.__setattr__(self, "_obj", None)
+        object.__setattr__(self, "_decode", decode)
+
+    def _get(self):
+        obj = self._obj
+        if obj is None:
+            obj = self._decode()
+            object.__setattr__(self, "_obj", obj)
+        return obj
+
+    def __getattr__(self, name):
+        obj = self._obj
+        if obj is None:
+            obj = self._get()
+        return getattr(obj, name)
+
+    def __setattr__(self, name, value):
+        if self._decode is not None:
+            object.__setattr__(self, "_obj", copy.copy(self._get()))
+            object.__setattr__(self, "_decode", None)
+        setattr(self._obj, name, value)
+
+    def __str__(self):
+        return str(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __repr__(self):
+        return repr(self._get())
+
+    @property
+    def __class__(self):
+        return self._get().__class__
+
+class packet(object):
+    #a captured frame. dispatch keys are read from the raw bytes, a layer
+    #is only decoded when a check or handler touches it and then shared
+    #between all of them
+    def __init__(self, data):
+        self.data = data
+        (self.type, ) = struct.unpack("!H", data[12:14])
+        self.dst = data[:6]
+        #ethertype and offset of the (decapsulated) network layer
+        self.inner_type = self.type
+        self.l3 = 14
+        self.tag = None
+        self.labels = None
+        self.eth = None
+        self.eth_inner = None
+        self.ip = None
+        self.ip6 = None
+        self.l4 = None
+
+    def decap(self):
+        #skip all dot1q tags and the mpls label stack, returns True if there was any
+        type = self.type
+        if type != dpkt.ethernet.ETH_TYPE_8021Q and type != dpkt.ethernet.ETH_TYPE_MPLS:
+            return False
+        data = self.data
+        off = 14
+        while type == dpkt.ethernet.ETH_TYPE_8021Q:
+            (tci, type) = struct.unpack_from("!HH", data, off)
+            if self.tag is None:
+                self.tag = tci
+            off += 4
+        if type == dpkt.ethernet.ETH_TYPE_MPLS:
+            self.labels = []
+            for i in xrange(24):
+                (entry, ) = struct.unpack_from("!I", data, off)
+                off += 4
+                self.labels.append(((entry & dpkt.ethernet.MPLS_LABEL_MASK) >> dpkt.ethernet.MPLS_LABEL_SHIFT,
+                                    (entry & dpkt.ethernet.MPLS_QOS_MASK) >> dpkt.ethernet.MPLS_QOS_SHIFT,
+                                    (entry & dpkt.ethernet.MPLS_TTL_MASK) >> dpkt.ethernet.MPLS_TTL_SHIFT))
+                if entry & dpkt.ethernet.MPLS_STACK_BOTTOM:
+                    break
+            type = dpkt.ethernet.ETH_TYPE_IP
+        self.inner_type = type
+        self.l3 = off
+        return True
+
+    def decap_pppoe(self):
+        #skip the pppoe and ppp headers, returns False for non ip payload
+        data = self.data
+        off = self.l3 + 6
+        (p, ) = struct.unpack_from("!B", data, off)
+        if p & dpkt.ppp.PFC_BIT:
+            off += 1
+        else:
+            (p, ) = struct.unpack_from("!H", data, off)
+            off += 2
+        if p == dpkt.ppp.PPP_IP:
+            self.inner_type = dpkt.ethernet.ETH_TYPE_IP
+        elif p == dpkt.ppp.PPP_IP6:
+            self.inner_type = dpkt.ethernet.ETH_TYPE_IP6
+        else:
+            return False
+        self.l3 = off
+        self.eth_inner = None
+        return True
+
+    def ip_proto(self):
+        (p, ) = struct.unpack_from("!B", self.data, self.l3 + 9)
+        return p
+
+    def ip6_nxt(self):
+        (nxt, ) = struct.unpack_from("!B", self.data, self.l3 + 6)
+        return nxt
+
+    def l4_bounds(self):
+        #offset and end of the transport layer, bounded like dpkt does
+        data = self.data
+        l3 = self.l3
+        if self.inner_type == dpkt.ethernet.ETH_TYPE_IP:
+            (v_hl, length) = struct.unpack_from("!BxH", data, l3)
+            if v_hl & 0xf < 5:
+                #let dpkt complain about it
+                self.decode_ip()
+            off = l3 + ((v_hl & 0xf) << 2)
+            end = l3 + length
+        else:
+            (length, ) = struct.unpack_from("!H", data, l3 + 4)
+            off = l3 + 40
+            end = off + length
+        if not length:
+            end = len(data)
+        return (off, end)
+
+    def ports(self):
+        (off, end) = self.l4_bounds()
+        if end - off < 4:
+            raise dpkt.NeedData
+        return struct.unpack_from("!HH", self.data, off)
+
+    def decode_eth(self):
+        if self.eth is None:
+            data = self.data
+            #build dpkt.eth on myself, as dpkt parsing method strips dot1q, mpls, etc...
+            self.eth = dpkt.ethernet.Ethernet(dst=self.dst, src=data[6:12], type=self.type, data=data[14:])
+        return self.eth
+
+    def decode_eth_inner(self):
+        if self.eth_inner is None:
+            if self.l3 == 14:
+                self.eth_inner = self.decode_eth()
+            else:
+                data = self.data
+                self.eth_inner = dpkt.ethernet.Ethernet(dst=self.dst, src=data[6:12], type=self.inner_type, data=data[self.l3:])
+                if self.tag is not None:
+                    self.eth_inner.tag = self.tag
+                if self.labels is not None:
+                    self.eth_inner.labels = self.labels
+        return self.eth_inner
+
+    def decode_ip(self):
+        if self.ip is None:
+            self.ip = dpkt.ip.IP(self.data[self.l3:])
+        return self.ip
+
+    def decode_ip6(self):
+        if self.ip6 is None:
+            self.ip6 = dpkt.ip6.IP6(self.data[self.l3:])
+        return self.ip6
+
+    def decode_l4(self, cls):
+        if self.l4 is None:
+            net = self.ip or self.ip6
+            if net is not None and isinstance(net.data, cls):
+                self.l4 = net.data
+            else:
+                (off, end) = self.l4_bounds()
+                self.l4 = cls(self.data[off:end])
+        return self.l4
+
+    def decode_tcp(self):
+        return self.decode_l4(dpkt.tcp.TCP)
+
+    def decode_udp(self):
+        return self.decode_l4(dpkt.udp.UDP)
+
+    def decode_sctp(self):
+        return self.decode_l4(dpkt.sctp.SCTP)
+
+#linux/if_packet.h
+SOL_PACKET = 263
+PACKET_ADD_MEMBERSHIP = 1
+PACKET_MR_PROMISC = 1
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_VLAN_VALID = 1 << 4
+TP_STATUS_VLAN_TPID_VALID = 1 << 6
+ETH_P_ALL = 0x0003
+SIOCGIFINDEX = 0x8933
+SO_ATTACH_FILTER = 26
+SO_DETACH_FILTER = 27
+
+class tpacket_ring(object):
+    #AF_PACKET TPACKET_V3 capture ring, linux only. the kernel fills whole
+    #blocks of frames, dispatch() walks all ready blocks and hands them back
+    #afterwards. provides the subset of pcapObject pcap_thread uses
+    def __init__(self, interface, block_size=1 << 20, block_count=64, timeout=100):
+        import fcntl
+        self.interface = interface
+        self.block_size = block_size
+        self.block_count = block_count
+        self.block = 0
+        self.packets = 0
+        self.drops = 0
+        self.freezes = 0
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+        frame_size = 2048
+        req = struct.pack("IIIIIII", block_size, block_count, frame_size, block_size * block_count / frame_size, timeout, 0, 0)
+        self.sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+        self.ring = mmap.mmap(self.sock.fileno(), block_size * block_count, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.sock.bind((interface, ETH_P_ALL))
+        (name, index) = struct.unpack("16si", fcntl.ioctl(self.sock.fileno(), SIOCGIFINDEX, struct.pack("16si", interface, 0)))
+        self.sock.setsockopt(SOL_PACKET, PACKET_ADD_MEMBERSHIP, struct.pack("iHH8s", index, PACKET_MR_PROMISC, 0, ""))
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def dispatch(self, cnt, callback):
+        #handles ready blocks until at least cnt packets were seen (all
+        #ready blocks for cnt <= 0), returns the number of packets
+        ring = self.ring
+        done = 0
+        while cnt <= 0 or done < cnt:
+            off = self.block * self.block_size
+            (status, num, first) = struct.unpack_from("III", ring, off + 8)
+            if not status & TP_STATUS_USER:
+                break
+            try:
+                pos = off + first
+                for i in xrange(num):
+                    (next_offset, sec, nsec, snaplen, pktlen, pktstatus, mac, net, rxhash, tci, tpid) = struct.unpack_from("IIIIIIHHIIH", ring, pos)
+                    data = ring[pos + mac:pos + mac + snaplen]
+                    if pktstatus & TP_STATUS_VLAN_VALID:
+                        #the kernel strips the tag, put it back for the modules
+                        if not pktstatus & TP_STATUS_VLAN_TPID_VALID:
+                            tpid = dpkt.ethernet.ETH_TYPE_8021Q
+                        data = data[:12] + struct.pack("!HH", tpid, tci) + data[12:]
+                        pktlen += 4
+                    done += 1
+                    callback(pktlen, data, sec + nsec / 1000000000.0)
+                    pos += next_offset
+            finally:
+                struct.pack_into("I", ring, off + 8, TP_STATUS_KERNEL)
+                self.block = (self.block + 1) % self.block_count
+        return done
+
+    def setfilter(self, filter, optimize, netmask):
+        #the kernel wants compiled bpf, borrow pcap_compile() from libpcap
+        if not filter:
+            try:
+                self.sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
+            except socket.error:
+                pass
+            return
+        import ctypes
+        import ctypes.util
+
+        class bpf_insn(ctypes.Structure):
+            _fields_ = [("code", ctypes.c_ushort), ("jt", ctypes.c_ubyte), ("jf", ctypes.c_ubyte), ("k", ctypes.c_uint)]
+
+        class bpf_program(ctypes.Structure):
+            _fields_ = [("bf_len", ctypes.c_uint), ("bf_insns", ctypes.POINTER(bpf_insn))]
+
+        lib = ctypes.util.find_library("pcap")
+        if not lib:
+            raise Exception("libpcap not found")
+        libpcap = ctypes.CDLL(lib)
+        libpcap.pcap_open_dead.restype = ctypes.c_void_p
+        libpcap.pcap_geterr.restype = ctypes.c_char_p
+        handle = ctypes.c_void_p(libpcap.pcap_open_dead(1, 65535))
+        prog = bpf_program()
+        try:
+            if libpcap.pcap_compile(handle, ctypes.byref(prog), filter, optimize, ctypes.c_uint(netmask)) < 0:
+                raise Exception(libpcap.pcap_geterr(handle))
+            fprog = struct.pack("HL", prog.bf_len, ctypes.addressof(prog.bf_insns.contents))
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+            libpcap.pcap_freecode(ctypes.byref(prog))
+        finally:
+            libpcap.pcap_close(handle)
+
+    def stats(self):
+        #returns (received, dropped, frozen, ring fill in percent). the kernel
+        #resets its counters on every read, so they are summed up here
+        (packets, drops, freezes) = struct.unpack("III", self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, 12))
+        self.packets += packets
+        self.drops += drops
+        self.freezes += freezes
+        used = 0
+        for i in xrange(self.block_count):
+            (status, ) = struct.unpack_from("I", self.ring, i * self.block_size + 8)
+            if status & TP_STATUS_USER:
+                used += 1
+        return (self.packets, self.drops, self.freezes, used * 100 / self.block_count)
+
+    def close(self):
+        self.ring.close()
+        self.sock.close()
+
+class tpacket_tx_ring(object):
+    #AF_PACKET TPACKET_V2 transmit ring, linux only. put() copies frames
+    #into free slots, flush() hands all of them to the kernel with a single
+    #send() call. frames which don't fit a slot are sent directly on a
+    #second socket, as send() on a ring socket only kicks off the ring
+    FRAME_SIZE = 2048
+    #TPACKET2_HDRLEN - sizeof(struct sockaddr_ll)
+    DATA_OFFSET = 32
+
+    def __init__(self, interface, frame_count=1024):
+        self.interface = interface
+        frames_per_block = mmap.PAGESIZE * 4 / self.FRAME_SIZE
+        self.frame_count = max(1, frame_count / frames_per_block) * frames_per_block
+        self.frame = 0
+        self.pending = 0
+        self.direct = None
+        self.header = struct.Struct("III")
+        self.sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        self.sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+        req = struct.pack("IIII", self.FRAME_SIZE * frames_per_block, self.frame_count / frames_per_block, self.FRAME_SIZE, self.frame_count)
+        self.sock.setsockopt(SOL_PACKET, PACKET_TX_RING, req)
+        self.ring = mmap.mmap(self.sock.fileno(), self.FRAME_SIZE * self.frame_count, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.sock.bind((interface, 0))
+
+    def put(self, data):
+        #queues one frame, flushes on its own if the ring is full
+        self.put_many((data, ))
+
+    def put_many(self, frames):
+        #flush() only returns once the kernel is done with every requested
+        #slot, so the next pending slots are always free
+        ring = self.ring
+        header = self.header.pack_into
+        frame_size = self.FRAME_SIZE
+        data_offset = self.DATA_OFFSET
+        for data in frames:
+            length = len(data)
+            if length > frame_size - data_offset:
+                self.flush()
+                if not self.direct:
+                    self.direct = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+                    self.direct.bind((self.interface, 0))
+                self.direct.send(data)
+                continue
+            if self.pending == self.frame_count:
+                self.flush()
+            off = self.frame * frame_size + data_offset
+            ring[off:off + length] = data
+            header(ring, off - data_offset, TP_STATUS_SEND_REQUEST, length, length)
+            self.frame += 1
+            if self.frame == self.frame_count:
+                self.frame = 0
+            self.pending += 1
+
+    def flush(self):
+        #blocks until the kernel sent all requested frames
+        if self.pending:
+            self.pending = 0
+            self.sock.send("")
+
+    def close(self):
+        self.flush()
+        self.ring.close()
+        self.sock.close()
+        if self.direct:
+            self.direct.close()
+
+class dispatch_stats(object):
+    #invocations, matches and a latency histogram per (module, hook, layer),
+    #hook is "check" or "input". every entry is only written by the thread
+    #running that hook, so there is no locking
+    BUCKETS = [0.00001, 0.0001, 0.001, 0.01, 0.1]
+    BUCKET_NAMES = ["<10us", "<100us", "<1ms", "<10ms", "<100ms", ">=100ms"]
+
+    def __init__(self):
+        self.entries = {}
+
+    def add(self, name, hook, layer, matched, took):
+        key = (name, hook, layer)
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries.setdefault(key, [0, 0, 0.0, 0.0, [0] * len(self.BUCKET_NAMES)])
+        entry[0] += 1
+        if matched:
+            entry[1] += 1
+        entry[2] += took
+        if took > entry[3]:
+            entry[3] = took
+        entry[4][bisect.bisect(self.BUCKETS, took)] += 1
+
+    def snapshot(self):
+        #(name, hook, layer) -> (calls, matches, total time, max time, histogram)
+        ret = {}
+        for (key, (calls, matches, total, max, hist)) in self.entries.items():
+            ret[key] = (calls, matches, total, max, list(hist))
+        return ret
+
+    def reset(self):
+        self.entries = {}
+
+class stats_thread(threading.Thread):
+    #appends a snapshot of the dispatch statistics to a file every interval
+    def __init__(self, parent, filename, interval):
+        threading.Thread.__init__(self)
+        self.parent = parent
+        self.filename = filename
+        self.interval = interval
+        self.running = True
+
+    def run(self):
+        while self.running:
+            try:
+                f = open(self.filename, "a")
+                f.write("--- %s\n" % time.strftime("%Y-%m-%d %H:%M:%S"))
+                f.write("\n".join(self.parent.format_dispatch_stats()))
+                f.write("\n")
+                f.close()
+            except Exception, e:
+                self.parent.log("Can't write statistics to %s: %s" % (self.filename, e))
+                break
+            for i in xrange(self.interval * 10):
+                if not self.running:
+                    break
+                time.sleep(0.1)
+
+    def quit(self):
+        self.running = False
+
+class module_worker(threading.Thread):
+    #bounded queue of classified packets for one module, drained by its own
+    #thread so a slow input handler doesn't stall the capture
+    def __init__(self, parent, name, size, policy):
+        threading.Thread.__init__(self)
+        self.parent = parent
+        self.name = name
+        self.size = size
+        self.policy = policy
+        self.queue = collections.deque()
+        self.cond = threading.Condition()
+        self.running = True
+        self.enqueued = 0
+        self.handled = 0
+        self.dropped = 0
+        self.max_depth = 0
+
+    def put(self, call, args, layer_name):
+        self.cond.acquire()
+        try:
+            if len(self.queue) >= self.size:
+                if self.policy == QUEUE_DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                elif self.policy == QUEUE_DROP_OLDEST:
+                    self.queue.popleft()
+                    self.dropped += 1
+                else:
+                    while self.running and len(self.queue) >= self.size:
+                        self.cond.wait(0.1)
+            self.queue.append((call, args, layer_name))
+            self.enqueued += 1
+            if len(self.queue) > self.max_depth:
+                self.max_depth = len(self.queue)
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+
+    def run(self):
+        while self.running:
+            self.cond.acquire()
+            try:
+                if not self.queue:
+                    self.cond.wait(0.1)
+                if not self.queue:
+                    continue
+                (call, args, layer_name) = self.queue.popleft()
+                self.cond.notify_all()
+            finally:
+                self.cond.release()
+            start = time.time()
+            try:
+                call(*args)
+            except Exception, e:
+                self.parent._print(e)
+                if DEBUG:
+                    self.parent._print('-'*60)
+                    self.parent._print(traceback.format_exc())
+                    self.parent._print('-'*60)
+            if self.parent.instrument:
+                self.parent.dispatch_stats.add(self.name, "input", layer_name, True, time.time() - start)
+            self.handled += 1
+
+    def quit(self):
+        self.cond.acquire()
+        self.running = False
+        self.cond.notify_all()
+        self.cond.release()
+
+    def stats(self):
+        #(depth, size, enqueued, handled, dropped, max depth)
+        return (len(self.queue), self.size, self.enqueued, self.handled, self.dropped, self.max_depth)
+
 class pcap_thread(threading.Thread):
     def __init__(self, parent, interface):
         threading.Thread.__init__(self)
         self.parent = parent
         self.running = True
         self.interface = interface
+        self.filter = parent.bpf_filter
+        self.filter_changed = True
+        self.capture = None
+
+    def set_filter(self, filter):
+        #applied by the capture thread itself before its next dispatch
+        self.filter = filter
+        self.filter_changed = True
+
+    def apply_filter(self, p):
+        self.filter_changed = False
+        filter = self.filter
+        if filter is None:
+            filter = ""
+        try:
+            p.setfilter(filter, 1, 0)
+        except Exception, e:
+            self.parent.log("Can't set capture filter '%s': %s" % (filter, e))
+            p.setfilter("", 0, 0)
+        else:
+            if filter:
+                self.parent.log("Capture filter: %s" % filter)
 
     def run(self):
-        p = pcap.pcapObject()
-        #check to_ms = 100 for non linux
-        p.open_live(self.interface, 1600, 1, 100)
-        if not PLATFORM == "Darwin":
-            p.setnonblock(1)
+        p = None
+        if self.parent.pcap_ring and PLATFORM == "Linux":
+            try:
+                p = tpacket_ring(self.interface, self.parent.ring_block_size * 1024, self.parent.ring_block_count, self.parent.pcap_poll_timeout)
+            except Exception, e:
+                self.parent.log("Can't set up capture ring, using pcap: %s" % e)
+            else:
+                self.parent.log("Capturing with %d KiB TPACKET_V3 ring" % (self.parent.ring_block_size * self.parent.ring_block_count))
+        if p is None:
+            p = pcap.pcapObject()
+            #check to_ms = 100 for non linux
+            p.open_live(self.interface, 1600, 1, self.parent.pcap_poll_timeout)
+            if not PLATFORM == "Darwin":
+                p.setnonblock(1)
+        self.capture = p
+        if self.parent.pcap_workers:
+            self.parent.start_workers()
+        if self.parent.pcap_blocking and not PLATFORM == "Darwin" and not PLATFORM == "Windows":
+            self.run_blocking(p)
+        else:
+            self.run_polling(p)
+        self.parent.stop_workers()
+        if isinstance(p, tpacket_ring):
+            (packets, drops, freezes, fill) = p.stats()
+            self.parent.log("Ring received %d packets, kernel dropped %d" % (packets, drops))
+            p.close()
+        self.capture = None
+        self.parent.log("Listen thread terminated")
+
+    def stats(self):
+        #(received, dropped, ring fill in percent or None) of the running capture
+        p = self.capture
+        if p is None:
+            return None
+        if isinstance(p, tpacket_ring):
+            (packets, drops, freezes, fill) = p.stats()
+            return (packets, drops, fill)
+        (packets, drops, ifdrops) = p.stats()
+        return (packets, drops, None)
+
+    def run_blocking(self, p):
+        #wait on the selectable fd and drain up to pcap_batch_size packets per wakeup
+        fd = p.fileno()
+        timeout = self.parent.pcap_poll_timeout / 1000.0
+        while self.running:
+            try:
+                if self.filter_changed:
+                    self.apply_filter(p)
+                (r, w, x) = select.select([fd], [], [], timeout)
+                if r:
+                    p.dispatch(self.parent.pcap_batch_size, self.dispatch_packet)
+            except select.error, e:
+                if e[0] == errno.EINTR:
+                    continue
+                self.parent._print(e)
+                break
+            except Exception, e:
+                self.parent._print(e)
+                if DEBUG:
+                    self.parent._print('-'*60)
+                    self.parent._print(traceback.format_exc())
+                    self.parent._print('-'*60)
+
+    def run_polling(self, p):
         while self.running:
             try:
-                p.dispatch(1, self.dispatch_packet)
+                if self.filter_changed:
+                    self.apply_filter(p)
+                p.dispatch(self.parent.pcap_batch_size, self.dispatch_packet)
             except Exception, e:
                 self.parent._print(e)
                 if DEBUG:
@@ -85,137 +793,118 @@ class pcap_thread(threading.Thread):
                     self.parent._print('-'*60)
 
             time.sleep(0.001)
-        self.parent.log("Listen thread terminated")
 
     def quit(self):
         self.running = False
 
     def dispatch_packet(self, pktlen, data, timestamp):
-        got_tag = False
         if not data:
             return
-        #parse and build dpkt.eth on myself, as dpkt parsing method strips dot1q, mpls, etc...
-        (dst, src, type) = struct.unpack("!6s6sH", data[:14])
-        eth = dpkt.ethernet.Ethernet(dst=dst, src=src, type=type, data=data[14:])
-        for (check, call, name) in self.parent.eth_checks:
-            (ret, stop) = check(eth)
-            if ret:
-                call(copy.copy(eth), timestamp)
-                if stop:
-                    return
-        if eth.type == dpkt.ethernet.ETH_TYPE_8021Q or eth.type == dpkt.ethernet.ETH_TYPE_MPLS:
-            got_tag = True
-            eth_new = dpkt.ethernet.Ethernet(data)
-            #dpkt only removes first dot1q tag
-            while eth_new.type == dpkt.ethernet.ETH_TYPE_8021Q:
-                eth_new = dpkt.ethernet.Ethernet(eth_new.data)
-            for (check, call, name) in self.parent.eth_checks:
-                (ret, stop) = check(eth_new)
-                if ret:
-                    call(copy.copy(eth_new), timestamp)
-                    if stop:
-                        return
+        pkt = packet(data)
+        if self.run_checks(self.parent.eth_checks.lookup(pkt.type, pkt.dst), "eth", (pkt.decode_eth, ), timestamp):
+            return
+        eth = pkt.decode_eth
+        got_tag = pkt.decap()
+        if got_tag:
+            if self.run_checks(self.parent.eth_checks.lookup(pkt.inner_type, pkt.dst), "eth", (pkt.decode_eth_inner, ), timestamp):
+                return
             #why here and not waiting for later?
-            if eth_new.type == dpkt.ethernet.ETH_TYPE_IP:
-                ip = dpkt.ip.IP(str(eth_new.data))
-                for (check, call, name) in self.parent.ip_checks:
-                    (ret, stop) = check(ip)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip), timestamp)
-                        if stop:
-                            return
-            eth = eth_new
+            if pkt.inner_type == dpkt.ethernet.ETH_TYPE_IP:
+                if self.run_checks(self.parent.ip_checks.lookup(pkt.ip_proto()), "ip", (eth, pkt.decode_ip), timestamp):
+                    return
+            eth = pkt.decode_eth_inner
         
         #strip pppoe and ppp headers
-        if eth.type == dpkt.ethernet.ETH_TYPE_PPPoE:
-            pppoe = dpkt.pppoe.PPPoE(str(eth.data))
-            ppp = dpkt.ppp.PPP(str(pppoe.data))
-            eth.data = ppp.data
-            if ppp.p == dpkt.ppp.PPP_IP:
-                eth.type = dpkt.ethernet.ETH_TYPE_IP
-            elif ppp.p == dpkt.ppp.PPP_IP6:
-                eth.type = dpkt.ethernet.ETH_TYPE_IP6
-            else:
+        if pkt.inner_type == dpkt.ethernet.ETH_TYPE_PPPoE:
+            if not pkt.decap_pppoe():
                 return
+            eth = pkt.decode_eth_inner
 
-        if eth.type == dpkt.ethernet.ETH_TYPE_IP:
-            ip = dpkt.ip.IP(str(eth.data))
-            for (check, call, name) in self.parent.ip_checks:
-                if name == "arp" and got_tag:
-                    continue
-                (ret, stop) = check(ip)
-                if ret:
-                    call(copy.copy(eth), copy.copy(ip), timestamp)
-                    if stop:
-                        return
-            if ip.p == dpkt.ip.IP_PROTO_TCP:
-                tcp = dpkt.tcp.TCP(str(ip.data))
-                for (check, call, name) in self.parent.tcp_checks:
-                    (ret, stop) = check(tcp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip), copy.copy(tcp), timestamp)
-                        if stop:
-                            return
-            elif ip.p == dpkt.ip.IP_PROTO_UDP:
-                udp = dpkt.udp.UDP(str(ip.data))
-                for (check, call, name) in self.parent.udp_checks:
-                    (ret, stop) = check(udp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip), copy.copy(udp), timestamp)
-                        if stop:
-                            return
-            elif ip.p == dpkt.ip.IP_PROTO_SCTP:
-                sctp = dpkt.sctp.SCTP(str(ip.data))
-                for (check, call, name) in self.parent.sctp_checks:
-                    (ret, stop) = check(sctp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip), copy.copy(sctp), timestamp)
-                        if stop:
-                            return
-        elif eth.type == dpkt.ethernet.ETH_TYPE_IP6:
-            ip6 = dpkt.ip6.IP6(str(eth.data))
-            for (check, call, name) in self.parent.ip6_checks:
-                (ret, stop) = check(ip6)
-                if ret:
-                    call(copy.copy(eth), copy.copy(ip6), timestamp)
-                    if stop:
-                        return
-            if ip6.nxt == dpkt.ip.IP_PROTO_TCP:
-                tcp = dpkt.tcp.TCP(str(ip6.data))
-                for (check, call, name) in self.parent.tcp_checks:
-                    (ret, stop) = check(tcp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip6), copy.copy(tcp), timestamp)
-                        if stop:
-                            return
-            elif ip6.nxt == dpkt.ip.IP_PROTO_UDP:
-                udp = dpkt.udp.UDP(str(ip6.data))
-                for (check, call, name) in self.parent.udp_checks:
-                    (ret, stop) = check(udp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip6), copy.copy(udp), timestamp)
-                        if stop:
-                            return
-            elif ip6.nxt == dpkt.ip.IP_PROTO_SCTP:
-                sctp = dpkt.sctp.SCTP(str(ip6.data))
-                for (check, call, name) in self.parent.sctp_checks:
-                    (ret, stop) = check(sctp)
-                    if ret:
-                        call(copy.copy(eth), copy.copy(ip6), copy.copy(sctp), timestamp)
-                        if stop:
-                            return
+        if pkt.inner_type == dpkt.ethernet.ETH_TYPE_IP:
+            p = pkt.ip_proto()
+            skip = None
+            if got_tag:
+                skip = "arp"
+            if self.run_checks(self.parent.ip_checks.lookup(p), "ip", (eth, pkt.decode_ip), timestamp, skip):
+                return
+            if p == dpkt.ip.IP_PROTO_TCP:
+                self.run_checks(self.parent.tcp_checks.lookup(*pkt.ports()), "tcp", (eth, pkt.decode_ip, pkt.decode_tcp), timestamp)
+            elif p == dpkt.ip.IP_PROTO_UDP:
+                self.run_checks(self.parent.udp_checks.lookup(*pkt.ports()), "udp", (eth, pkt.decode_ip, pkt.decode_udp), timestamp)
+            elif p == dpkt.ip.IP_PROTO_SCTP:
+                self.run_checks(self.parent.sctp_checks.lookup(*pkt.ports()), "sctp", (eth, pkt.decode_ip, pkt.decode_sctp), timestamp)
+        elif pkt.inner_type == dpkt.ethernet.ETH_TYPE_IP6:
+            nxt = pkt.ip6_nxt()
+            if self.run_checks(self.parent.ip6_checks.lookup(nxt), "ip6", (eth, pkt.decode_ip6), timestamp):
+                return
+            if nxt == dpkt.ip.IP_PROTO_TCP:
+                self.run_checks(self.parent.tcp_checks.lookup(*pkt.ports()), "tcp", (eth, pkt.decode_ip6, pkt.decode_tcp), timestamp)
+            elif nxt == dpkt.ip.IP_PROTO_UDP:
+                self.run_checks(self.parent.udp_checks.lookup(*pkt.ports()), "udp", (eth, pkt.decode_ip6, pkt.decode_udp), timestamp)
+            elif nxt == dpkt.ip.IP_PROTO_SCTP:
+                self.run_checks(self.parent.sctp_checks.lookup(*pkt.ports()), "sctp", (eth, pkt.decode_ip6, pkt.decode_sctp), timestamp)
+
+    def run_checks(self, checks, layer_name, layers, timestamp, skip=None):
+        #layers are the decode methods of the packet, the checks share a
+        #view on the last one. returns True if a matching check asked to
+        #stop dispatching
+        stats = None
+        if self.parent.instrument:
+            stats = self.parent.dispatch_stats
+        layer = None
+        for (check, call, name) in checks:
+            if name == skip:
+                continue
+            if layer is None:
+                layer = packet_view(layers[-1])
+            if stats is None:
+                (ret, stop) = check(layer)
+            else:
+                start = time.time()
+                (ret, stop) = check(layer)
+                stats.add(name, "check", layer_name, ret, time.time() - start)
+            if ret:
+                args = [ packet_view(i) for i in layers ]
+                args.append(timestamp)
+                worker = self.parent.workers.get(name)
+                if worker is not None:
+                    worker.put(call, args, layer_name)
+                elif stats is None:
+                    call(*args)
+                else:
+                    start = time.time()
+                    call(*args)
+                    stats.add(name, "input", layer_name, True, time.time() - start)
+                if stop:
+                    return True
+        return False
 
 class pcap_thread_offline(pcap_thread):
+    #replays a capture file, either as fast as the modules take it or paced
+    #by the capture timestamps (scaled by replay_speed), so module timers
+    #see the original timing
     def __init__(self, parent, filename):
         self.filename = filename
         pcap_thread.__init__(self, parent, "null")
+        self.count = 0
+        self.first = None
 
     def run(self):
         p = pcap.pcapObject()
         p.open_offline(self.filename)
+        if self.parent.pcap_workers:
+            self.parent.start_workers()
+        if self.parent.replay_mode == REPLAY_TIMESTAMP:
+            callback = self.dispatch_timed
+            self.parent.log("Replaying %s at %gx capture speed" % (self.filename, self.parent.replay_speed))
+        else:
+            callback = self.dispatch_counted
+        start = time.time()
         while self.running:
             try:
-                if not p.dispatch(1, self.dispatch_packet):
+                if self.filter_changed:
+                    self.apply_filter(p)
+                if p.dispatch(self.parent.replay_batch_size, callback) <= 0:
                     self.running = False
             except Exception, e:
                 self.parent._print(e)
@@ -223,34 +912,396 @@ class pcap_thread_offline(pcap_thread):
                     self.parent._print('-'*60)
                     self.parent._print(traceback.format_exc())
                     self.parent._print('-'*60)
+        took = time.time() - start
+        self.parent.stop_workers()
+        if took > 0:
+            self.parent.log("Read %d packets in %.2fs (%.0f pkts/s)" % (self.count, took, self.count / took))
         self.parent.log("Read thread terminated")
 
+    def dispatch_counted(self, pktlen, data, timestamp):
+        self.count += 1
+        self.dispatch_packet(pktlen, data, timestamp)
+
+    def dispatch_timed(self, pktlen, data, timestamp):
+        now = time.time()
+        if self.first is None:
+            self.first = (timestamp, now)
+        (first_ts, first_wall) = self.first
+        due = first_wall + (timestamp - first_ts) / self.parent.replay_speed
+        #sleep in slices to stay responsive to quit()
+        while self.running and due > now:
+            time.sleep(min(due - now, 0.1))
+            now = time.time()
+        if not self.running:
+            return
+        self.dispatch_counted(pktlen, data, timestamp)
+
+class frame_template(object):
+    #a frame rendered once, sends after that copy the buffer and patch
+    #only the fields which change at their fixed offsets
+    def __init__(self, frame):
+        self.buf = bytearray(str(frame))
+
+    def copy(self):
+        return frame_template(self.buf)
+
+    def patch(self, offset, data):
+        self.buf[offset:offset + len(data)] = data
+
+    def ip_checksum(self, offset=14):
+        #redo the ipv4 header checksum after patching the header
+        hl = (self.buf[offset] & 0xf) << 2
+        struct.pack_into("!H", self.buf, offset + 10, 0)
+        struct.pack_into("!H", self.buf, offset + 10, dpkt.in_cksum(str(self.buf[offset:offset + hl])))
+
+    def render(self):
+        return str(self.buf)
+
+class template_cache(object):
+    #frame templates by name, build() renders a new one whenever the key
+    #describing the content of the frame changes
+    def __init__(self):
+        self.templates = {}
+
+    def get(self, name, key, build):
+        entry = self.templates.get(name)
+        if entry is None or entry[0] != key:
+            entry = (key, frame_template(build()))
+            self.templates[name] = entry
+        return entry[1]
+
+    def clear(self):
+        self.templates = {}
+
+class token_bucket(object):
+    #rate units per second, at most burst units saved up. reserve() books
+    #amount units and returns how long the caller has to wait for them,
+    #the balance goes negative for callers booked into the future
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = self.burst
+        self.last = time.time()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def reserve(self, amount, now):
+        self.refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+class tx_scheduler(object):
+    #token buckets in frames and bytes per second for each named sender
+    #plus one (name None) for everything sent. pace() books a frame on the
+    #buckets of its sender and the global ones and sleeps until it may go
+    #out, so concurrent senders are served in the order they booked
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rates = {}
+        self.counters = {}
+
+    def set_rate(self, name, pps=None, bps=None, burst=0.01):
+        #burst is the time in seconds the bucket may save up, at least one
+        #frame. no rate removes the limit
+        buckets = []
+        if pps:
+            buckets.append((token_bucket(pps, max(1, pps * burst)), False))
+        if bps:
+            buckets.append((token_bucket(bps / 8.0, max(1514, bps / 8.0 * burst)), True))
+        self.lock.acquire()
+        if buckets:
+            self.rates[name] = (pps, bps, buckets)
+            self.counters.setdefault(name, [0, 0, 0, 0.0])
+        else:
+            self.rates.pop(name, None)
+        self.lock.release()
+
+    def pace(self, name, length, block=True, urgent=False):
+        #returns False if block is False and the frame doesn't fit the rate.
+        #urgent frames use up the global rate, so the other senders give
+        #way to them, but only ever wait for the rate of their sender
+        if not self.rates:
+            return True
+        now = time.time()
+        wait = 0
+        self.lock.acquire()
+        try:
+            rates = [ i for i in (name, None) if i in self.rates ]
+            if name is None:
+                rates = rates[:1]
+            #the rates the frame has to wait for
+            waits = [ i for i in rates if not (urgent and i is None) ]
+            if not block:
+                for i in waits:
+                    for (bucket, per_byte) in self.rates[i][2]:
+                        bucket.refill(now)
+                        if bucket.tokens < (length if per_byte else 1):
+                            self.counters[i][2] += 1
+                            return False
+            for i in rates:
+                for (bucket, per_byte) in self.rates[i][2]:
+                    took = bucket.reserve(length if per_byte else 1, now)
+                    if i in waits:
+                        wait = max(wait, took)
+            for i in rates:
+                counter = self.counters[i]
+                counter[0] += 1
+                if wait > 0 and i in waits:
+                    counter[1] += 1
+                    counter[3] += wait
+        finally:
+            self.lock.release()
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def stats(self):
+        #name -> (pps, bps, frames, delayed, dropped, seconds waited)
+        ret = {}
+        self.lock.acquire()
+        for (name, (pps, bps, buckets)) in self.rates.items():
+            (frames, delayed, dropped, waited) = self.counters[name]
+            ret[name] = (pps, bps, frames, delayed, dropped, waited)
+        self.lock.release()
+        return ret
+
 class dnet_thread(threading.Thread):
-    def __init__(self, interface):
+    #bounded fifo of outgoing frames per priority class, drained as fast
+    #as the device takes them. send() blocks while the queue of its class
+    #is full, send_nowait() drops. frames sent with a name are paced by the
+    #rate set for that name and go to the class set for it. strict
+    #scheduling always serves the higher classes first, weighted gives the
+    #classes turns of up to TX_WEIGHTS frames each, a class with nothing
+    #queued loses its turn. the turns go on across batches, so a full
+    #control queue doesn't keep the others waiting. control frames aren't
+    #held back by the rate set for all frames, see tx_scheduler.pace()
+    SEND_RETRIES = 3
+    #frames taken per round, a control frame waits at most for one batch
+    BATCH = 16
+    RING_BATCH = 64
+
+    def __init__(self, interface, size=1000, ring=False, ring_frames=1024, scheduling=TX_STRICT):
         threading.Thread.__init__(self)
         self.interface = interface
-        self.sem = threading.Semaphore()
+        self.size = size
+        self.scheduling = scheduling
+        self.queues = {}
+        self.class_stats = {}
+        for i in TX_CLASSES:
+            self.queues[i] = collections.deque()
+            #enqueued, sent, dropped, max depth, latency sum, max latency, histogram
+            self.class_stats[i] = [0, 0, 0, 0, 0.0, 0.0, [0] * len(dispatch_stats.BUCKET_NAMES)]
+        self.classes = {}
+        self.cond = threading.Condition()
         self.running = True
         self.eth = dnet.eth(interface)
-        self.out = None
+        self.scheduler = tx_scheduler()
+        self.ring = None
+        self.batch = self.BATCH
+        #class whose turn it is and the frames it may still send in it
+        self.turn = 0
+        self.credit = TX_WEIGHTS[TX_CLASSES[0]]
+        if ring and PLATFORM == "Linux":
+            self.ring = tpacket_tx_ring(interface, ring_frames)
+            self.batch = self.RING_BATCH
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+        self.max_depth = 0
+
+    def depth(self):
+        return sum([ len(i) for i in self.queues.values() ])
+
+    def dequeue(self):
+        #called with the lock held, returns up to batch (class, (frame, time))
+        batch = []
+        if self.scheduling == TX_WEIGHTED:
+            while len(batch) < self.batch and self.depth():
+                cls = TX_CLASSES[self.turn]
+                queue = self.queues[cls]
+                if queue and self.credit:
+                    batch.append((cls, queue.popleft()))
+                    self.credit -= 1
+                else:
+                    self.turn = (self.turn + 1) % len(TX_CLASSES)
+                    self.credit = TX_WEIGHTS[TX_CLASSES[self.turn]]
+        else:
+            for cls in TX_CLASSES:
+                queue = self.queues[cls]
+                while queue and len(batch) < self.batch:
+                    batch.append((cls, queue.popleft()))
+        return batch
 
     def run(self):
-        while self.running:
-            self.sem.acquire()
-            if self.out:
-                self.eth.send(self.out)
-                self.out = None
-            self.sem.release()
-            time.sleep(0.001)
+        while True:
+            self.cond.acquire()
+            try:
+                while self.running and not self.depth():
+                    self.cond.wait(0.1)
+                batch = self.dequeue()
+                if not batch:
+                    break
+                self.cond.notify_all()
+            finally:
+                self.cond.release()
+            #send without holding the lock
+            if self.ring:
+                if self.transmit_ring([ out for (cls, (out, queued)) in batch ]):
+                    self.account(batch)
+            else:
+                for i in batch:
+                    if self.transmit(i[1][0]):
+                        self.account((i, ))
+        if self.ring:
+            self.ring.close()
+
+    def account(self, batch):
+        now = time.time()
+        for (cls, (out, queued)) in batch:
+            stats = self.class_stats[cls]
+            took = now - queued
+            stats[1] += 1
+            stats[4] += took
+            if took > stats[5]:
+                stats[5] = took
+            stats[6][bisect.bisect(dispatch_stats.BUCKETS, took)] += 1
+
+    def transmit(self, out):
+        for i in xrange(self.SEND_RETRIES):
+            try:
+                self.eth.send(out)
+                self.sent += 1
+                return True
+            except OSError, e:
+                #most likely ENOBUFS, give the device a moment
+                time.sleep(0.001)
+        self.errors += 1
+        return False
+
+    def transmit_ring(self, frames):
+        #one syscall for the whole batch instead of one per frame
+        try:
+            self.ring.put_many(frames)
+            self.ring.flush()
+            self.sent += len(frames)
+            return True
+        except socket.error, e:
+            self.ring.pending = 0
+            self.errors += len(frames)
+            return False
 
     def quit(self):
+        #frames already queued are still sent before the thread ends
+        self.cond.acquire()
         self.running = False
+        self.cond.notify_all()
+        self.cond.release()
+
+    def set_rate(self, name, pps=None, bps=None, burst=0.01):
+        #limits frames sent under name (None for all frames) to pps frames
+        #or bps bits per second, no rate removes the limit
+        self.scheduler.set_rate(name, pps, bps, burst)
+
+    def set_class(self, name, cls):
+        #frames sent under name without an explicit class go to cls
+        self.classes[name] = cls
+
+    def send(self, out, block=True, timeout=None, name=None, cls=None):
+        #returns False if the frame was dropped
+        if cls is None:
+            cls = self.classes.get(name, TX_INTERACTIVE)
+        if not self.scheduler.pace(name, len(out), block, cls == TX_CONTROL):
+            return False
+        queue = self.queues[cls]
+        stats = self.class_stats[cls]
+        self.cond.acquire()
+        try:
+            if len(queue) >= self.size:
+                if not block:
+                    self.dropped += 1
+                    stats[2] += 1
+                    return False
+                if timeout is not None:
+                    end = time.time() + timeout
+                while self.running and len(queue) >= self.size:
+                    if timeout is None:
+                        self.cond.wait(0.1)
+                    else:
+                        remaining = end - time.time()
+                        if remaining <= 0:
+                            break
+                        self.cond.wait(remaining)
+                if len(queue) >= self.size or not self.running:
+                    self.dropped += 1
+                    stats[2] += 1
+                    return False
+            queue.append((out, time.time()))
+            self.enqueued += 1
+            stats[0] += 1
+            if len(queue) > stats[3]:
+                stats[3] = len(queue)
+            depth = self.depth()
+            if depth > self.max_depth:
+                self.max_depth = depth
+            self.cond.notify_all()
+            return True
+        finally:
+            self.cond.release()
+
+    def send_nowait(self, out, name=None, cls=None):
+        return self.send(out, False, name=name, cls=cls)
 
-    def send(self, out):
-        self.sem.acquire()
-        self.out = out
-        self.sem.release()
-        time.sleep(0.001)
+    def send_burst(self, frames, name=None, cls=None):
+        #sends all frames paced at the rate of name, returns the number
+        #of frames queued
+        sent = 0
+        for out in frames:
+            if not self.running:
+                break
+            if self.send(out, name=name, cls=cls):
+                sent += 1
+        return sent
+
+    def stats(self):
+        #(depth, size, enqueued, sent, dropped, errors, max depth)
+        return (self.depth(), self.size, self.enqueued, self.sent, self.dropped, self.errors, self.max_depth)
+
+    def get_class_stats(self):
+        #class -> (depth, enqueued, sent, dropped, max depth, average latency,
+        #max latency, latency histogram)
+        ret = {}
+        for cls in TX_CLASSES:
+            (enqueued, sent, dropped, max_depth, total, max, hist) = self.class_stats[cls]
+            avg = 0.0
+            if sent:
+                avg = total / sent
+            ret[cls] = (len(self.queues[cls]), enqueued, sent, dropped, max_depth, avg, max, list(hist))
+        return ret
+
+class dnet_sender(object):
+    #what a module gets as its dnet, sends under the module name unless
+    #told otherwise, so its frames get its class and rate
+    def __init__(self, thread, name, cls):
+        self.thread = thread
+        self.name = name
+        thread.set_class(name, cls)
+
+    def __getattr__(self, attr):
+        return getattr(self.thread, attr)
+
+    def send(self, out, block=True, timeout=None, name=None, cls=None):
+        return self.thread.send(out, block, timeout, name or self.name, cls)
+
+    def send_nowait(self, out, name=None, cls=None):
+        return self.thread.send(out, False, None, name or self.name, cls)
+
+    def send_burst(self, frames, name=None, cls=None):
+        return self.thread.send_burst(frames, name or self.name, cls)
 
 class fake_eth(object):
     def get(self):
@@ -259,8 +1310,724 @@ class fake_eth(object):
 class dnet_thread_offline(object):
     def __init__(self):
         self.eth = fake_eth()
-    def send(self, data):
+    def set_rate(self, name, pps=None, bps=None, burst=0.01):
+        pass
+    def set_class(self, name, cls):
         pass
+    def send(self, data, block=True, timeout=None, name=None, cls=None):
+        return True
+    def send_nowait(self, data, name=None, cls=None):
+        return True
+    def send_burst(self, frames, name=None, cls=None):
+        return len(frames)
+    def stats(self):
+        return (0, 0, 0, 0, 0, 0, 0)
+
+def load_binding(package, name):
+    #the windows build installs the bindings as top level modules
+    if PLATFORM == "Windows":
+        return __import__(name)
+    return getattr(getattr(__import__("loki_bindings.%s.%s" % (package, name)), package), name)
+
+#jobs with targets return a list with a pw or None per target
+
+def crack_ospf_md5(job):
+    bf = load_binding("ospfmd5", "ospfmd5bf")
+    if job.targets:
+        return bf.bf_multi(job.bf, job.full, job.wl, job.targets, job.status, job.threads, job.mask, job.rules)
+    return bf.bf(job.bf, job.full, job.wl, job.digest, job.data, job.status, job.threads, job.mask, job.rules)
+
+def crack_isis_hmac_md5(job):
+    bf = load_binding("isismd5", "isismd5bf")
+    if job.targets:
+        return bf.bf_multi(job.bf, job.full, job.wl, job.targets, job.status, job.threads, job.mask, job.rules)
+    return bf.bf(job.bf, job.full, job.wl, job.digest, job.data, job.status, job.threads, job.mask, job.rules)
+
+def crack_tcp_md5(job):
+    bf = load_binding("tcpmd5", "tcpmd5bf")
+    if job.targets:
+        return bf.bf_multi(job.bf, job.full, job.wl, job.targets, job.status, job.threads, job.mask, job.rules)
+    (pw, job.tried, took) = bf.bf(job.bf, job.full, job.wl, job.digest, job.data, job.status, job.threads, 1, job.mask, job.rules)
+    return pw
+
+def crack_bfd_md5(job):
+    bf = load_binding("bfd", "bfdbf")
+    if job.targets:
+        return bf.bfmd5_multi(job.bf, job.full, job.wl, job.targets, job.status, job.threads, job.mask, job.rules)
+    return bf.bfmd5(job.bf, job.full, job.wl, job.digest, job.data, job.status, job.threads, job.mask, job.rules)
+
+def crack_leap(job):
+    #data is (challenge, id, user), wordlist only, asleap knows no mask or rules
+    if job.targets:
+        raise ValueError("leap cracks only one target at once")
+    (chall, id, user) = job.data
+    pw = load_binding("asleap", "asleap").attack_leap(job.wl, chall, job.digest, id, user)
+    #asleap returns "" if the pw isn't in the wordlist
+    return pw or None
+
+def format_duration(secs):
+    if secs is None:
+        return "-"
+    secs = int(secs)
+    (days, secs) = divmod(secs, 86400)
+    if days > 365:
+        return ">1y"
+    ret = "%02d:%02d:%02d" % (secs / 3600, secs / 60 % 60, secs % 60)
+    if days:
+        ret = "%dd %s" % (days, ret)
+    return ret
+
+#wordlist mangling rules, (name, rules) with one rule per line, see
+#lib/bf.c for the syntax. every rule gives one candidate per word
+CRACK_RULES = [ ("none", ""),
+                ("case", "\n".join([":", "l", "u", "c", "C", "t"])),
+                ("digits", "\n".join([":"] + [ "$%d" % i for i in xrange(10) ] + [ "$%d$%d" % (i / 10, i % 10) for i in xrange(100) ])),
+                ("years", "\n".join([":"] + [ "%s%s%s" % (case, "".join([ "$" + i for i in str(year) ]), bang) for year in xrange(1990, 2031) for case in ["", "c"] for bang in ["", "$!"] ])),
+                ("leet", "\n".join([":", "sa@", "sa4", "se3", "si1", "si!", "so0", "ss$", "ss5", "st7", "sa@se3si1so0", "sa4se3si1so0ss5st7", "csa@se3si1so0"])),
+                ]
+
+def keyed_md5(key, data):
+    #rfc 1828 style keyed md5, md5(key, fill, data, key) where key and fill
+    #are the key padded like md5 pads a message
+    fill = "\x80" + "\x00" * ((55 - len(key)) % 64) + struct.pack("<Q", len(key) << 3)
+    return hashlib.md5(key + fill + data + key).digest()
+
+#the checks below hash a secret just like the bindings hash a candidate,
+#(digest, data, secret) -> True if it matches
+
+def verify_md5_16(digest, data, secret):
+    #ospf and bfd, the key is zero padded to 16 bytes
+    return hashlib.md5(data + secret[:16].ljust(16, "\x00")).digest() == digest
+
+def verify_hmac_md5(digest, data, secret):
+    return hmac.new(secret, data, hashlib.md5).digest() == digest
+
+def verify_tcp_md5(digest, data, secret):
+    #data is the ip packet, see pre_calc_md5() of the tcpmd5 binding
+    if len(data) < 40:
+        return False
+    tcp = data[20:40]
+    head_len = 20 + ((ord(tcp[12]) >> 4) << 2)
+    phdr = data[12:20] + struct.pack("!BBH", 0, dpkt.ip.IP_PROTO_TCP, len(data) - 20)
+    return hashlib.md5(phdr + tcp[:16] + "\x00\x00" + tcp[18:] + data[head_len:] + secret).digest() == digest
+
+def verify_keyed_md5(digest, data, secret):
+    #hsrp2, see keyed_md5()
+    return keyed_md5(secret, data) == digest
+
+CRACK_VERIFY = {    "ospf-md5"          :   verify_md5_16,
+                    "isis-hmac-md5"     :   verify_hmac_md5,
+                    "tcp-md5"           :   verify_tcp_md5,
+                    "bfd-md5"           :   verify_md5_16,
+                    "hsrp2-md5"         :   verify_keyed_md5,
+                    }
+
+#algorithm -> (function, can use more than one thread)
+CRACK_ALGORITHMS = {    "ospf-md5"          :   (crack_ospf_md5, True),
+                        "isis-hmac-md5"     :   (crack_isis_hmac_md5, True),
+                        "tcp-md5"           :   (crack_tcp_md5, True),
+                        "bfd-md5"           :   (crack_bfd_md5, True),
+                        "leap"              :   (crack_leap, False),
+                        }
+
+class crack_job(object):
+    #one secret to recover, algorithm is a key of CRACK_ALGORITHMS. modules
+    #either pass done/progress callbacks or subclass and override done() and
+    #progress(). both get the job and are called from the crack_manager's
+    #threads, done() exactly once when the job is found, not found,
+    #cancelled or failed. a mask (like "Cisco?d?d?d?d!") replaces the
+    #charsets of the brute force, rules (see CRACK_RULES) mangle the words
+    #of the wordlist.
+    #targets, a list of (digest, data), cracks several captures of the
+    #same algorithm in one pass over the candidates instead of digest and
+    #data. pws gets the pw or None of every target and hit() (or the hit
+    #callback) is called with the index of each target as soon as the
+    #manager sees it found, before done().
+    #keyid is what the protocol calls the key (a list with one per target
+    #for targets), found pws go into the potfile of the manager under it.
+    #checkpoint is where the binding got to, (position, offset, next, tried),
+    #see bf_status. a job with one runs from there, the manager keeps it in
+    #its crack_checkpoints to resume jobs that got cancelled or interrupted.
+    def __init__(self, algorithm, digest, data, bf=True, full=False, wl="", threads=0, priority=0, name=None, done=None, progress=None, mask="", rules="", targets=None, hit=None, keyid=None, checkpoint=None):
+        self.algorithm = algorithm
+        self.digest = digest
+        self.data = data
+        self.targets = targets and list(targets) or None
+        self.pws = [ None for i in self.targets or [] ]
+        self.seen = [ False for i in self.targets or [] ]
+        self.keyid = keyid
+        self.bf = bf
+        self.full = full
+        self.wl = wl or ""
+        self.threads = threads
+        self.mask = mask or ""
+        self.rules = rules or ""
+        self.priority = priority
+        self.name = name or algorithm
+        self.on_done = done
+        self.on_progress = progress
+        self.on_hit = hit
+        self.manager = None
+        self.status = bytearray(CRACK_STATUS.size + CRACK_HIT.size * len(self.pws))
+        self.state = CRACK_QUEUED
+        self.cancelled = False
+        self.pw = None
+        self.error = None
+        self.current = ""
+        self.tried = 0
+        self.tried_before = 0
+        self.position = 0.0
+        self.total = 0.0
+        self.rate = 0.0
+        self.eta = None
+        self.last = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.uid = os.urandom(8).encode("hex")
+        self.checkpoint = None
+        self.checkpointed = 0
+        if checkpoint:
+            self.rewind(checkpoint)
+
+    def rewind(self, checkpoint):
+        #a fresh status that has the binding start at checkpoint
+        (position, offset, next, tried) = checkpoint
+        self.checkpoint = checkpoint
+        self.status = bytearray(len(self.status))
+        CRACK_STATUS.pack_into(self.status, 0, 0, 0, tried, position, 0.0, "", 1, 0, position, offset, next)
+        #so the binding doesnt look for the targets found before
+        for (i, pw) in enumerate(self.pws):
+            if pw is not None:
+                CRACK_HIT.pack_into(self.status, CRACK_STATUS.size + i * CRACK_HIT.size, 1, pw)
+        self.tried = tried
+        self.tried_before = tried
+        self.position = position
+        self.last = None
+
+    def resumable(self):
+        return self.checkpoint is not None and self.state in (CRACK_CANCELLED, CRACK_FAILED, CRACK_SUSPENDED)
+
+    def cancel(self):
+        if self.manager:
+            self.manager.cancel(self)
+
+    def is_alive(self):
+        return self.state in (CRACK_QUEUED, CRACK_RUNNING)
+
+    def runtime(self):
+        if not self.started:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def update(self):
+        #reads the status the binding keeps up to date while it runs, rate
+        #is in candidates per second since the last update, eta in seconds
+        #until the wordlist or keyspace is exhausted
+        (cancel, found, tried, position, total, current, resume, seq, saved, offset, next) = CRACK_STATUS.unpack_from(self.status)
+        #the threads write the checkpoint between two increments of seq
+        if seq and not seq & 1 and CRACK_STATUS.unpack_from(self.status)[7] == seq:
+            self.checkpoint = (saved, offset, next.split("\0")[0], tried)
+        now = time.time()
+        if self.last:
+            (last_now, last_tried, last_position) = self.last
+            if now > last_now:
+                self.rate = (tried - last_tried) / (now - last_now)
+                speed = (position - last_position) / (now - last_now)
+                if speed > 0 and total >= position:
+                    self.eta = (total - position) / speed
+        self.last = (now, tried, position)
+        self.tried = max(self.tried, tried)
+        self.position = position
+        self.total = total
+        self.current = current.split("\0")[0]
+        #targets found since the last update, the pws in the status may be
+        #cut, the ones the binding returns are not
+        new = []
+        for i in xrange(len(self.seen)):
+            if self.seen[i]:
+                continue
+            (found, pw) = CRACK_HIT.unpack_from(self.status, CRACK_STATUS.size + i * CRACK_HIT.size)
+            if found:
+                self.seen[i] = True
+                if self.pws[i] is None:
+                    self.pws[i] = pw.split("\0")[0]
+                new.append(i)
+        return new
+
+    def percent(self):
+        if self.total <= 0:
+            return 0.0
+        return min(100.0, self.position * 100 / self.total)
+
+    COLUMNS = ["name", "algorithm", "state", "threads", "tried", "hashes/s", "progress", "eta", "current"]
+
+    def format(self):
+        #one string per COLUMNS entry
+        (rate, eta) = (self.rate, self.eta)
+        if self.state != CRACK_RUNNING:
+            eta = None
+            if self.runtime() > 0:
+                rate = (self.tried - self.tried_before) / self.runtime()
+        if self.targets:
+            state = "%s (%d/%d)" % (self.state, len([ i for i in self.pws if i is not None ]), len(self.targets))
+        else:
+            state = self.pw and "%s (%s)" % (self.state, self.pw) or self.state
+        return [ self.name, self.algorithm, state, str(self.threads), str(self.tried),
+                 "%.0f" % rate, "%.2f%%" % self.percent(), format_duration(eta), self.current ]
+
+    def done(self):
+        if self.on_done:
+            self.on_done(self)
+
+    def progress(self):
+        if self.on_progress:
+            self.on_progress(self)
+
+    def hit(self, index):
+        if self.on_hit:
+            self.on_hit(self, index)
+
+    def secrets(self):
+        #(keyid, pw) of everything found
+        if self.targets:
+            keyids = self.keyid or [ None for i in self.targets ]
+            return [ (keyid, pw) for (keyid, pw) in zip(keyids, self.pws) if pw is not None ]
+        if self.pw is None:
+            return []
+        return [ (self.keyid, self.pw) ]
+
+class crack_potfile(object):
+    #the secrets recovered so far, so known keys dont get cracked again. they
+    #are indexed by protocol (the algorithms of CRACK_ALGORITHMS or others
+    #like "hsrp2-md5") and key-id, None if the protocol has no key-ids. the
+    #file gets one line per secret, "protocol<TAB>key-id<TAB>hex(secret)"
+    def __init__(self, parent, path):
+        self.parent = parent
+        self.path = path
+        self.lock = threading.Lock()
+        self.secrets = collections.OrderedDict()
+        self.load()
+
+    @staticmethod
+    def index(protocol, keyid):
+        if keyid is None:
+            return (protocol, "")
+        return (protocol, str(keyid))
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            f = open(self.path, "r")
+            try:
+                for line in f:
+                    try:
+                        (protocol, keyid, secret) = line.rstrip("\r\n").split("\t")
+                        secret = secret.decode("hex")
+                    except (ValueError, TypeError):
+                        continue
+                    self.secrets.setdefault((protocol, keyid), [])
+                    if secret not in self.secrets[(protocol, keyid)]:
+                        self.secrets[(protocol, keyid)].append(secret)
+            finally:
+                f.close()
+        except IOError, e:
+            self.parent._print(e)
+
+    def add(self, protocol, keyid, secret):
+        index = self.index(protocol, keyid)
+        self.lock.acquire()
+        try:
+            if secret in self.secrets.get(index, []):
+                return
+            self.secrets.setdefault(index, []).append(secret)
+            path = os.path.dirname(self.path)
+            if path and not os.path.exists(path):
+                os.mkdir(path, 0700)
+            #secrets, so only for the user
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0600)
+            try:
+                os.write(fd, "%s\t%s\t%s\n" % (index[0], index[1], secret.encode("hex")))
+            finally:
+                os.close(fd)
+        except (IOError, OSError), e:
+            self.parent._print(e)
+            if DEBUG:
+                self.parent._print('-'*60)
+                self.parent._print(traceback.format_exc())
+                self.parent._print('-'*60)
+        finally:
+            self.lock.release()
+
+    def candidates(self, protocol, keyid):
+        #the secrets of this key-id first, then the other ones of the
+        #protocol and then all others, keys get reused between protocols
+        index = self.index(protocol, keyid)
+        self.lock.acquire()
+        try:
+            ret = list(self.secrets.get(index, []))
+            for (i, secrets) in self.secrets.items():
+                if i != index and i[0] == protocol:
+                    ret += secrets
+            for (i, secrets) in self.secrets.items():
+                if i[0] != protocol:
+                    ret += secrets
+        finally:
+            self.lock.release()
+        seen = set()
+        return [ i for i in ret if not (i in seen or seen.add(i)) ]
+
+    def lookup(self, protocol, keyid, check):
+        #the first known secret check() returns True for, which is then
+        #known for this protocol and key-id too, or None
+        for secret in self.candidates(protocol, keyid):
+            if check(secret):
+                self.add(protocol, keyid, secret)
+                return secret
+        return None
+
+    def verify(self, algorithm, keyid, digest, data):
+        #a known secret for a captured (digest, data) of one of CRACK_VERIFY
+        func = CRACK_VERIFY[algorithm]
+        return self.lookup(algorithm, keyid, lambda secret: func(digest, data, secret))
+
+class crack_checkpoints(object):
+    #the jobs that can be resumed, also after loki got closed or killed. one
+    #file per job in path with its parameters and last checkpoint, strings
+    #are base64 encoded like in the module configs
+    def __init__(self, parent, path):
+        self.parent = parent
+        self.path = path
+        self.lock = threading.Lock()
+
+    def file(self, job):
+        return os.path.join(self.path, job.uid + ".cfg")
+
+    def save(self, job):
+        enc = lambda x: base64.b64encode(x or "")
+        keyid = lambda x: x is not None and str(x) or ""
+        config = ConfigParser.RawConfigParser()
+        config.add_section("job")
+        for i in ["algorithm", "name", "wl", "mask", "rules"]:
+            config.set("job", i, enc(getattr(job, i)))
+        for i in ["bf", "full", "threads", "priority"]:
+            config.set("job", i, int(getattr(job, i)))
+        if job.targets:
+            keyids = job.keyid or [ None for i in job.targets ]
+            for (i, ((digest, data), pw)) in enumerate(zip(job.targets, job.pws)):
+                section = "target %d" % i
+                config.add_section(section)
+                config.set(section, "digest", enc(digest))
+                config.set(section, "data", enc(data))
+                config.set(section, "keyid", keyid(keyids[i]))
+                if pw is not None:
+                    config.set(section, "pw", enc(pw))
+        else:
+            config.set("job", "digest", enc(job.digest))
+            config.set("job", "data", enc(job.data))
+            config.set("job", "keyid", keyid(job.keyid))
+        (position, offset, next, tried) = job.checkpoint
+        config.add_section("checkpoint")
+        config.set("checkpoint", "position", repr(position))
+        config.set("checkpoint", "offset", offset)
+        config.set("checkpoint", "next", enc(next))
+        config.set("checkpoint", "tried", tried)
+        config.set("checkpoint", "total", repr(job.total))
+        self.lock.acquire()
+        try:
+            if not os.path.exists(self.path):
+                os.makedirs(self.path, 0700)
+            #written aside and renamed, a kill never leaves half a file
+            tmp = self.file(job) + ".tmp"
+            f = os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), "w")
+            try:
+                config.write(f)
+            finally:
+                f.close()
+            os.rename(tmp, self.file(job))
+        except (IOError, OSError), e:
+            self.parent._print(e)
+            if DEBUG:
+                self.parent._print('-'*60)
+                self.parent._print(traceback.format_exc())
+                self.parent._print('-'*60)
+        finally:
+            self.lock.release()
+
+    def remove(self, job):
+        self.lock.acquire()
+        try:
+            if os.path.exists(self.file(job)):
+                os.remove(self.file(job))
+        except OSError, e:
+            self.parent._print(e)
+        finally:
+            self.lock.release()
+
+    def load(self):
+        #the saved jobs, suspended
+        def keyid(x):
+            if x.isdigit():
+                return int(x)
+            return x or None
+        ret = []
+        if not os.path.isdir(self.path):
+            return ret
+        for i in sorted(os.listdir(self.path)):
+            (uid, ext) = os.path.splitext(i)
+            if ext != ".cfg":
+                continue
+            try:
+                config = ConfigParser.RawConfigParser()
+                config.read(os.path.join(self.path, i))
+                dec = lambda section, name: base64.b64decode(config.get(section, name))
+                targets = None
+                keyids = None
+                pws = []
+                num = 0
+                while config.has_section("target %d" % num):
+                    section = "target %d" % num
+                    targets = (targets or []) + [ (dec(section, "digest"), dec(section, "data")) ]
+                    keyids = (keyids or []) + [ keyid(config.get(section, "keyid")) ]
+                    pws.append(config.has_option(section, "pw") and dec(section, "pw") or None)
+                    num += 1
+                if targets:
+                    (digest, data) = (None, None)
+                else:
+                    (digest, data) = (dec("job", "digest"), dec("job", "data"))
+                    keyids = keyid(config.get("job", "keyid"))
+                checkpoint = (  config.getfloat("checkpoint", "position"),
+                                config.getint("checkpoint", "offset"),
+                                dec("checkpoint", "next"),
+                                config.getint("checkpoint", "tried") )
+                total = config.getfloat("checkpoint", "total")
+                job = crack_job(dec("job", "algorithm"), digest, data, config.getint("job", "bf"),
+                                config.getint("job", "full"), dec("job", "wl"), config.getint("job", "threads"),
+                                config.getint("job", "priority"), dec("job", "name"), mask=dec("job", "mask"),
+                                rules=dec("job", "rules"), targets=targets, keyid=keyids, checkpoint=checkpoint)
+            except (ConfigParser.Error, ValueError, TypeError), e:
+                self.parent._print("Cant load checkpoint %s: %s" % (i, e))
+                continue
+            job.uid = uid
+            job.pws = pws
+            job.seen = [ pw is not None for pw in pws ]
+            job.total = total
+            job.state = CRACK_SUSPENDED
+            ret.append(job)
+        return ret
+
+class crack_manager(threading.Thread):
+    #runs the crack_jobs of all modules on a fixed number of cpus. jobs wait
+    #in priority order (fifo within a priority) until enough cpus are free
+    #for their thread count, every running job gets its own thread which
+    #spends its time in the binding without the GIL. with checkpoints the
+    #position of the running jobs gets saved every checkpoint_interval
+    #seconds and when they get cancelled, the saved ones show up suspended
+    #in the history and resume() continues them where they stopped
+    def __init__(self, parent, size=0, interval=1.0, potfile=None, checkpoints=None, checkpoint_interval=60.0):
+        threading.Thread.__init__(self)
+        self.parent = parent
+        self.size = size or self.cpu_count()
+        self.interval = interval
+        self.potfile = potfile
+        self.checkpoints = checkpoints
+        self.checkpoint_interval = checkpoint_interval
+        self.queue = []
+        self.jobs = []
+        self.history = collections.deque(maxlen=50)
+        if self.checkpoints:
+            for job in self.checkpoints.load():
+                job.manager = self
+                self.history.append(job)
+        self.free = self.size
+        self.seq = 0
+        self.cond = threading.Condition()
+        self.running = True
+
+    @staticmethod
+    def cpu_count():
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+    def submit(self, job):
+        if job.algorithm not in CRACK_ALGORITHMS:
+            raise ValueError("unknown cracking algorithm %s" % job.algorithm)
+        (func, threaded) = CRACK_ALGORITHMS[job.algorithm]
+        if not threaded:
+            job.threads = 1
+        job.threads = max(1, min(job.threads or self.size, self.size))
+        job.manager = self
+        job.state = CRACK_QUEUED
+        self.cond.acquire()
+        try:
+            heapq.heappush(self.queue, (-job.priority, self.seq, job))
+            self.seq += 1
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+        return job
+
+    def cancel(self, job):
+        self.cond.acquire()
+        try:
+            if job.state == CRACK_QUEUED:
+                self.queue = [ i for i in self.queue if i[2] is not job ]
+                heapq.heapify(self.queue)
+                job.state = CRACK_CANCELLED
+                job.finished = time.time()
+                self.history.append(job)
+            elif job.state == CRACK_RUNNING:
+                job.cancelled = True
+                #the binding threads see the flag the next time they claim work
+                struct.pack_into("i", job.status, 0, 1)
+                return
+            else:
+                return
+        finally:
+            self.cond.release()
+        self.keep(job)
+        self.notify(job.done)
+
+    def resume(self, job):
+        #runs a cancelled, failed or suspended job again from its checkpoint
+        self.cond.acquire()
+        try:
+            if not job.resumable():
+                raise ValueError("job %s has no checkpoint to resume at" % job.name)
+            if job in self.history:
+                self.history.remove(job)
+        finally:
+            self.cond.release()
+        job.rewind(job.checkpoint)
+        job.cancelled = False
+        job.error = None
+        job.pw = None
+        job.started = None
+        job.finished = None
+        return self.submit(job)
+
+    def discard(self, job):
+        #forgets the checkpoint of a job that isnt running
+        if job.is_alive():
+            return
+        job.checkpoint = None
+        if self.checkpoints:
+            self.checkpoints.remove(job)
+
+    def keep(self, job):
+        #a stopped job keeps its checkpoint if it can be resumed
+        if not self.checkpoints:
+            return
+        if job.resumable():
+            self.checkpoints.save(job)
+        else:
+            self.checkpoints.remove(job)
+
+    def run(self):
+        while self.running:
+            self.cond.acquire()
+            try:
+                while self.queue and self.queue[0][2].threads <= self.free:
+                    (prio, seq, job) = heapq.heappop(self.queue)
+                    self.free -= job.threads
+                    job.state = CRACK_RUNNING
+                    job.started = time.time()
+                    self.jobs.append(job)
+                    t = threading.Thread(target=self.run_job, args=(job,))
+                    t.daemon = True
+                    t.start()
+                self.cond.wait(self.interval)
+                running = [ (job, job.update()) for job in self.jobs ]
+            finally:
+                self.cond.release()
+            now = time.time()
+            for (job, hits) in running:
+                for i in hits:
+                    self.notify(job.hit, i)
+                self.notify(job.progress)
+                if self.checkpoints and job.checkpoint and now - job.checkpointed >= self.checkpoint_interval:
+                    job.checkpointed = now
+                    self.checkpoints.save(job)
+
+    def run_job(self, job):
+        (func, threaded) = CRACK_ALGORITHMS[job.algorithm]
+        try:
+            pw = func(job)
+            if job.targets:
+                #a resumed job doesnt find the ones it found before again
+                job.pws = [ new or old for (new, old) in zip(pw, job.pws) ]
+                pw = ([ i for i in job.pws if i is not None ] or [None])[0]
+            job.pw = pw
+        except Exception, e:
+            job.error = e
+            self.parent._print(e)
+            if DEBUG:
+                self.parent._print('-'*60)
+                self.parent._print(traceback.format_exc())
+                self.parent._print('-'*60)
+        self.cond.acquire()
+        try:
+            hits = job.update()
+            job.finished = time.time()
+            if job.error is not None:
+                job.state = CRACK_FAILED
+            #cancelled with targets left it can still be resumed for those
+            elif job.pw is not None and not (job.cancelled and None in job.pws):
+                job.state = CRACK_FOUND
+            elif job.cancelled:
+                job.state = CRACK_CANCELLED
+            else:
+                job.state = CRACK_NOT_FOUND
+            self.jobs.remove(job)
+            self.history.append(job)
+            self.free += job.threads
+            self.cond.notify_all()
+        finally:
+            self.cond.release()
+        if self.potfile:
+            for (keyid, pw) in job.secrets():
+                self.potfile.add(job.algorithm, keyid, pw)
+        self.keep(job)
+        for i in hits:
+            self.notify(job.hit, i)
+        self.notify(job.done)
+
+    def notify(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception, e:
+            self.parent._print(e)
+            if DEBUG:
+                self.parent._print('-'*60)
+                self.parent._print(traceback.format_exc())
+                self.parent._print('-'*60)
+
+    def get_jobs(self, finished=False):
+        #running jobs first, then the queue in the order it will be run and
+        #the last finished ones, newest first
+        self.cond.acquire()
+        try:
+            ret = list(self.jobs) + [ i[2] for i in sorted(self.queue) ]
+            if finished:
+                ret += reversed(self.history)
+            return ret
+        finally:
+            self.cond.release()
+
+    def quit(self, timeout=5.0):
+        #the running jobs get a moment to stop, so their checkpoints are saved
+        for job in self.get_jobs():
+            self.cancel(job)
+        self.cond.acquire()
+        self.running = False
+        self.cond.notify_all()
+        end = time.time() + timeout
+        while self.jobs and time.time() < end:
+            self.cond.wait(0.1)
+        self.cond.release()
 
 class codename_loki(object):
     def __init__(self):
@@ -277,12 +2044,43 @@ class codename_loki(object):
         self.devices = {}
         self.ui = None
 
-        self.eth_checks = []
-        self.ip_checks = []
-        self.ip6_checks = []
-        self.tcp_checks = []
-        self.udp_checks = []
-        self.sctp_checks = []
+        self.pcap_blocking = True
+        self.pcap_batch_size = 64
+        self.pcap_poll_timeout = 100
+        self.pcap_autofilter = True
+        self.pcap_ring = False
+        self.ring_block_size = 1024
+        self.ring_block_count = 64
+        self.replay_mode = REPLAY_MAX_SPEED
+        self.replay_speed = 1.0
+        self.replay_batch_size = 1024
+        self.pcap_workers = False
+        self.worker_queue_size = 1000
+        self.worker_queue_policy = QUEUE_DROP_OLDEST
+        self.workers = {}
+        self.workers_running = False
+        self.tx_queue_size = 1000
+        self.tx_ring = False
+        self.tx_ring_frames = 1024
+        self.tx_rate_pps = 0
+        self.tx_scheduling = TX_STRICT
+        self.tx_rate_bps = 0
+        self.instrument = False
+        self.dispatch_stats = dispatch_stats()
+        self.stats_file = None
+        self.stats_interval = 10
+        self.stats_thread = None
+        self.crack_pool_size = 0
+        self.cracker = None
+        self.potfile = None
+        self.bpf_filter = None
+
+        self.eth_checks = dispatch_table()
+        self.ip_checks = dispatch_table()
+        self.ip6_checks = dispatch_table()
+        self.tcp_checks = dispatch_table()
+        self.udp_checks = dispatch_table()
+        self.sctp_checks = dispatch_table()
 
         self.module_active = []
 
@@ -290,6 +2088,9 @@ class codename_loki(object):
         self._print("This is %s version %s by Daniel Mende - dmende@ernw.de" % (self.__class__.__name__, VERSION))
         self._print("Running on %s" % (PLATFORM))
 
+        self.potfile = crack_potfile(self, CONFIG_PATH + "/potfile")
+        self.cracker = crack_manager(self, self.crack_pool_size, potfile=self.potfile, checkpoints=crack_checkpoints(self, CONFIG_PATH + "/checkpoints"))
+        self.cracker.start()
         self.load_all_modules()
         self.init_all_modules()
 
@@ -341,23 +2142,17 @@ class codename_loki(object):
         self.init_module_ui(mod)
         try:
             if "get_eth_checks" in dir(mod):
-                (check, call) = mod.get_eth_checks()
-                self.eth_checks.append((check, call, mod.name))
+                self.eth_checks.add(mod.name, *mod.get_eth_checks())
             if "get_ip_checks" in dir(mod):
-                (check, call) = mod.get_ip_checks()
-                self.ip_checks.append((check, call, mod.name))
+                self.ip_checks.add(mod.name, *mod.get_ip_checks())
             if "get_ip6_checks" in dir(mod):
-                (check, call) = mod.get_ip6_checks()
-                self.ip6_checks.append((check, call, mod.name))
+                self.ip6_checks.add(mod.name, *mod.get_ip6_checks())
             if "get_tcp_checks" in dir(mod):
-                (check, call) = mod.get_tcp_checks()
-                self.tcp_checks.append((check, call, mod.name))
+                self.tcp_checks.add(mod.name, *mod.get_tcp_checks())
             if "get_udp_checks" in dir(mod):
-                (check, call) = mod.get_udp_checks()
-                self.udp_checks.append((check, call, mod.name))
+                self.udp_checks.add(mod.name, *mod.get_udp_checks())
             if "get_sctp_checks" in dir(mod):
-                (check, call) = mod.get_sctp_checks()
-                self.sctp_checks.append((check, call, mod.name))
+                self.sctp_checks.add(mod.name, *mod.get_sctp_checks())
             if "set_config_dict" in dir(mod):
                 cdict = self.load_mod_config(module)
                 if cdict:
@@ -371,6 +2166,9 @@ class codename_loki(object):
             self._print("failed to start module %s" % mod)
         else:
             self.modules[module] = (mod, True)
+            self.update_bpf_filter()
+            if self.workers_running:
+                self.start_worker(mod)
     
     def init_module_ui(self, mod):
 		pass
@@ -453,10 +2251,28 @@ class codename_loki(object):
             try:
                 if "set_dnet" in dir(mod):
                     if self.dnet_thread:
-                        mod.set_dnet(self.dnet_thread)
+                        mod.set_dnet(dnet_sender(self.dnet_thread, mod.name, getattr(mod, "tx_class", TX_INTERACTIVE)))
                     else:
                         mod.set_dnet(dnet_thread_offline())
                     
+            except Exception, e:
+                self._print(e)
+                if DEBUG:
+                    self._print('-'*60)
+                    self._print(traceback.format_exc())
+                    self._print('-'*60)
+            try:
+                if "set_cracker" in dir(mod):
+                    mod.set_cracker(self.cracker)
+            except Exception, e:
+                self._print(e)
+                if DEBUG:
+                    self._print('-'*60)
+                    self._print(traceback.format_exc())
+                    self._print('-'*60)
+            try:
+                if "set_potfile" in dir(mod):
+                    mod.set_potfile(self.potfile)
             except Exception, e:
                 self._print(e)
                 if DEBUG:
@@ -497,41 +2313,187 @@ class codename_loki(object):
         mod.shut_mod()
         self.shut_module_ui(mod)
         if "get_eth_checks" in dir(mod):
-            for i in self.eth_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.eth_checks.remove(i)
+            self.eth_checks.remove(mod.name)
         if "get_ip_checks" in dir(mod):
-            for i in self.ip_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.ip_checks.remove(i)
+            self.ip_checks.remove(mod.name)
         if "get_ip6_checks" in dir(mod):
-            for i in self.ip6_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.ip6_checks.remove(i)
+            self.ip6_checks.remove(mod.name)
         if "get_tcp_checks" in dir(mod):
-            for i in self.tcp_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.tcp_checks.remove(i)
+            self.tcp_checks.remove(mod.name)
         if "get_udp_checks" in dir(mod):
-            for i in self.udp_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.udp_checks.remove(i)
+            self.udp_checks.remove(mod.name)
         if "get_sctp_checks" in dir(mod):
-            for i in self.sctp_checks:
-                (check, call, name) = i
-                if name == mod.name:
-                    self.sctp_checks.remove(i)
+            self.sctp_checks.remove(mod.name)
+        self.stop_worker(mod.name)
         self.modules[module] = (mod, False)
         if delete:
             del self.modules[modules]
+        self.update_bpf_filter()
     
     def shut_module_ui(self, mod):
 		pass
+
+    def start_workers(self):
+        self.workers_running = True
+        for i in self.modules:
+            (mod, enabled) = self.modules[i]
+            if enabled:
+                self.start_worker(mod)
+
+    def start_worker(self, mod):
+        #modules may set queue_size and queue_policy to override the defaults
+        attrs = dir(mod)
+        if not [ j for j in CHECK_HOOKS if j in attrs ] or mod.name in self.workers:
+            return
+        size = getattr(mod, "queue_size", self.worker_queue_size)
+        policy = getattr(mod, "queue_policy", self.worker_queue_policy)
+        if policy not in QUEUE_POLICIES:
+            self.log("Unknown queue policy '%s' for %s, using %s" % (policy, mod.name, self.worker_queue_policy))
+            policy = self.worker_queue_policy
+        worker = module_worker(self, mod.name, size, policy)
+        worker.setDaemon(True)
+        worker.start()
+        self.workers[mod.name] = worker
+
+    def stop_worker(self, name):
+        worker = self.workers.pop(name, None)
+        if worker is None:
+            return
+        worker.quit()
+        worker.join()
+        (depth, size, enqueued, handled, dropped, max_depth) = worker.stats()
+        if dropped:
+            self.log("Queue of %s handled %d packets, dropped %d, max depth %d/%d" % (name, handled, dropped, max_depth, size))
+
+    def stop_workers(self):
+        self.workers_running = False
+        for i in self.workers.keys():
+            self.stop_worker(i)
+
+    def get_queue_stats(self):
+        #module name -> (depth, size, enqueued, handled, dropped, max depth)
+        ret = {}
+        for (name, worker) in self.workers.items():
+            ret[name] = worker.stats()
+        return ret
+
+    def get_dispatch_stats(self):
+        #dict with the per module dispatch statistics, the capture counters
+        #(received, dropped, ring fill) and the worker queue counters
+        capture = None
+        if self.pcap_thread:
+            try:
+                capture = self.pcap_thread.stats()
+            except Exception, e:
+                capture = None
+        tx = None
+        rates = {}
+        classes = {}
+        if self.dnet_thread:
+            tx = self.dnet_thread.stats()
+            rates = self.dnet_thread.scheduler.stats()
+            classes = self.dnet_thread.get_class_stats()
+        return {    "dispatch"  :   self.dispatch_stats.snapshot(),
+                    "capture"   :   capture,
+                    "tx"        :   tx,
+                    "rates"     :   rates,
+                    "classes"   :   classes,
+                    "queues"    :   self.get_queue_stats()
+                    }
+
+    def format_dispatch_stats(self, stats=None):
+        if stats is None:
+            stats = self.get_dispatch_stats()
+        lines = []
+        capture = stats["capture"]
+        if capture:
+            (received, dropped, fill) = capture
+            line = "capture: %d received, %d dropped" % (received, dropped)
+            if fill is not None:
+                line += ", ring %d%% full" % fill
+            lines.append(line)
+        tx = stats.get("tx")
+        if tx:
+            (depth, size, enqueued, sent, dropped, errors, max_depth) = tx
+            lines.append("transmit: %d/%d queued, %d sent, %d dropped, %d errors, max depth %d" % (depth, size, sent, dropped, errors, max_depth))
+        for (cls, (depth, enqueued, sent, dropped, max_depth, avg, max, hist)) in sorted(stats.get("classes", {}).items(), key=lambda x: TX_CLASSES.index(x[0])):
+            lines.append("transmit %s: %d queued, %d sent, %d dropped, max depth %d, latency avg %.1fus max %.1fus [%s]" % (cls, depth, sent, dropped, max_depth, avg * 1000000, max * 1000000, " ".join([ "%s:%d" % i for i in zip(dispatch_stats.BUCKET_NAMES, hist) ])))
+        for (name, (pps, bps, frames, delayed, dropped, waited)) in sorted(stats.get("rates", {}).items()):
+            lines.append("rate %s: %s pps, %s bps, %d frames, %d delayed, %d dropped, %.1fs waited" % (name or "global", pps or "-", bps or "-", frames, delayed, dropped, waited))
+        for (name, (depth, size, enqueued, handled, dropped, max_depth)) in sorted(stats["queues"].items()):
+            lines.append("queue %s: %d/%d queued, %d handled, %d dropped, max depth %d" % (name, depth, size, handled, dropped, max_depth))
+        lines.append("\t".join(["module", "hook", "layer", "calls", "matches", "avg(us)", "max(us)"] + dispatch_stats.BUCKET_NAMES))
+        for ((name, hook, layer), (calls, matches, total, max, hist)) in sorted(stats["dispatch"].items()):
+            lines.append("\t".join([name, hook, layer, str(calls), str(matches), "%.1f" % (total * 1000000 / calls), "%.1f" % (max * 1000000)] + [ str(i) for i in hist ]))
+        return lines
+
+    def reset_dispatch_stats(self):
+        self.dispatch_stats.reset()
+
+    def get_crack_jobs(self, finished=True):
+        if not self.cracker:
+            return []
+        return self.cracker.get_jobs(finished)
+
+    def resume_crack_job(self, job):
+        try:
+            self.cracker.resume(job)
+        except ValueError, e:
+            self._print(e)
+
+    def discard_crack_job(self, job):
+        self.cracker.discard(job)
+
+    def set_tx_rate(self, pps=None, bps=None):
+        #global transmit limit, 0 for unlimited
+        if pps is not None:
+            self.tx_rate_pps = pps
+        if bps is not None:
+            self.tx_rate_bps = bps
+        if self.dnet_thread:
+            self.dnet_thread.set_rate(None, self.tx_rate_pps, self.tx_rate_bps)
+
+    def set_stats_file(self, filename, interval=None):
+        #dump a snapshot to filename every interval seconds, None stops it
+        if interval:
+            self.stats_interval = interval
+        self.stats_file = filename
+        if self.stats_thread:
+            self.stats_thread.quit()
+            self.stats_thread = None
+        if filename:
+            self.stats_thread = stats_thread(self, filename, self.stats_interval)
+            self.stats_thread.setDaemon(True)
+            self.stats_thread.start()
+
+    def update_bpf_filter(self):
+        #OR the bpf fragments of all enabled modules which inspect packets,
+        #once plain and once behind a dot1q tag. a single module without
+        #fragment needs all traffic and disables the filter
+        fragments = []
+        for i in self.modules:
+            (mod, enabled) = self.modules[i]
+            if not enabled:
+                continue
+            attrs = dir(mod)
+            if not [ j for j in CHECK_HOOKS if j in attrs ]:
+                continue
+            fragment = None
+            if "get_bpf_filter" in attrs:
+                fragment = mod.get_bpf_filter()
+            if not fragment:
+                fragments = None
+                break
+            fragments.append("(%s)" % fragment)
+        filter = None
+        if fragments and self.pcap_autofilter:
+            fragments.sort()
+            filter = " or ".join(fragments)
+            filter = "%s or (vlan and (%s))" % (filter, filter)
+        if filter != self.bpf_filter:
+            self.bpf_filter = filter
+            if self.pcap_thread:
+                self.pcap_thread.set_filter(filter)
         
     def update_devices(self):
         self.devices = {}
@@ -586,6 +2548,10 @@ class codename_loki(object):
                 self.pcap_thread.quit()
             if self.dnet_thread:
                 self.dnet_thread.quit()
+            if self.stats_thread:
+                self.stats_thread.quit()
+            if self.cracker:
+                self.cracker.quit()
             if PLATFORM == "Linux" and self.netcfg_configured:
                 self.netcfg.unexecute_l3()
                 self.netcfg.unexecute_l2()
@@ -1227,6 +1227,184 @@ class log_window(gtk.Window):
         vbox.pack_start(buttonbox, False, False, 0)
         self.add(vbox)
 
+class stats_window(gtk.Window):
+    MODULE_ROW = 0
+    HOOK_ROW = 1
+    LAYER_ROW = 2
+    CALLS_ROW = 3
+    MATCHES_ROW = 4
+    AVG_ROW = 5
+    MAX_ROW = 6
+    HIST_ROW = 7
+
+    def __init__(self, parent):
+        gtk.Window.__init__(self)
+        self.par = parent
+        self.set_title("Dispatch statistics")
+        self.set_default_size(700, 400)
+        self.liststore = gtk.ListStore(str, str, str, int, int, str, str, str)
+        treeview = gtk.TreeView(self.liststore)
+        for (title, row) in [   ("Module", self.MODULE_ROW), ("Hook", self.HOOK_ROW), ("Layer", self.LAYER_ROW),
+                                ("Calls", self.CALLS_ROW), ("Matches", self.MATCHES_ROW), ("Avg (us)", self.AVG_ROW),
+                                ("Max (us)", self.MAX_ROW), (" ".join(loki.dispatch_stats.BUCKET_NAMES), self.HIST_ROW) ]:
+            column = gtk.TreeViewColumn()
+            column.set_title(title)
+            render_text = gtk.CellRendererText()
+            column.pack_start(render_text, expand=True)
+            column.add_attribute(render_text, 'text', row)
+            column.set_sort_column_id(row)
+            treeview.append_column(column)
+        scrolledwindow = gtk.ScrolledWindow()
+        scrolledwindow.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
+        scrolledwindow.add(treeview)
+        self.label = gtk.Label()
+        self.label.set_alignment(0, 0)
+        instrument_checkbutton = gtk.CheckButton("Instrument dispatcher")
+        instrument_checkbutton.set_active(self.par.instrument)
+        instrument_checkbutton.connect('toggled', self.on_instrument_toggled)
+        self.file_entry = gtk.Entry()
+        if self.par.stats_file:
+            self.file_entry.set_text(self.par.stats_file)
+        self.interval_spinbutton = gtk.SpinButton()
+        self.interval_spinbutton.set_range(1, 3600)
+        self.interval_spinbutton.set_value(self.par.stats_interval)
+        self.interval_spinbutton.set_increments(1, 10)
+        self.interval_spinbutton.set_numeric(True)
+        dump_button = gtk.Button("Dump")
+        dump_button.connect('clicked', self.on_dump_clicked)
+        hbox = gtk.HBox(False, 0)
+        hbox.pack_start(instrument_checkbutton, False, False, 0)
+        hbox.pack_start(gtk.Label("Snapshot file"), False, False, 0)
+        hbox.pack_start(self.file_entry, True, True, 0)
+        hbox.pack_start(gtk.Label("every (s)"), False, False, 0)
+        hbox.pack_start(self.interval_spinbutton, False, False, 0)
+        hbox.pack_start(dump_button, False, False, 0)
+        reset = gtk.Button("Reset")
+        reset.connect('clicked', self.on_reset_clicked)
+        close = gtk.Button(gtk.STOCK_CLOSE)
+        close.set_use_stock(True)
+        close.connect_object("clicked", gtk.Widget.destroy, self)
+        buttonbox = gtk.HButtonBox()
+        buttonbox.pack_start(reset)
+        buttonbox.pack_start(close)
+        vbox = gtk.VBox()
+        vbox.pack_start(self.label, False, False, 0)
+        vbox.pack_start(scrolledwindow, True, True, 0)
+        vbox.pack_start(hbox, False, False, 0)
+        vbox.pack_start(buttonbox, False, False, 0)
+        self.add(vbox)
+        self.update()
+        self.timeout = gobject.timeout_add(1000, self.update)
+        self.connect('destroy', self.on_destroy)
+
+    def update(self):
+        stats = self.par.get_dispatch_stats()
+        lines = [ i for i in self.par.format_dispatch_stats(stats) if not "\t" in i ]
+        if not lines:
+            lines = [ "no capture running" ]
+        self.label.set_text("\n".join(lines))
+        self.liststore.clear()
+        for ((name, hook, layer), (calls, matches, total, max, hist)) in sorted(stats["dispatch"].items()):
+            self.liststore.append([name, hook, layer, calls, matches, "%.1f" % (total * 1000000 / calls), "%.1f" % (max * 1000000), " ".join([ str(i) for i in hist ])])
+        return True
+
+    def on_instrument_toggled(self, button):
+        self.par.instrument = button.get_active()
+
+    def on_dump_clicked(self, button):
+        filename = self.file_entry.get_text()
+        if not filename:
+            filename = None
+        self.par.set_stats_file(filename, self.interval_spinbutton.get_value_as_int())
+
+    def on_reset_clicked(self, button):
+        self.par.reset_dispatch_stats()
+        self.update()
+
+    def on_destroy(self, window):
+        gobject.source_remove(self.timeout)
+
+class crack_window(gtk.Window):
+    def __init__(self, parent):
+        gtk.Window.__init__(self)
+        self.par = parent
+        self.set_title("Cracking jobs")
+        self.set_default_size(800, 300)
+        self.jobs = []
+        self.liststore = gtk.ListStore(*[str] * len(loki.crack_job.COLUMNS))
+        self.treeview = gtk.TreeView(self.liststore)
+        self.treeview.get_selection().set_mode(gtk.SELECTION_MULTIPLE)
+        for (row, title) in enumerate(loki.crack_job.COLUMNS):
+            column = gtk.TreeViewColumn()
+            column.set_title(title.capitalize())
+            render_text = gtk.CellRendererText()
+            column.pack_start(render_text, expand=True)
+            column.add_attribute(render_text, 'text', row)
+            self.treeview.append_column(column)
+        scrolledwindow = gtk.ScrolledWindow()
+        scrolledwindow.set_policy(gtk.POLICY_AUTOMATIC, gtk.POLICY_AUTOMATIC)
+        scrolledwindow.add(self.treeview)
+        self.label = gtk.Label()
+        self.label.set_alignment(0, 0)
+        cancel = gtk.Button("Cancel job")
+        cancel.connect('clicked', self.on_cancel_clicked)
+        resume = gtk.Button("Resume job")
+        resume.connect('clicked', self.on_resume_clicked)
+        discard = gtk.Button("Discard checkpoint")
+        discard.connect('clicked', self.on_discard_clicked)
+        close = gtk.Button(gtk.STOCK_CLOSE)
+        close.set_use_stock(True)
+        close.connect_object("clicked", gtk.Widget.destroy, self)
+        buttonbox = gtk.HButtonBox()
+        buttonbox.pack_start(cancel)
+        buttonbox.pack_start(resume)
+        buttonbox.pack_start(discard)
+        buttonbox.pack_start(close)
+        vbox = gtk.VBox()
+        vbox.pack_start(self.label, False, False, 0)
+        vbox.pack_start(scrolledwindow, True, True, 0)
+        vbox.pack_start(buttonbox, False, False, 0)
+        self.add(vbox)
+        self.update()
+        self.timeout = gobject.timeout_add(1000, self.update)
+        self.connect('destroy', self.on_destroy)
+
+    def update(self):
+        if self.par.cracker:
+            self.label.set_text("%d of %d cpus in use" % (self.par.cracker.size - self.par.cracker.free, self.par.cracker.size))
+        (model, paths) = self.treeview.get_selection().get_selected_rows()
+        selected = [ self.jobs[i[0]] for i in paths if i[0] < len(self.jobs) ]
+        self.jobs = self.par.get_crack_jobs()
+        self.liststore.clear()
+        for job in self.jobs:
+            iter = self.liststore.append(job.format())
+            if job in selected:
+                self.treeview.get_selection().select_iter(iter)
+        return True
+
+    def on_cancel_clicked(self, button):
+        (model, paths) = self.treeview.get_selection().get_selected_rows()
+        for i in paths:
+            self.jobs[i[0]].cancel()
+        self.update()
+
+    def on_resume_clicked(self, button):
+        #cancelled, failed or suspended jobs continue at their checkpoint
+        (model, paths) = self.treeview.get_selection().get_selected_rows()
+        for i in paths:
+            if self.jobs[i[0]].resumable():
+                self.par.resume_crack_job(self.jobs[i[0]])
+        self.update()
+
+    def on_discard_clicked(self, button):
+        (model, paths) = self.treeview.get_selection().get_selected_rows()
+        for i in paths:
+            self.par.discard_crack_job(self.jobs[i[0]])
+        self.update()
+
+    def on_destroy(self, window):
+        gobject.source_remove(self.timeout)
+
 class module_preferences_window(gtk.Window):
     NAME_ROW = 0
     VALUE_ROW = 1
@@ -1433,6 +1611,15 @@ class preference_window(gtk.Window):
         frame = gtk.Frame("Wordlist")
         frame.add(filechooser)
         vbox.pack_start(frame, expand=False, fill=False)
+        rules_combobox = gtk.combo_box_new_text()
+        for (i, (name, rules)) in enumerate(loki.CRACK_RULES):
+            rules_combobox.append_text(name)
+            if rules == self.par.wordlist_rules:
+                rules_combobox.set_active(i)
+        rules_combobox.connect('changed', self.rules_callback)
+        frame = gtk.Frame("Wordlist rules")
+        frame.add(rules_combobox)
+        vbox.pack_start(frame, expand=False, fill=False)
         vbox2 = gtk.VBox()
         bf_checkbutton = gtk.CheckButton("Use Bruteforce")
         bf_checkbutton.set_active(self.par.bruteforce)
@@ -1445,6 +1632,13 @@ class preference_window(gtk.Window):
         frame = gtk.Frame("Bruteforce")
         frame.add(vbox2)
         vbox.pack_start(frame, expand=False, fill=False)
+        mask_entry = gtk.Entry()
+        mask_entry.set_text(self.par.bruteforce_mask)
+        mask_entry.set_tooltip_text("Empty for all candidates up to 16 characters, else one charset per position:\n?l ?u ?d ?s ?a, [a-f0-9] or a literal character, ?? for a ?.\nLike Cisco?d?d?d?d!")
+        mask_entry.connect('changed', self.mask_callback)
+        frame = gtk.Frame("Bruteforce mask")
+        frame.add(mask_entry)
+        vbox.pack_start(frame, expand=False, fill=False)
         threads_spinbutton = gtk.SpinButton()
         threads_spinbutton.set_range(1, 1024)
         threads_spinbutton.set_value(self.par.bruteforce_threads)
@@ -1460,6 +1654,160 @@ class preference_window(gtk.Window):
         scrolledwindow.set_property("hscrollbar-policy", gtk.POLICY_AUTOMATIC)
         scrolledwindow.add_with_viewport(vbox)
         notebook.append_page(scrolledwindow, tab_label=gtk.Label("Bruteforce"))
+
+        vbox = gtk.VBox(False, 0)
+        blocking_checkbutton = gtk.CheckButton("Block on capture device")
+        blocking_checkbutton.set_active(self.par.pcap_blocking)
+        blocking_checkbutton.connect('toggled', self.blocking_callback)
+        frame = gtk.Frame("Capture mode")
+        frame.add(blocking_checkbutton)
+        vbox.pack_start(frame, expand=False, fill=False)
+        batch_spinbutton = gtk.SpinButton()
+        batch_spinbutton.set_range(1, 4096)
+        batch_spinbutton.set_value(self.par.pcap_batch_size)
+        batch_spinbutton.set_increments(1, 64)
+        batch_spinbutton.set_numeric(True)
+        batch_spinbutton.connect('value-changed', self.batch_callback)
+        frame = gtk.Frame("Batch size")
+        frame.add(batch_spinbutton)
+        vbox.pack_start(frame, expand=False, fill=False)
+        timeout_spinbutton = gtk.SpinButton()
+        timeout_spinbutton.set_range(1, 1000)
+        timeout_spinbutton.set_value(self.par.pcap_poll_timeout)
+        timeout_spinbutton.set_increments(1, 10)
+        timeout_spinbutton.set_numeric(True)
+        timeout_spinbutton.connect('value-changed', self.timeout_callback)
+        frame = gtk.Frame("Poll timeout (ms)")
+        frame.add(timeout_spinbutton)
+        vbox.pack_start(frame, expand=False, fill=False)
+        autofilter_checkbutton = gtk.CheckButton("Filter for active modules in kernel")
+        autofilter_checkbutton.set_active(self.par.pcap_autofilter)
+        autofilter_checkbutton.connect('toggled', self.autofilter_callback)
+        frame = gtk.Frame("Capture filter")
+        frame.add(autofilter_checkbutton)
+        vbox.pack_start(frame, expand=False, fill=False)
+        ring_checkbutton = gtk.CheckButton("Use TPACKET_V3 ring (Linux)")
+        ring_checkbutton.set_active(self.par.pcap_ring)
+        ring_checkbutton.connect('toggled', self.ring_callback)
+        ring_spinbutton = gtk.SpinButton()
+        ring_spinbutton.set_range(2, 1024)
+        ring_spinbutton.set_value(self.par.ring_block_count)
+        ring_spinbutton.set_increments(1, 16)
+        ring_spinbutton.set_numeric(True)
+        ring_spinbutton.connect('value-changed', self.ring_blocks_callback)
+        ring_vbox = gtk.VBox(False, 0)
+        ring_vbox.pack_start(ring_checkbutton, expand=False, fill=False)
+        ring_hbox = gtk.HBox(False, 0)
+        ring_hbox.pack_start(gtk.Label("Blocks of %d KiB" % self.par.ring_block_size), expand=False, fill=False)
+        ring_hbox.pack_start(ring_spinbutton, expand=False, fill=False)
+        ring_vbox.pack_start(ring_hbox, expand=False, fill=False)
+        frame = gtk.Frame("Capture backend")
+        frame.add(ring_vbox)
+        vbox.pack_start(frame, expand=False, fill=False)
+        workers_checkbutton = gtk.CheckButton("Per module worker queues")
+        workers_checkbutton.set_active(self.par.pcap_workers)
+        workers_checkbutton.connect('toggled', self.workers_callback)
+        queue_spinbutton = gtk.SpinButton()
+        queue_spinbutton.set_range(1, 100000)
+        queue_spinbutton.set_value(self.par.worker_queue_size)
+        queue_spinbutton.set_increments(1, 100)
+        queue_spinbutton.set_numeric(True)
+        queue_spinbutton.connect('value-changed', self.queue_size_callback)
+        policy_combobox = gtk.combo_box_new_text()
+        for i in loki.QUEUE_POLICIES:
+            policy_combobox.append_text(i)
+        policy_combobox.set_active(loki.QUEUE_POLICIES.index(self.par.worker_queue_policy))
+        policy_combobox.connect('changed', self.queue_policy_callback)
+        workers_vbox = gtk.VBox(False, 0)
+        workers_vbox.pack_start(workers_checkbutton, expand=False, fill=False)
+        workers_hbox = gtk.HBox(False, 0)
+        workers_hbox.pack_start(gtk.Label("Queue size"), expand=False, fill=False)
+        workers_hbox.pack_start(queue_spinbutton, expand=False, fill=False)
+        workers_hbox.pack_start(gtk.Label("When full"), expand=False, fill=False)
+        workers_hbox.pack_start(policy_combobox, expand=False, fill=False)
+        workers_vbox.pack_start(workers_hbox, expand=False, fill=False)
+        frame = gtk.Frame("Module processing")
+        frame.add(workers_vbox)
+        vbox.pack_start(frame, expand=False, fill=False)
+        replay_combobox = gtk.combo_box_new_text()
+        for i in loki.REPLAY_MODES:
+            replay_combobox.append_text(i)
+        replay_combobox.set_active(loki.REPLAY_MODES.index(self.par.replay_mode))
+        replay_combobox.connect('changed', self.replay_mode_callback)
+        speed_spinbutton = gtk.SpinButton(digits=2)
+        speed_spinbutton.set_range(0.01, 1000)
+        speed_spinbutton.set_value(self.par.replay_speed)
+        speed_spinbutton.set_increments(0.5, 10)
+        speed_spinbutton.set_numeric(True)
+        speed_spinbutton.connect('value-changed', self.replay_speed_callback)
+        replay_hbox = gtk.HBox(False, 0)
+        replay_hbox.pack_start(replay_combobox, expand=False, fill=False)
+        replay_hbox.pack_start(gtk.Label("Speed"), expand=False, fill=False)
+        replay_hbox.pack_start(speed_spinbutton, expand=False, fill=False)
+        frame = gtk.Frame("Offline replay")
+        frame.add(replay_hbox)
+        vbox.pack_start(frame, expand=False, fill=False)
+        tx_queue_spinbutton = gtk.SpinButton()
+        tx_queue_spinbutton.set_range(1, 100000)
+        tx_queue_spinbutton.set_value(self.par.tx_queue_size)
+        tx_queue_spinbutton.set_increments(1, 100)
+        tx_queue_spinbutton.set_numeric(True)
+        tx_queue_spinbutton.connect('value-changed', self.tx_queue_size_callback)
+        tx_ring_checkbutton = gtk.CheckButton("Transmit through TPACKET_V2 ring (Linux)")
+        tx_ring_checkbutton.set_active(self.par.tx_ring)
+        tx_ring_checkbutton.connect('toggled', self.tx_ring_callback)
+        tx_ring_spinbutton = gtk.SpinButton()
+        tx_ring_spinbutton.set_range(8, 65536)
+        tx_ring_spinbutton.set_value(self.par.tx_ring_frames)
+        tx_ring_spinbutton.set_increments(8, 256)
+        tx_ring_spinbutton.set_numeric(True)
+        tx_ring_spinbutton.connect('value-changed', self.tx_ring_frames_callback)
+        tx_vbox = gtk.VBox(False, 0)
+        tx_hbox = gtk.HBox(False, 0)
+        tx_hbox.pack_start(gtk.Label("Queue size"), expand=False, fill=False)
+        tx_hbox.pack_start(tx_queue_spinbutton, expand=False, fill=False)
+        tx_vbox.pack_start(tx_hbox, expand=False, fill=False)
+        tx_vbox.pack_start(tx_ring_checkbutton, expand=False, fill=False)
+        tx_hbox = gtk.HBox(False, 0)
+        tx_hbox.pack_start(gtk.Label("Ring frames"), expand=False, fill=False)
+        tx_hbox.pack_start(tx_ring_spinbutton, expand=False, fill=False)
+        tx_vbox.pack_start(tx_hbox, expand=False, fill=False)
+        tx_pps_spinbutton = gtk.SpinButton()
+        tx_pps_spinbutton.set_range(0, 10000000)
+        tx_pps_spinbutton.set_value(self.par.tx_rate_pps)
+        tx_pps_spinbutton.set_increments(100, 10000)
+        tx_pps_spinbutton.set_numeric(True)
+        tx_pps_spinbutton.connect('value-changed', self.tx_pps_callback)
+        tx_bps_spinbutton = gtk.SpinButton()
+        tx_bps_spinbutton.set_range(0, 100000000000)
+        tx_bps_spinbutton.set_value(self.par.tx_rate_bps)
+        tx_bps_spinbutton.set_increments(1000000, 100000000)
+        tx_bps_spinbutton.set_numeric(True)
+        tx_bps_spinbutton.connect('value-changed', self.tx_bps_callback)
+        tx_hbox = gtk.HBox(False, 0)
+        tx_hbox.pack_start(gtk.Label("Limit (0 = none) pps"), expand=False, fill=False)
+        tx_hbox.pack_start(tx_pps_spinbutton, expand=False, fill=False)
+        tx_hbox.pack_start(gtk.Label("bps"), expand=False, fill=False)
+        tx_hbox.pack_start(tx_bps_spinbutton, expand=False, fill=False)
+        tx_vbox.pack_start(tx_hbox, expand=False, fill=False)
+        scheduling_combobox = gtk.combo_box_new_text()
+        for i in loki.TX_SCHEDULINGS:
+            scheduling_combobox.append_text(i)
+        scheduling_combobox.set_active(loki.TX_SCHEDULINGS.index(self.par.tx_scheduling))
+        scheduling_combobox.connect('changed', self.tx_scheduling_callback)
+        tx_hbox = gtk.HBox(False, 0)
+        tx_hbox.pack_start(gtk.Label("Priority classes"), expand=False, fill=False)
+        tx_hbox.pack_start(scheduling_combobox, expand=False, fill=False)
+        tx_vbox.pack_start(tx_hbox, expand=False, fill=False)
+        frame = gtk.Frame("Transmit")
+        frame.add(tx_vbox)
+        vbox.pack_start(frame, expand=False, fill=False)
+
+        scrolledwindow = gtk.ScrolledWindow()
+        scrolledwindow.set_property("vscrollbar-policy", gtk.POLICY_AUTOMATIC)
+        scrolledwindow.set_property("hscrollbar-policy", gtk.POLICY_AUTOMATIC)
+        scrolledwindow.add_with_viewport(vbox)
+        notebook.append_page(scrolledwindow, tab_label=gtk.Label("Capture"))
         
         vbox = gtk.VBox(False, 0)
         vbox.pack_start(notebook, True, True, 0)
@@ -1490,15 +1838,84 @@ class preference_window(gtk.Window):
     
     def wordlist_callback(self, button):
         self.par.wordlist = button.get_filename()
+
+    def rules_callback(self, combobox):
+        self.par.wordlist_rules = loki.CRACK_RULES[combobox.get_active()][1]
     
     def bf_callback(self, button):
         self.par.bruteforce = button.get_active()
     
     def bf_full_callback(self, button):
         self.par.bruteforce_full = button.get_active()
+
+    def mask_callback(self, entry):
+        self.par.bruteforce_mask = entry.get_text()
     
     def threads_callback(self, button):
-        self.par.threads = button.get_value_as_int()
+        self.par.bruteforce_threads = button.get_value_as_int()
+        return True
+
+    def blocking_callback(self, button):
+        self.par.pcap_blocking = button.get_active()
+
+    def batch_callback(self, button):
+        self.par.pcap_batch_size = button.get_value_as_int()
+        return True
+
+    def timeout_callback(self, button):
+        self.par.pcap_poll_timeout = button.get_value_as_int()
+        return True
+
+    def autofilter_callback(self, button):
+        self.par.pcap_autofilter = button.get_active()
+        self.par.update_bpf_filter()
+
+    def ring_callback(self, button):
+        self.par.pcap_ring = button.get_active()
+
+    def ring_blocks_callback(self, button):
+        self.par.ring_block_count = button.get_value_as_int()
+        return True
+
+    def workers_callback(self, button):
+        self.par.pcap_workers = button.get_active()
+
+    def tx_queue_size_callback(self, button):
+        self.par.tx_queue_size = button.get_value_as_int()
+        return True
+
+    def tx_ring_callback(self, button):
+        self.par.tx_ring = button.get_active()
+
+    def tx_ring_frames_callback(self, button):
+        self.par.tx_ring_frames = button.get_value_as_int()
+        return True
+
+    def tx_pps_callback(self, button):
+        self.par.set_tx_rate(pps=int(button.get_value()))
+        return True
+
+    def tx_bps_callback(self, button):
+        self.par.set_tx_rate(bps=int(button.get_value()))
+        return True
+
+    def tx_scheduling_callback(self, combobox):
+        self.par.tx_scheduling = loki.TX_SCHEDULINGS[combobox.get_active()]
+        if self.par.dnet_thread:
+            self.par.dnet_thread.scheduling = self.par.tx_scheduling
+
+    def queue_size_callback(self, button):
+        self.par.worker_queue_size = button.get_value_as_int()
+        return True
+
+    def queue_policy_callback(self, box):
+        self.par.worker_queue_policy = loki.QUEUE_POLICIES[box.get_active()]
+
+    def replay_mode_callback(self, box):
+        self.par.replay_mode = loki.REPLAY_MODES[box.get_active()]
+
+    def replay_speed_callback(self, button):
+        self.par.replay_speed = button.get_value()
         return True
 
     def toggle_callback(self, cell, path, model):
@@ -1547,6 +1964,8 @@ class loki_gtk(loki.codename_loki):
         self.bruteforce = True
         self.bruteforce_full = False
         self.bruteforce_threads = 4
+        self.bruteforce_mask = ""
+        self.wordlist_rules = ""
 
 		#gtk stuff
         self.window = gtk.Window(gtk.WINDOW_TOPLEVEL)
@@ -1572,6 +1991,14 @@ class loki_gtk(loki.codename_loki):
         self.log_button.connect("clicked", self.on_log_button_clicked)
         self.log_button.set_tooltip_text("LOG")
         self.toolbar.insert(self.log_button, 0)
+        self.stats_button = gtk.ToolButton(gtk.STOCK_INFO)
+        self.stats_button.connect("clicked", self.on_stats_button_clicked)
+        self.stats_button.set_tooltip_text("STATISTICS")
+        self.toolbar.insert(self.stats_button, 0)
+        self.crack_button = gtk.ToolButton(gtk.STOCK_EXECUTE)
+        self.crack_button.connect("clicked", self.on_crack_button_clicked)
+        self.crack_button.set_tooltip_text("CRACKING")
+        self.toolbar.insert(self.crack_button, 0)
         self.toolbar.insert(gtk.SeparatorToolItem(), 0)
         self.pref_button = gtk.ToolButton(gtk.STOCK_PREFERENCES)
         self.pref_button.connect("clicked", self.on_pref_button_clicked)
@@ -1738,7 +2165,8 @@ class loki_gtk(loki.codename_loki):
                 btn.set_active(False)
                 return
             self.pcap_thread = loki.pcap_thread(self, self.interface)
-            self.dnet_thread = loki.dnet_thread(self.interface)
+            self.dnet_thread = loki.dnet_thread(self.interface, self.tx_queue_size, self.tx_ring, self.tx_ring_frames, self.tx_scheduling)
+            self.dnet_thread.set_rate(None, self.tx_rate_pps, self.tx_rate_bps)
             self.log("Listening on %s" % (self.interface))
             if PLATFORM != "Linux":
                 self.fw = dnet.fw()
@@ -1831,6 +2259,14 @@ class loki_gtk(loki.codename_loki):
     def on_log_button_clicked(self, data):
         l_window = log_window(self.log_textbuffer)
         l_window.show_all()
+
+    def on_stats_button_clicked(self, data):
+        s_window = stats_window(self)
+        s_window.show_all()
+
+    def on_crack_button_clicked(self, data):
+        c_window = crack_window(self)
+        c_window.show_all()
     
     def on_network_combobox_changed(self, box, label):
         if PLATFORM == "Windows":
@@ -372,6 +372,8 @@ class loki_urw(loki.codename_loki):
         self.bruteforce = True
         self.bruteforce_full = False
         self.bruteforce_threads = 4
+        self.bruteforce_mask = ""
+        self.wordlist_rules = ""
     
     def main(self):
         loki.codename_loki.main(self)
@@ -384,9 +386,12 @@ class loki_urw(loki.codename_loki):
             self.sub_menu('Modules', self.modules_menu()),
             self.sub_menu('Configure', [
                 self.sub_menu('Modules', self.config_modules_menu()),
-                self.menu_button('Bruteforce', self.config_bruteforce)
+                self.menu_button('Bruteforce', self.config_bruteforce),
+                self.menu_button('Capture', self.config_capture)
             ]),
             self.menu_button('Overview', self.show_overview),
+            self.menu_button('Statistics', self.show_stats),
+            self.menu_button('Cracking', self.show_crack_jobs),
             self.menu_button('Quit', self.quit)
         ])
         
@@ -496,15 +501,29 @@ class loki_urw(loki.codename_loki):
             attr.set_attr_map({None : 'edit'})
             self.bruteforce_threads = val
 
+    def bruteforce_mask_changed(self, edit, text):
+        self.bruteforce_mask = text
+
+    def wordlist_rules_changed(self, button, state, rules):
+        if state:
+            self.wordlist_rules = rules
+
     def config_bruteforce(self, button):
         edit = urwid.Edit("Number of threads: ", str(self.bruteforce_threads))
         attr = urwid.AttrMap(edit, 'edit')
         urwid.connect_signal(edit, 'change', self.bruteforce_threads_changed, attr)
+        mask = urwid.Edit("Bruteforce mask (?l ?u ?d ?s ?a [a-f]): ", self.bruteforce_mask)
+        urwid.connect_signal(mask, 'change', self.bruteforce_mask_changed)
+        group = []
+        rules = [ urwid.RadioButton(group, name, state=(value == self.wordlist_rules), on_state_change=self.wordlist_rules_changed, user_data=value) for (name, value) in loki.CRACK_RULES ]
         conflist = [ urwid.AttrMap(urwid.Text("Bruteforce config"), 'header'), 
                      urwid.Divider(),
                      self.menu_button("Wordlist: %s" % self.wordlist, self.config_wordlist),
+                     urwid.Text("Wordlist rules:"),
+                     ] + rules + [
                      urwid.CheckBox("Use bruteforce", state=self.bruteforce, on_state_change=self.bruteforce_checkbox_changed),
                      urwid.CheckBox("Bruteforce full charset", state=self.bruteforce_full, on_state_change=self.bruteforce_full_checkbox_changed),
+                     urwid.AttrMap(mask, 'edit'),
                      attr
                     ]
         box = urwid.ListBox(urwid.SimpleFocusListWalker(conflist))
@@ -514,6 +533,125 @@ class loki_urw(loki.codename_loki):
                             valign='middle', height=('relative', 80),
                             min_width=24, min_height=8))
 
+    def capture_blocking_checkbox_changed(self, box, state):
+        self.pcap_blocking = state
+
+    def capture_autofilter_checkbox_changed(self, box, state):
+        self.pcap_autofilter = state
+        self.update_bpf_filter()
+
+    def capture_ring_checkbox_changed(self, box, state):
+        self.pcap_ring = state
+
+    def capture_workers_checkbox_changed(self, box, state):
+        self.pcap_workers = state
+
+    def capture_tx_ring_checkbox_changed(self, box, state):
+        self.tx_ring = state
+
+    def capture_policy_radio_changed(self, button, state, policy):
+        if state:
+            self.worker_queue_policy = policy
+
+    def capture_replay_radio_changed(self, button, state, mode):
+        if state:
+            self.replay_mode = mode
+
+    def capture_speed_changed(self, edit, text, attr):
+        try:
+            val = float(text)
+            assert(val > 0)
+        except:
+            attr.set_attr_map({None : 'edit failure'})
+        else:
+            attr.set_attr_map({None : 'edit'})
+            self.replay_speed = val
+
+    def capture_int_changed(self, edit, text, (attr, name, min, max)):
+        try:
+            val = int(text)
+            assert(val >= min)
+            assert(val <= max)
+        except:
+            attr.set_attr_map({None : 'edit failure'})
+        else:
+            attr.set_attr_map({None : 'edit'})
+            setattr(self, name, val)
+
+    def capture_scheduling_radio_changed(self, button, state, scheduling):
+        if state:
+            self.tx_scheduling = scheduling
+            if self.dnet_thread:
+                self.dnet_thread.scheduling = scheduling
+
+    def capture_rate_changed(self, edit, text, (attr, name)):
+        try:
+            val = int(text)
+            assert(val >= 0)
+        except:
+            attr.set_attr_map({None : 'edit failure'})
+        else:
+            attr.set_attr_map({None : 'edit'})
+            self.set_tx_rate(**{name : val})
+
+    def config_capture(self, button):
+        batch_edit = urwid.Edit("Batch size: ", str(self.pcap_batch_size))
+        batch_attr = urwid.AttrMap(batch_edit, 'edit')
+        urwid.connect_signal(batch_edit, 'change', self.capture_int_changed, (batch_attr, "pcap_batch_size", 1, 4096))
+        timeout_edit = urwid.Edit("Poll timeout (ms): ", str(self.pcap_poll_timeout))
+        timeout_attr = urwid.AttrMap(timeout_edit, 'edit')
+        urwid.connect_signal(timeout_edit, 'change', self.capture_int_changed, (timeout_attr, "pcap_poll_timeout", 1, 1000))
+        ring_edit = urwid.Edit("Ring blocks of %d KiB: " % self.ring_block_size, str(self.ring_block_count))
+        ring_attr = urwid.AttrMap(ring_edit, 'edit')
+        urwid.connect_signal(ring_edit, 'change', self.capture_int_changed, (ring_attr, "ring_block_count", 2, 1024))
+        queue_edit = urwid.Edit("Worker queue size: ", str(self.worker_queue_size))
+        queue_attr = urwid.AttrMap(queue_edit, 'edit')
+        urwid.connect_signal(queue_edit, 'change', self.capture_int_changed, (queue_attr, "worker_queue_size", 1, 100000))
+        bgroup = []
+        policies = [ urwid.RadioButton(bgroup, "When full: %s" % i, state=(i == self.worker_queue_policy), on_state_change=self.capture_policy_radio_changed, user_data=i) for i in loki.QUEUE_POLICIES ]
+        bgroup = []
+        replay = [ urwid.RadioButton(bgroup, "Replay: %s" % i, state=(i == self.replay_mode), on_state_change=self.capture_replay_radio_changed, user_data=i) for i in loki.REPLAY_MODES ]
+        speed_edit = urwid.Edit("Replay speed: ", str(self.replay_speed))
+        speed_attr = urwid.AttrMap(speed_edit, 'edit')
+        urwid.connect_signal(speed_edit, 'change', self.capture_speed_changed, speed_attr)
+        bgroup = []
+        scheduling = [ urwid.RadioButton(bgroup, "Transmit classes: %s" % i, state=(i == self.tx_scheduling), on_state_change=self.capture_scheduling_radio_changed, user_data=i) for i in loki.TX_SCHEDULINGS ]
+        tx_queue_edit = urwid.Edit("Transmit queue size: ", str(self.tx_queue_size))
+        tx_queue_attr = urwid.AttrMap(tx_queue_edit, 'edit')
+        urwid.connect_signal(tx_queue_edit, 'change', self.capture_int_changed, (tx_queue_attr, "tx_queue_size", 1, 100000))
+        tx_ring_edit = urwid.Edit("Transmit ring frames: ", str(self.tx_ring_frames))
+        tx_ring_attr = urwid.AttrMap(tx_ring_edit, 'edit')
+        urwid.connect_signal(tx_ring_edit, 'change', self.capture_int_changed, (tx_ring_attr, "tx_ring_frames", 8, 65536))
+        tx_pps_edit = urwid.Edit("Transmit limit pps (0 = none): ", str(self.tx_rate_pps))
+        tx_pps_attr = urwid.AttrMap(tx_pps_edit, 'edit')
+        urwid.connect_signal(tx_pps_edit, 'change', self.capture_rate_changed, (tx_pps_attr, "pps"))
+        tx_bps_edit = urwid.Edit("Transmit limit bps (0 = none): ", str(self.tx_rate_bps))
+        tx_bps_attr = urwid.AttrMap(tx_bps_edit, 'edit')
+        urwid.connect_signal(tx_bps_edit, 'change', self.capture_rate_changed, (tx_bps_attr, "bps"))
+        conflist = [ urwid.AttrMap(urwid.Text("Capture config"), 'header'), 
+                     urwid.Divider(),
+                     urwid.CheckBox("Block on capture device", state=self.pcap_blocking, on_state_change=self.capture_blocking_checkbox_changed),
+                     batch_attr,
+                     timeout_attr,
+                     urwid.CheckBox("Filter for active modules in kernel", state=self.pcap_autofilter, on_state_change=self.capture_autofilter_checkbox_changed),
+                     urwid.CheckBox("Use TPACKET_V3 ring (Linux)", state=self.pcap_ring, on_state_change=self.capture_ring_checkbox_changed),
+                     ring_attr,
+                     urwid.CheckBox("Per module worker queues", state=self.pcap_workers, on_state_change=self.capture_workers_checkbox_changed),
+                     queue_attr
+                    ] + policies + replay + [ speed_attr,
+                     tx_queue_attr,
+                     urwid.CheckBox("Transmit through TPACKET_V2 ring (Linux)", state=self.tx_ring, on_state_change=self.capture_tx_ring_checkbox_changed),
+                     tx_ring_attr,
+                     tx_pps_attr,
+                     tx_bps_attr
+                    ] + scheduling
+        box = urwid.ListBox(urwid.SimpleFocusListWalker(conflist))
+        self.frame.set_body(urwid.Overlay(urwid.LineBox(box),
+                            self.body,
+                            align='center', width=('relative', 80),
+                            valign='middle', height=('relative', 80),
+                            min_width=24, min_height=8))
+
     def config_modules_menu(self):
         ret = []
         for i in self.modules:
@@ -781,6 +919,94 @@ class loki_urw(loki.codename_loki):
                 self.pcap_thread = None
             self.filename = None
     
+    def show_stats(self, button):
+        text = urwid.Text("\n".join(self.format_dispatch_stats()).expandtabs(10))
+        file_edit = urwid.Edit("Snapshot file: ", self.stats_file or "")
+        interval_edit = urwid.Edit("Snapshot every (s): ", str(self.stats_interval))
+        statslist = [ urwid.AttrMap(urwid.Text("Dispatch statistics"), 'header'),
+                      urwid.Divider(),
+                      text,
+                      urwid.Divider(),
+                      urwid.CheckBox("Instrument dispatcher", state=self.instrument, on_state_change=self.stats_instrument_changed),
+                      urwid.AttrMap(file_edit, 'edit'),
+                      urwid.AttrMap(interval_edit, 'edit'),
+                      urwid.Columns([ self.menu_button("Refresh", self.stats_refresh, text),
+                                      self.menu_button("Reset", self.stats_reset, text),
+                                      self.menu_button("Dump", self.stats_dump, (file_edit, interval_edit)) ])
+                    ]
+        box = urwid.ListBox(urwid.SimpleFocusListWalker(statslist))
+        self.frame.set_body(urwid.Overlay(urwid.LineBox(box),
+                            self.body,
+                            align='center', width=('relative', 90),
+                            valign='middle', height=('relative', 90),
+                            min_width=24, min_height=8))
+
+    def stats_instrument_changed(self, box, state):
+        self.instrument = state
+
+    def stats_refresh(self, button, text):
+        text.set_text("\n".join(self.format_dispatch_stats()).expandtabs(10))
+
+    def stats_reset(self, button, text):
+        self.reset_dispatch_stats()
+        self.stats_refresh(button, text)
+
+    def stats_dump(self, button, (file_edit, interval_edit)):
+        try:
+            interval = int(interval_edit.get_edit_text())
+            assert(interval > 0)
+        except:
+            self.log("Invalid snapshot interval")
+            return
+        filename = file_edit.get_edit_text()
+        if not filename:
+            filename = None
+        self.set_stats_file(filename, interval)
+
+    def show_crack_jobs(self, button):
+        walker = urwid.SimpleFocusListWalker([])
+        self.crack_refresh(None, walker)
+        box = urwid.ListBox(walker)
+        self.frame.set_body(urwid.Overlay(urwid.LineBox(box),
+                            self.body,
+                            align='center', width=('relative', 90),
+                            valign='middle', height=('relative', 90),
+                            min_width=24, min_height=8))
+
+    def crack_refresh(self, button, walker):
+        header = "Cracking jobs"
+        if self.cracker:
+            header += " - %d of %d cpus in use" % (self.cracker.size - self.cracker.free, self.cracker.size)
+        joblist = [ urwid.AttrMap(urwid.Text(header), 'header'),
+                    urwid.Divider(),
+                    urwid.Text("\t".join(loki.crack_job.COLUMNS).expandtabs(12))
+                    ]
+        for job in self.get_crack_jobs():
+            text = urwid.Text("\t".join(job.format()).expandtabs(12))
+            if job.is_alive():
+                joblist.append(urwid.Columns([ text, ('fixed', 10, self.menu_button("Cancel", self.crack_cancel, (job, walker))) ]))
+            elif job.resumable():
+                joblist.append(urwid.Columns([ text, ('fixed', 10, self.menu_button("Resume", self.crack_resume, (job, walker))),
+                                                     ('fixed', 11, self.menu_button("Discard", self.crack_discard, (job, walker))) ]))
+            else:
+                joblist.append(text)
+        joblist += [ urwid.Divider(),
+                     self.menu_button("Refresh", self.crack_refresh, walker)
+                     ]
+        walker[:] = joblist
+
+    def crack_cancel(self, button, (job, walker)):
+        job.cancel()
+        self.crack_refresh(button, walker)
+
+    def crack_resume(self, button, (job, walker)):
+        self.resume_crack_job(job)
+        self.crack_refresh(button, walker)
+
+    def crack_discard(self, button, (job, walker)):
+        self.discard_crack_job(job)
+        self.crack_refresh(button, walker)
+
     def show_overview(self, button):
         self.set_body(self.overview())
     
@@ -805,7 +1031,8 @@ class loki_urw(loki.codename_loki):
     def run_live(self):
         assert(self.configured)
         self.pcap_thread = loki.pcap_thread(self, self.interface)
-        self.dnet_thread = loki.dnet_thread(self.interface)
+        self.dnet_thread = loki.dnet_thread(self.interface, self.tx_queue_size, self.tx_ring, self.tx_ring_frames, self.tx_scheduling)
+        self.dnet_thread.set_rate(None, self.tx_rate_pps, self.tx_rate_bps)
         self.log("Listening on %s" % (self.interface))
         if PLATFORM != "Linux":
             self.fw = dnet.fw()